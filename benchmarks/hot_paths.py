@@ -0,0 +1,550 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+# measures the hot paths at different amounts of data per guild
+# run with: python -m benchmarks.hot_paths --scale 100 --scale 10000
+# uses a throwaway postgres (see tools/scratch_db.py), or BENCHMARK_DB_URL if set
+# seeded guilds are kept, so pointing BENCHMARK_DB_URL at the same database
+# skips reseeding on later runs - useful for the 1000000 scale
+# --output writes the results as json, --baseline compares against an earlier output
+# benchmarks/baseline.json is a run at the default scales - rerun it on the same
+# machine before comparing, as timings don't carry over between machines
+
+import argparse
+import asyncio
+import dataclasses
+import datetime
+import hashlib
+import inspect
+import os
+import platform
+import statistics
+import sys
+import time
+import types
+from pathlib import Path
+
+import orjson
+import typing_extensions as typing
+
+import tools.scratch_db as scratch_db
+
+os.environ.setdefault("BOT_COLOR", "7487408")
+
+BASE_GUILD_ID: typing.Final[int] = 500000000000000000
+BASE_CHANNEL_ID: typing.Final[int] = 600000000000000000
+USER_ID: typing.Final[int] = 700000000000000001
+CHANNELS_PER_GUILD: typing.Final[int] = 10
+
+# nobody can page through a million draws anyway
+INVENTORY_CAP: typing.Final[int] = 10000
+DICE_CAP: typing.Final[int] = 1000
+
+# differences smaller than this are noise, no matter the ratio
+NOISE_FLOOR_US: typing.Final[float] = 50.0
+
+
+@dataclasses.dataclass(slots=True)
+class Result:
+    case: str
+    scale: int
+    runs: int
+    median_us: float
+    p95_us: float
+    min_us: float
+
+    @property
+    def key(self) -> str:
+        return f"{self.case}@{self.scale}"
+
+
+@dataclasses.dataclass(slots=True)
+class Fixture:
+    guild_id: int
+    channel_id: int
+    trigger: str
+    item_query: str
+    gacha_query: str
+    dice_query: str
+    bullet_query: str
+    owned_ids: set[int]
+
+
+def md5_prefix(i: int) -> str:
+    # matches substr(md5(i::text), 1, 10) in the seeding queries
+    return hashlib.md5(str(i).encode(), usedforsecurity=False).hexdigest()[:10]
+
+
+async def seed(scale: int) -> Fixture:
+    from tortoise.connection import get_connection
+
+    import common.models as models
+
+    guild_id = BASE_GUILD_ID + scale
+    channel_id = BASE_CHANNEL_ID + scale * CHANNELS_PER_GUILD
+
+    fixture = Fixture(
+        guild_id=guild_id,
+        channel_id=channel_id,
+        trigger=f"clue {md5_prefix(CHANNELS_PER_GUILD)}",
+        item_query=f"item {md5_prefix(1)[:6]}",
+        gacha_query=f"prize {md5_prefix(1)[:6]}",
+        dice_query=f"dice {md5_prefix(1)[:6]}",
+        bullet_query=f"clue {md5_prefix(CHANNELS_PER_GUILD)[:6]}",
+        owned_ids=set(),
+    )
+
+    if await models.GuildConfig.exists(guild_id=guild_id):
+        player = await models.GachaPlayer.get(guild_id=guild_id, user_id=USER_ID)
+        fixture.owned_ids = set(
+            await models.ItemToPlayer.filter(player_id=player.id).values_list(
+                "item_id", flat=True
+            )
+        )
+        return fixture
+
+    await models.GuildConfig.create(guild_id=guild_id, player_role=1)
+    await models.Names.create(guild_id=guild_id)
+    await models.BulletConfig.create(guild_id=guild_id, bullets_enabled=True)
+    await models.ItemsConfig.create(guild_id=guild_id, enabled=True)
+    await models.GachaConfig.create(guild_id=guild_id, enabled=True)
+    await models.GachaRarities.create(guild_id=guild_id)
+    await models.DiceConfig.create(guild_id=guild_id)
+    player = await models.GachaPlayer.create(
+        guild_id=guild_id, user_id=USER_ID, currency_amount=100
+    )
+
+    conn = get_connection("default")
+
+    # generating the rows in postgres is what makes the 1000000 scale bearable
+    await conn.execute_query(
+        """
+        INSERT INTO thiatruthbullets (trigger, description, channel_id, guild_id, found, hidden)
+        SELECT
+            'clue ' || substr(md5(i::text), 1, 10),
+            'A synthetic clue, found at the scene.',
+            $1::bigint + (i % $3),
+            $2::bigint,
+            FALSE,
+            i % 50 = 0
+        FROM generate_series(1, $4) AS i
+        """,
+        [channel_id, guild_id, CHANNELS_PER_GUILD, scale],
+    )
+    await conn.execute_query(
+        """
+        INSERT INTO thiatruthbulletalias (bullet_id, alias)
+        SELECT id, 'alias ' || id FROM thiatruthbullets
+        WHERE guild_id = $1 AND id % 10 = 0
+        """,
+        [guild_id],
+    )
+
+    await conn.execute_query(
+        """
+        INSERT INTO thiaitemssystemitems (guild_id, name, description, takeable)
+        SELECT $1::bigint, 'item ' || substr(md5(i::text), 1, 10), 'An item.', TRUE
+        FROM generate_series(1, $2) AS i
+        """,
+        [guild_id, scale],
+    )
+    await conn.execute_query(
+        """
+        INSERT INTO thiaitemrelation (item_id, guild_id, object_id, object_type)
+        SELECT id, guild_id, $2::bigint + (id % $3), 'CHANNEL'
+        FROM thiaitemssystemitems WHERE guild_id = $1
+        """,
+        [guild_id, channel_id, CHANNELS_PER_GUILD],
+    )
+    await conn.execute_query(
+        """
+        INSERT INTO thiaitemrelation (item_id, guild_id, object_id, object_type)
+        SELECT id, guild_id, $2::bigint, 'USER'
+        FROM thiaitemssystemitems WHERE guild_id = $1 ORDER BY id LIMIT 25
+        """,
+        [guild_id, USER_ID],
+    )
+
+    await conn.execute_query(
+        """
+        INSERT INTO thiagachaitems (guild_id, name, description, rarity, amount)
+        SELECT
+            $1::bigint,
+            'prize ' || substr(md5(i::text), 1, 10),
+            'A prize.',
+            (i % 5) + 1,
+            -1
+        FROM generate_series(1, $2) AS i
+        """,
+        [guild_id, scale],
+    )
+    await conn.execute_query(
+        """
+        INSERT INTO thiagachaitemtoplayer (item_id, player_id)
+        SELECT id, $2 FROM thiagachaitems WHERE guild_id = $1 ORDER BY id LIMIT $3
+        """,
+        [guild_id, player.id, min(scale, INVENTORY_CAP)],
+    )
+
+    await conn.execute_query(
+        """
+        INSERT INTO thiadicenetry (guild_id, user_id, name, value)
+        SELECT $1::bigint, $2::bigint, 'dice ' || substr(md5(i::text), 1, 10), '1d20'
+        FROM generate_series(1, $3) AS i
+        """,
+        [guild_id, USER_ID, min(scale, DICE_CAP)],
+    )
+
+    await conn.execute_script("ANALYZE;")
+
+    fixture.owned_ids = set(
+        await models.ItemToPlayer.filter(player_id=player.id).values_list(
+            "item_id", flat=True
+        )
+    )
+    return fixture
+
+
+def fake_autocomplete(fixture: Fixture) -> types.SimpleNamespace:
+    return types.SimpleNamespace(
+        interaction=types.SimpleNamespace(
+            guild_id=fixture.guild_id,
+            channel_id=fixture.channel_id,
+            user=types.SimpleNamespace(id=USER_ID),
+            authorizing_integration_owners=types.SimpleNamespace(
+                guild_id=fixture.guild_id
+            ),
+        )
+    )
+
+
+async def build_cases(
+    fixture: Fixture,
+) -> dict[str, typing.Callable[[], typing.Any]]:
+    from tortoise.query_utils import Prefetch
+
+    import common.exports as exports
+    import common.fuzzy as fuzzy
+    import common.models as models
+
+    ac = fake_autocomplete(fixture)
+    channel = str(fixture.channel_id)
+    user = str(USER_ID)
+
+    names = await models.Names.get(guild_id=fixture.guild_id)
+    item = (await models.ItemsSystemItem.filter(guild_id=fixture.guild_id).limit(1))[0]
+
+    async def fetch_player() -> models.GachaPlayer:
+        # the same prefetch /gacha profile does
+        return await models.GachaPlayer.get(
+            guild_id=fixture.guild_id, user_id=USER_ID
+        ).prefetch_related(
+            Prefetch("items", models.ItemToPlayer.filter().prefetch_related("item"))
+        )
+
+    player = await fetch_player()
+
+    # the same paths the export commands take
+    async def read_export(
+        version: int,
+        key: str,
+        pages: typing.AsyncIterable[typing.Sequence[exports.ExportRow]],
+    ) -> bytes:
+        with await exports.write_json_export(version, key, pages) as file:
+            return file.read()
+
+    def export_bullets() -> typing.Awaitable[bytes]:
+        return read_export(
+            1,
+            "entries",
+            exports.truth_bullet_pages(
+                models.TruthBullet.filter(channel_id=fixture.channel_id)
+            ),
+        )
+
+    def export_gacha_items() -> typing.Awaitable[bytes]:
+        return read_export(
+            2,
+            "items",
+            exports.paged_values(
+                models.GachaItem.filter(guild_id=fixture.guild_id),
+                "name",
+                "description",
+                "rarity",
+                "amount",
+                "image",
+            ),
+        )
+
+    def export_items() -> typing.Awaitable[bytes]:
+        return read_export(
+            1,
+            "items",
+            exports.paged_values(
+                models.ItemsSystemItem.filter(guild_id=fixture.guild_id),
+                "name",
+                "description",
+                "takeable",
+                "image",
+            ),
+        )
+
+    bullets_json = await export_bullets()
+    gacha_items_json = await export_gacha_items()
+    items_json = await export_items()
+
+    return {
+        "TruthBullet.find (miss)": lambda: models.TruthBullet.find(
+            fixture.channel_id, "just talking about nothing in particular"
+        ),
+        "TruthBullet.find (hit)": lambda: models.TruthBullet.find(
+            fixture.channel_id, f"hey, i think i found the {fixture.trigger}!"
+        ),
+        "GachaItem.roll": lambda: models.GachaItem.roll(
+            fixture.guild_id, models.Rarity.RARE
+        ),
+        "GachaItem.roll_no_duplicates": lambda: models.GachaItem.roll_no_duplicates(
+            fixture.guild_id, fixture.owned_ids, models.Rarity.RARE
+        ),
+        "autocomplete_bullets": lambda: fuzzy.autocomplete_bullets(
+            fixture.bullet_query, channel=channel
+        ),
+        "autocomplete_bullets (empty)": lambda: fuzzy.autocomplete_bullets(
+            "", channel=channel
+        ),
+        "autocomplete_bullets (not found)": lambda: fuzzy.autocomplete_bullets(
+            fixture.bullet_query, channel=channel, only_not_found=True
+        ),
+        "autocomplete_aliases": lambda: fuzzy.autocomplete_aliases(
+            "alias", channel=channel, trigger=fixture.trigger
+        ),
+        "autocomplete_gacha_item": lambda: fuzzy.autocomplete_gacha_item(
+            ac, fixture.gacha_query
+        ),
+        "autocomplete_gacha_item (empty)": lambda: fuzzy.autocomplete_gacha_item(
+            ac, ""
+        ),
+        "autocomplete_gacha_user_item": lambda: fuzzy.autocomplete_gacha_user_item(
+            ac, fixture.gacha_query, user=user
+        ),
+        "autocomplete_gacha_user_item (empty)": lambda: (
+            fuzzy.autocomplete_gacha_user_item(ac, "", user=user)
+        ),
+        "autocomplete_dice_entries_user": lambda: fuzzy.autocomplete_dice_entries_user(
+            ac, fixture.dice_query
+        ),
+        "autocomplete_dice_entries_user (empty)": lambda: (
+            fuzzy.autocomplete_dice_entries_user(ac, "")
+        ),
+        "autocomplete_item": lambda: fuzzy.autocomplete_item(ac, fixture.item_query),
+        "autocomplete_item (empty)": lambda: fuzzy.autocomplete_item(ac, ""),
+        "autocomplete_item_channel": lambda: fuzzy.autocomplete_item_channel(
+            ac, fixture.item_query, channel=channel
+        ),
+        "autocomplete_item_channel (empty)": lambda: fuzzy.autocomplete_item_channel(
+            ac, "", channel=channel
+        ),
+        "autocomplete_item_channel (takeable)": lambda: (
+            fuzzy.autocomplete_item_channel(
+                ac, fixture.item_query, channel=channel, check_takeable=True
+            )
+        ),
+        "autocomplete_item_user": lambda: fuzzy.autocomplete_item_user(
+            ac, fixture.item_query, user=user
+        ),
+        "autocomplete_item_user (empty)": lambda: fuzzy.autocomplete_item_user(
+            ac, "", user=user
+        ),
+        "gacha profile fetch": fetch_player,
+        "create_profile_compact": lambda: player.create_profile_compact(
+            names, sort_by="name"
+        ),
+        "create_profile_modern": lambda: player.create_profile_modern(
+            names, sort_by="name"
+        ),
+        "create_profile_spacious": lambda: player.create_profile_spacious(
+            names, sort_by="rarity"
+        ),
+        "ItemsSystemItem.embeds": lambda: item.embeds(count=3),
+        "export bullets": export_bullets,
+        "import bullets": lambda: exports.handle_bullet_entry_data(bullets_json),
+        "export gacha items": export_gacha_items,
+        "import gacha items": lambda: exports.handle_gacha_item_data(gacha_items_json),
+        "export items": export_items,
+        "import items": lambda: exports.handle_items_system_item_data(items_json),
+    }
+
+
+async def measure(
+    func: typing.Callable[[], typing.Any],
+    *,
+    min_runs: int,
+    max_runs: int,
+    max_time: float,
+) -> list[float]:
+    timings: list[float] = []
+    deadline = time.perf_counter() + max_time
+
+    while len(timings) < max_runs and (
+        len(timings) < min_runs or time.perf_counter() < deadline
+    ):
+        start = time.perf_counter()
+        result = func()
+        if inspect.isawaitable(result):
+            await result
+        timings.append(time.perf_counter() - start)
+
+    return timings
+
+
+def summarize(case: str, scale: int, timings: list[float]) -> Result:
+    timings_us = sorted(t * 1_000_000 for t in timings)
+    p95_index = min(len(timings_us) - 1, round(len(timings_us) * 0.95))
+    return Result(
+        case=case,
+        scale=scale,
+        runs=len(timings_us),
+        median_us=statistics.median(timings_us),
+        p95_us=timings_us[p95_index],
+        min_us=timings_us[0],
+    )
+
+
+async def run(db_url: str, args: argparse.Namespace) -> list[Result]:
+    os.environ["DB_URL"] = db_url
+    os.environ.pop("DB_READ_URL", None)
+
+    from tortoise import Tortoise
+
+    import db_settings
+
+    await Tortoise.init(db_settings.tortoise_config())
+    results: list[Result] = []
+
+    try:
+        for scale in args.scale:
+            print(f"seeding scale {scale}...", file=sys.stderr)
+            fixture = await seed(scale)
+
+            cases = await build_cases(fixture)
+            for case, func in cases.items():
+                if args.case and not any(c in case for c in args.case):
+                    continue
+
+                # the first run pays for cold caches, which isn't what we're after
+                await measure(func, min_runs=1, max_runs=1, max_time=0)
+                timings = await measure(
+                    func,
+                    min_runs=args.min_runs,
+                    max_runs=args.max_runs,
+                    max_time=args.max_time,
+                )
+                result = summarize(case, scale, timings)
+                results.append(result)
+                print(
+                    f"{case:<42} {scale:>9} {result.median_us:>12.1f}"
+                    f" {result.p95_us:>12.1f} {result.runs:>6}"
+                )
+    finally:
+        await Tortoise.close_connections()
+
+    return results
+
+
+def compare(
+    results: list[Result], baseline: dict[str, typing.Any], tolerance: float
+) -> bool:
+    baseline_results = {f"{r['case']}@{r['scale']}": r for r in baseline["results"]}
+    passed = True
+
+    print("\ncompared to baseline:")
+    for result in results:
+        previous = baseline_results.get(result.key)
+        if previous is None:
+            print(f"  new   {result.key}")
+            continue
+
+        ratio = result.median_us / previous["median_us"]
+        regressed = (
+            ratio > 1 + tolerance
+            and result.median_us - previous["median_us"] > NOISE_FLOOR_US
+        )
+        passed = passed and not regressed
+        print(
+            f"  {'SLOW' if regressed else 'ok':<5} {result.key}:"
+            f" {previous['median_us']:.1f} -> {result.median_us:.1f} us ({ratio:.2f}x)"
+        )
+
+    return passed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--scale",
+        type=int,
+        action="append",
+        help=(
+            "How many bullets, items and gacha items to seed for a guild. Can be"
+            " given multiple times. Defaults to 100 and 10000."
+        ),
+    )
+    parser.add_argument(
+        "--case",
+        action="append",
+        help="Only run cases whose name contains this. Can be given multiple times.",
+    )
+    parser.add_argument("--min-runs", type=int, default=5)
+    parser.add_argument("--max-runs", type=int, default=200)
+    parser.add_argument(
+        "--max-time",
+        type=float,
+        default=1.0,
+        help="How long to keep running a case for, once it has had its minimum runs.",
+    )
+    parser.add_argument("--output", type=Path, help="Where to write the results.")
+    parser.add_argument(
+        "--baseline", type=Path, help="Earlier results to compare against."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="How much slower than the baseline a case can get. Defaults to 0.25.",
+    )
+    args = parser.parse_args()
+    args.scale = args.scale or [100, 10000]
+
+    print(f"{'case':<42} {'scale':>9} {'median us':>12} {'p95 us':>12} {'runs':>6}")
+    with scratch_db.throwaway_postgres(os.environ.get("BENCHMARK_DB_URL")) as db_url:
+        scratch_db.migrate(db_url)
+        results = asyncio.run(run(db_url, args))
+
+    if args.output:
+        args.output.write_bytes(
+            orjson.dumps(
+                {
+                    "version": 1,
+                    "created_at": datetime.datetime.now(datetime.UTC).isoformat(),
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "results": [dataclasses.asdict(r) for r in results],
+                },
+                option=orjson.OPT_INDENT_2,
+            )
+        )
+
+    if args.baseline:
+        baseline = orjson.loads(args.baseline.read_bytes())
+        if not compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
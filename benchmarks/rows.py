@@ -0,0 +1,92 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+# compares building full tortoise models against the plain row types
+# used by TruthBullet.find and the gacha rolls
+# run with: python -m benchmarks.rows
+
+import argparse
+import asyncio
+import os
+import timeit
+import tracemalloc
+
+import typing_extensions as typing
+
+os.environ.setdefault("BOT_COLOR", "7487408")
+
+from tortoise import Tortoise
+
+import common.models as models
+
+TRUTH_BULLET_RECORD: typing.Final[dict[str, typing.Any]] = {
+    "id": 1,
+    "trigger": "bloody knife",
+    "description": "A knife, covered in blood." * 4,
+    "channel_id": 123456789012345678,
+    "guild_id": 876543210987654321,
+    "found": False,
+    "finder": None,
+    "hidden": False,
+    "image": None,
+}
+GACHA_ITEM_RECORD: typing.Final[dict[str, typing.Any]] = {
+    "id": 1,
+    "guild_id": 876543210987654321,
+    "name": "Monokuma Plushie",
+    "description": "Soft, yet unsettling." * 4,
+    "image": None,
+    "rarity": 3,
+    "amount": -1,
+}
+
+CASES: typing.Final[dict[str, typing.Callable[[], typing.Any]]] = {
+    "truth_bullet_model": lambda: models.TruthBullet(**TRUTH_BULLET_RECORD),
+    "truth_bullet_row": lambda: models.TruthBulletRow(**TRUTH_BULLET_RECORD),
+    "gacha_item_model": lambda: models.GachaItem(**GACHA_ITEM_RECORD),
+    "gacha_item_row": lambda: models.GachaItemRow.from_record(GACHA_ITEM_RECORD),
+}
+
+
+def measure_allocations(func: typing.Callable[[], typing.Any], number: int) -> int:
+    # keep the objects alive so that we measure what they actually hold onto
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    keep = [func() for _ in range(number)]
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del keep
+    return (end - start) // number
+
+
+async def init_models() -> None:
+    # models need their metadata filled in, but no queries are actually made
+    await Tortoise.init(
+        db_url="sqlite://:memory:", modules={"models": ["common.models"]}
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    asyncio.run(init_models())
+
+    print(f"{'case':<20} {'usec/op':>10} {'bytes/op':>10}")
+    for name, func in CASES.items():
+        best = min(timeit.repeat(func, number=args.number, repeat=args.repeat))
+        usec = best / args.number * 1_000_000
+        allocated = measure_allocations(func, args.number)
+        print(f"{name:<20} {usec:>10.2f} {allocated:>10}")
+
+
+if __name__ == "__main__":
+    main()
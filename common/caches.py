@@ -0,0 +1,213 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import asyncio
+import dataclasses
+import time
+
+import discord
+import typing_extensions as typing
+
+# this module is intentionally not reloaded by extensions
+# so that the state here survives extension reloads
+
+__all__ = (
+    "ChannelCache",
+    "ChannelCacheStats",
+    "channel_cache",
+)
+
+GuildChannelT: typing.TypeAlias = discord.abc.GuildChannel | discord.Thread
+
+
+@dataclasses.dataclass(slots=True)
+class ChannelCacheStats:
+    gateway_hits: int = 0
+    fetched_hits: int = 0
+    negative_hits: int = 0
+    coalesced: int = 0
+    http_fetches: int = 0
+    http_failures: int = 0
+    warmups: int = 0
+    warmup_requests: int = 0
+
+    @property
+    def lookups(self) -> int:
+        return (
+            self.gateway_hits
+            + self.fetched_hits
+            + self.negative_hits
+            + self.coalesced
+            + self.http_fetches
+        )
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.lookups
+        if not lookups:
+            return 1.0
+        return 1.0 - (self.http_fetches / lookups)
+
+    def as_dict(self) -> dict[str, int | float]:
+        return dataclasses.asdict(self) | {
+            "lookups": self.lookups,
+            "hit_ratio": self.hit_ratio,
+        }
+
+
+class ChannelCache:
+    """
+    A layer on top of the gateway cache for channels and threads.
+
+    Remembers channels that had to be fetched over HTTP as well as
+    channels that could not be fetched (usually because they were deleted),
+    and makes concurrent lookups for the same ID share one request.
+    """
+
+    def __init__(
+        self,
+        *,
+        negative_ttl: float = 600,
+        fetched_ttl: float = 120,
+        warmup_ttl: float = 1800,
+        max_entries: int = 10000,
+    ) -> None:
+        self.negative_ttl = negative_ttl
+        self.fetched_ttl = fetched_ttl
+        self.warmup_ttl = warmup_ttl
+        self.max_entries = max_entries
+
+        self.stats = ChannelCacheStats()
+
+        self._negative: dict[int, float] = {}
+        self._fetched: dict[int, tuple[float, GuildChannelT]] = {}
+        self._warmed: dict[int, float] = {}
+        self._inflight: dict[int, asyncio.Task[GuildChannelT | None]] = {}
+
+    def _prune(self, cache: dict[int, typing.Any], now: float) -> None:
+        if len(cache) < self.max_entries:
+            return
+
+        for key in [
+            k for k, v in cache.items() if (v[0] if isinstance(v, tuple) else v) <= now
+        ]:
+            del cache[key]
+
+        # still too big? drop the oldest insertions
+        while len(cache) >= self.max_entries:
+            del cache[next(iter(cache))]
+
+    def _remember(
+        self, channel: GuildChannelT, now: float, ttl: float | None = None
+    ) -> None:
+        self._prune(self._fetched, now)
+        self._fetched[channel.id] = (now + (ttl or self.fetched_ttl), channel)
+        self._negative.pop(channel.id, None)
+
+    def invalidate(self, channel_id: int) -> None:
+        self._fetched.pop(channel_id, None)
+        self._negative.pop(channel_id, None)
+
+    def clear(self) -> None:
+        self._negative.clear()
+        self._fetched.clear()
+        self._warmed.clear()
+
+    async def _fetch(
+        self, guild: discord.Guild, channel_id: int
+    ) -> GuildChannelT | None:
+        self.stats.http_fetches += 1
+
+        try:
+            channel = await guild.fetch_channel(channel_id)
+        except (discord.NotFound, discord.Forbidden):
+            # these won't resolve themselves anytime soon
+            self.stats.http_failures += 1
+            now = time.monotonic()
+            self._prune(self._negative, now)
+            self._negative[channel_id] = now + self.negative_ttl
+            return None
+        except discord.HTTPException:
+            self.stats.http_failures += 1
+            return None
+
+        self._remember(channel, time.monotonic())
+        return channel
+
+    async def getch(
+        self, guild: discord.Guild, channel_id: int
+    ) -> GuildChannelT | None:
+        if not channel_id:
+            return None
+
+        # annoying, guild.get_or_fetch doesn't work with threads, so we have to do this manually
+        if channel := guild.get_channel_or_thread(channel_id):
+            self.stats.gateway_hits += 1
+            return channel
+
+        now = time.monotonic()
+
+        if (expiry := self._negative.get(channel_id)) is not None:
+            if expiry > now:
+                self.stats.negative_hits += 1
+                return None
+            del self._negative[channel_id]
+
+        if (entry := self._fetched.get(channel_id)) is not None:
+            if entry[0] > now:
+                self.stats.fetched_hits += 1
+                return entry[1]
+            del self._fetched[channel_id]
+
+        if task := self._inflight.get(channel_id):
+            self.stats.coalesced += 1
+        else:
+            task = asyncio.create_task(self._fetch(guild, channel_id))
+            self._inflight[channel_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(channel_id, None))
+
+        # shield so that one cancelled caller doesn't cancel everyone else's fetch
+        return await asyncio.shield(task)
+
+    async def warm_up(self, guild: discord.Guild, *, force: bool = False) -> int:
+        """
+        Fetches every channel and active thread in the guild, two requests in
+        total, and remembers the ones the gateway cache doesn't know about
+        until the guild can be warmed up again.
+
+        Returns:
+            The number of channels and threads that were added.
+        """
+        now = time.monotonic()
+        if not force and self._warmed.get(guild.id, 0) > now:
+            return 0
+
+        self._warmed[guild.id] = now + self.warmup_ttl
+        self.stats.warmups += 1
+
+        found: list[GuildChannelT] = []
+        for fetch in (guild.fetch_channels, guild.active_threads):
+            self.stats.warmup_requests += 1
+            try:
+                found.extend(await fetch())
+            except discord.HTTPException:
+                self.stats.http_failures += 1
+
+        now = time.monotonic()
+        added = 0
+        for channel in found:
+            if guild.get_channel_or_thread(channel.id):
+                continue
+            self._remember(channel, now, self.warmup_ttl)
+            added += 1
+
+        return added
+
+
+channel_cache = ChannelCache()
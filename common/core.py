@@ -10,6 +10,7 @@ file, You can obtain one at https://mozilla.org/MPL/2.0/.
 import asyncio
 import collections
 import datetime
+import time
 
 import discord
 import typing_extensions as typing
@@ -17,6 +18,12 @@ from discord.ext import bridge, commands
 
 import common.models as models
 
+if typing.TYPE_CHECKING:
+    from common.defer import LatencyTracker
+    from common.dice_pool import DicePool
+    from common.http_client import HTTPClient
+    from common.metrics import MetricsServer
+
 __all__ = (
     "Cog",
     "Interaction",
@@ -63,11 +70,38 @@ class THIAContextMixin:
 
 class THIABridgeApplicationContext(THIAContextMixin, bridge.BridgeApplicationContext):
     channel_id: int
+    # used by the adaptive auto defer
+    defer_ephemeral: bool | None
+    responded_at: float | None
+
+    def __init__(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+        self.defer_ephemeral = None
+        self.responded_at = None
+        super().__init__(*args, **kwargs)
 
     async def defer(self, *, ephemeral: bool = False, invisible: bool = True) -> None:
-        await super().defer(ephemeral=ephemeral, invisible=invisible)
+        if self.interaction.response.is_done():
+            return
+
+        try:
+            await super().defer(ephemeral=ephemeral, invisible=invisible)
+        except discord.InteractionResponded:
+            # the auto defer got there first
+            return
         self.ephemeral = ephemeral
 
+    async def respond(
+        self, *args: typing.Any, **kwargs: typing.Any
+    ) -> discord.Interaction | discord.WebhookMessage:
+        if self.responded_at is None:
+            self.responded_at = time.monotonic()
+
+        try:
+            return await super().respond(*args, **kwargs)
+        except discord.InteractionResponded:
+            # a delayed auto defer can land between the check and the response
+            return await self.followup.send(*args, **kwargs)
+
     if typing.TYPE_CHECKING:
         # very funny way to make sure not to use the send method
         async def send(self) -> None: ...
@@ -92,6 +126,14 @@ class THIABase(bridge.AutoShardedBot):
     background_tasks: set[asyncio.Task]
     msg_enabled_bullets_guilds: set[int]
     gacha_locks: collections.defaultdict[str, asyncio.Lock]
+    command_latencies: "LatencyTracker"
+    http_client: "HTTPClient"
+    dice_pool: "DicePool | None"
+    metrics_server: "MetricsServer | None"
+    draining: bool
+    event_tasks: set[asyncio.Task]
+    ready_shards: set[int]
+    closing_tasks: set[asyncio.Task]
 
     async def get_application_context(
         self,
@@ -0,0 +1,209 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import asyncio
+import collections
+import contextlib
+import statistics
+import time
+
+import discord
+import ragwort
+import typing_extensions as typing
+
+if typing.TYPE_CHECKING:
+    from common.core import THIABase
+
+# like common.caches, this module is not reloaded by extensions
+
+__all__ = (
+    "LatencyTracker",
+    "resolve_auto_defer",
+    "resolve_command",
+    "setup_adaptive_auto_defer",
+)
+
+
+class LatencyTracker:
+    """
+    Keeps a rolling window of how long each command takes to respond,
+    and uses it to pick how long to wait before deferring.
+    """
+
+    def __init__(
+        self,
+        *,
+        window: int = 250,
+        min_samples: int = 20,
+        headroom: float = 1.25,
+        min_budget: float = 0.25,
+    ) -> None:
+        self.window = window
+        self.min_samples = min_samples
+        self.headroom = headroom
+        self.min_budget = min_budget
+        self._samples: collections.defaultdict[str, collections.deque[float]] = (
+            collections.defaultdict(lambda: collections.deque(maxlen=self.window))
+        )
+        self.deferred: collections.Counter[str] = collections.Counter()
+
+    def record(self, name: str, duration: float) -> None:
+        self._samples[name].append(duration)
+
+    def percentiles(self, name: str) -> tuple[float, float, float] | None:
+        samples = self._samples.get(name)
+        if not samples:
+            return None
+        if len(samples) == 1:
+            return samples[0], samples[0], samples[0]
+
+        cuts = statistics.quantiles(samples, n=100, method="inclusive")
+        return cuts[49], cuts[89], cuts[98]
+
+    def budget_for(self, name: str, max_budget: float) -> float:
+        percentiles = self.percentiles(name)
+        if percentiles is None or len(self._samples[name]) < self.min_samples:
+            return max_budget
+
+        p50, _, p99 = percentiles
+        # if the command usually blows past the budget anyways, waiting only eats
+        # into the time we have left to respond, so defer right away instead
+        if p50 >= max_budget:
+            return 0
+
+        # otherwise, wait about as long as the command almost always takes - if
+        # it hasn't responded by then, it's an outlier that needs the time more
+        return min(max_budget, max(p99 * self.headroom, self.min_budget))
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        summary: dict[str, dict[str, float]] = {}
+        for name, samples in self._samples.items():
+            if not samples:
+                continue
+
+            p50, p90, p99 = self.percentiles(name)  # type: ignore
+            summary[name] = {
+                "count": len(samples),
+                "deferred": self.deferred[name],
+                "p50": p50,
+                "p90": p90,
+                "p99": p99,
+            }
+        return summary
+
+
+def resolve_command(
+    ctx: discord.ApplicationContext,
+) -> discord.ApplicationCommand | None:
+    # ctx.command is the top level group until the subcommand is prepared
+    command = ctx.command
+
+    if isinstance(command, discord.SlashCommandGroup):
+        option = ctx.interaction.data["options"][0]
+        command = discord.utils.find(
+            lambda x: x.name == option["name"], command.subcommands
+        )
+
+        if isinstance(command, discord.SlashCommandGroup):
+            sub_option = option["options"][0]
+            command = discord.utils.find(
+                lambda x: x.name == sub_option["name"], command.subcommands
+            )
+
+    return command
+
+
+def resolve_auto_defer(
+    ctx: discord.ApplicationContext,
+) -> tuple[str, ragwort.AutoDefer | None]:
+    # mirrors ragwort - a command only defers if it has auto_defer itself, and
+    # the cog and bot defaults are only for when there's no command at all
+    command = resolve_command(ctx)
+
+    if ctx.command is not None:
+        auto_defer = (
+            getattr(command.callback, "__auto_defer__", None) if command else None
+        )
+    elif ctx.cog is not None and getattr(ctx.cog, "__cog_auto_defer__", None):
+        auto_defer = ctx.cog.__cog_auto_defer__
+    else:
+        auto_defer = getattr(ctx.bot, "__default_auto_defer__", None)
+
+    name = command.qualified_name if command is not None else "unknown"
+    return name, auto_defer
+
+
+async def _defer(
+    ctx: discord.ApplicationContext, auto_defer: ragwort.AutoDefer
+) -> None:
+    if ctx.response.is_done():
+        return
+
+    # handlers can decide on visibility after they start running
+    ephemeral = getattr(ctx, "defer_ephemeral", None)
+    if ephemeral is None:
+        ephemeral = auto_defer.ephemeral
+
+    with contextlib.suppress(discord.InteractionResponded, discord.HTTPException):
+        await ctx.defer(ephemeral=ephemeral)
+
+
+def setup_adaptive_auto_defer(
+    bot: "THIABase",
+    *,
+    default: ragwort.AutoDefer | bool = True,
+    budget: float = 1.5,
+    tracker: LatencyTracker | None = None,
+) -> LatencyTracker:
+    """
+    A replacement for ragwort.setup_auto_defer that only defers if the command
+    hasn't responded within the given budget, saving a request for fast commands.
+
+    Commands are resolved the same way as ragwort does, so only commands with
+    auto_defer are deferred, and cog_auto_defer and the default only apply
+    when there's no command to resolve.
+
+    Returns:
+        The latency tracker used to pick budgets.
+    """
+    if default is not False:
+        bot.__default_auto_defer__ = ragwort.AutoDefer() if default is True else default
+
+    tracker = tracker or LatencyTracker()
+    original_invoke = bot.invoke_application_command
+
+    async def invoke_application_command(ctx: discord.ApplicationContext) -> None:
+        name, auto_defer = resolve_auto_defer(ctx)
+        handle: asyncio.TimerHandle | None = None
+
+        if auto_defer is not None and auto_defer.enabled:
+            delay = tracker.budget_for(name, budget)
+
+            def fire() -> None:
+                tracker.deferred[name] += 1
+                bot.create_task(_defer(ctx, auto_defer))
+
+            if delay <= 0:
+                tracker.deferred[name] += 1
+                await _defer(ctx, auto_defer)
+            else:
+                handle = asyncio.get_running_loop().call_later(delay, fire)
+
+        start = time.monotonic()
+        try:
+            await original_invoke(ctx)
+        finally:
+            if handle:
+                handle.cancel()
+
+            responded_at = getattr(ctx, "responded_at", None) or time.monotonic()
+            tracker.record(name, responded_at - start)
+
+    bot.invoke_application_command = invoke_application_command
+    return tracker
@@ -0,0 +1,268 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import asyncio
+import contextlib
+import logging
+import signal
+import sys
+from pathlib import Path
+
+import d20
+import orjson
+import typing_extensions as typing
+
+import common.rolls as rolls
+
+# like common.caches, this module is not reloaded by extensions
+# workers run this module directly, so it should only import what rolling needs
+
+__all__ = ("DicePool", "PoolUnavailable")
+
+logger = logging.getLogger("discord")
+
+# how long past the worker's own time limit to wait before killing it
+TIMEOUT_GRACE: float = 1
+# how long a worker gets to exit on its own when the pool closes
+CLOSE_TIMEOUT: float = 5
+# how long a roll waits for a free worker before giving up
+WAIT_TIMEOUT: float = 5
+# how long to wait before trying to start a worker again after it failed
+RESTART_DELAY: float = 5
+
+# errors a worker can send back, by name
+_ERRORS: dict[str, type[d20.RollError]] = {
+    "TooManyRolls": d20.TooManyRolls,
+    "RollValueError": d20.RollValueError,
+    "RollLimitExceeded": rolls.RollLimitExceeded,
+}
+
+
+class PoolUnavailable(d20.RollError):
+    """The pool had no worker free to roll with."""
+
+
+class _Worker:
+    __slots__ = ("process",)
+
+    def __init__(self, process: asyncio.subprocess.Process) -> None:
+        self.process = process
+
+    @classmethod
+    async def start(cls, timeout: float, memory_limit: int) -> "_Worker":
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            "common.dice_pool",
+            str(timeout),
+            str(memory_limit),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            cwd=Path(__file__).parent.parent,
+            # ctrl+c is for the bot, which stops the workers itself
+            start_new_session=True,
+        )
+        worker = cls(process)
+
+        # the worker says when it's ready, so the first roll isn't slow
+        try:
+            ready = await worker._readline()
+        except BaseException:
+            worker.kill()
+            raise
+        if not ready:
+            worker.kill()
+            raise RuntimeError("Dice worker failed to start.")
+        return worker
+
+    async def _readline(self) -> bytes:
+        return await self.process.stdout.readline()  # type: ignore
+
+    async def roll(self, expr: str, times: int, max_length: int) -> typing.Any:
+        stdin: asyncio.StreamWriter = self.process.stdin  # type: ignore
+        stdin.write(orjson.dumps([expr, times, max_length]) + b"\n")
+        await stdin.drain()
+
+        line = await self._readline()
+        if not line:
+            # usually the worker went over its memory limit and was killed
+            raise EOFError
+        return orjson.loads(line)
+
+    def kill(self) -> None:
+        with contextlib.suppress(ProcessLookupError):
+            self.process.kill()
+
+    async def close(self) -> None:
+        # workers exit once their input closes
+        self.process.stdin.close()  # type: ignore
+        try:
+            await asyncio.wait_for(self.process.wait(), CLOSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.kill()
+            await self.process.wait()
+
+
+class DicePool:
+    """
+    A small pool of worker processes for rolling dice, so that an expensive
+    expression can't stall the event loop. Workers only import what rolling
+    needs, and a worker that goes over its budget is killed and replaced.
+    """
+
+    def __init__(
+        self, *, workers: int = 2, timeout: float = 2, memory_limit: int = 0
+    ) -> None:
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+
+        self._idle: asyncio.Queue[_Worker] = asyncio.Queue()
+        self._all: set[_Worker] = set()
+        self._replacing: set[asyncio.Task[None]] = set()
+        self._closed = False
+
+    async def _start_worker(self) -> None:
+        worker = await _Worker.start(self.timeout, self.memory_limit)
+        if self._closed:
+            await worker.close()
+            return
+
+        self._all.add(worker)
+        self._idle.put_nowait(worker)
+
+    async def start(self) -> None:
+        await asyncio.gather(*(self._start_worker() for _ in range(self.workers)))
+
+    def _in_background(
+        self, coro: typing.Coroutine[typing.Any, typing.Any, None]
+    ) -> None:
+        task = asyncio.create_task(coro)
+        self._replacing.add(task)
+        task.add_done_callback(self._replacing.discard)
+
+    async def _restart(self) -> None:
+        # keeps trying, so one bad start doesn't shrink the pool for good
+        while not self._closed:
+            try:
+                await self._start_worker()
+            except Exception:
+                logger.exception("Failed to start a dice worker, retrying.")
+                await asyncio.sleep(RESTART_DELAY)
+            else:
+                return
+
+    async def _replace(self, worker: _Worker) -> None:
+        worker.kill()
+        self._all.discard(worker)
+        self._in_background(self._restart())
+        await worker.process.wait()
+
+    async def roll(
+        self, expr: str, times: int = 1, *, max_length: int = rolls.MAX_RESULT_LENGTH
+    ) -> list[tuple[str, int]]:
+        """
+        Rolls the expression like rolls.roll_results, in a worker process.
+
+        Raises:
+            d20.RollError: The roll failed, see rolls.roll_results.
+            rolls.RollLimitExceeded: The roll went over the time, output size
+                or memory budget.
+            PoolUnavailable: No worker was free in time, or there are none.
+        """
+        if self._closed or not (self._all or self._replacing):
+            raise PoolUnavailable("Dice rolling is unavailable right now.")
+
+        # replacements may take a while, or never come
+        try:
+            worker = await asyncio.wait_for(self._idle.get(), WAIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise PoolUnavailable(
+                "Dice rolling is busy right now. Please try again later."
+            ) from None
+
+        try:
+            response = await asyncio.wait_for(
+                worker.roll(expr, times, max_length), self.timeout + TIMEOUT_GRACE
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Dice worker did not respond to its time limit.")
+            await self._replace(worker)
+            raise rolls.RollLimitExceeded("The roll took too long.") from None
+        except (EOFError, ConnectionError):
+            await self._replace(worker)
+            raise rolls.RollLimitExceeded("The roll used too much memory.") from None
+        except asyncio.CancelledError:
+            # the worker is left mid-request, so it can't be reused
+            self._in_background(self._replace(worker))
+            raise
+
+        self._idle.put_nowait(worker)
+
+        if "error" in response:
+            error_type = _ERRORS.get(response["error"], d20.RollError)
+            raise error_type(response["message"])
+        return [(rendered, total) for rendered, total in response["results"]]
+
+    async def close(self) -> None:
+        self._closed = True
+        for task in tuple(self._replacing):
+            task.cancel()
+
+        workers = tuple(self._all)
+        self._all.clear()
+        await asyncio.gather(*(worker.close() for worker in workers))
+
+
+def _limit_memory(memory_limit: int) -> None:
+    # the limit is on top of what the worker needs just to start
+    with contextlib.suppress(ImportError, ValueError, OSError):
+        import resource
+
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[0]) * resource.getpagesize()
+        limit = current + memory_limit
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _serve(timeout: float, memory_limit: int) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    rolls.parse("1d20")
+    if memory_limit:
+        _limit_memory(memory_limit)
+
+    stdin = sys.stdin.buffer
+    stdout = sys.stdout.buffer
+    stdout.write(b"ready\n")
+    stdout.flush()
+
+    for line in stdin:
+        expr, times, max_length = orjson.loads(line)
+        try:
+            response = {
+                "results": rolls.roll_results(
+                    expr, times, max_length=max_length, timeout=timeout
+                )
+            }
+        except d20.RollError as e:
+            response = {"error": type(e).__name__, "message": str(e)}
+        except MemoryError:
+            response = {
+                "error": "RollLimitExceeded",
+                "message": "The roll used too much memory.",
+            }
+        except Exception:
+            response = {"error": "RollError", "message": "The roll failed."}
+
+        stdout.write(orjson.dumps(response) + b"\n")
+        stdout.flush()
+
+
+if __name__ == "__main__":
+    _serve(float(sys.argv[1]), int(sys.argv[2]))
@@ -0,0 +1,351 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import asyncio
+import dataclasses
+import operator
+
+import d20
+import numpy as np
+import typing_extensions as typing
+
+import common.rolls as rolls
+
+__all__ = (
+    "FFT_THRESHOLD",
+    "MAX_SUPPORT",
+    "MC_SAMPLES",
+    "SLOW_MC_SAMPLES",
+    "Distribution",
+    "calculate",
+    "distribution",
+)
+
+# the most outcomes an exact distribution can have before sampling is used
+MAX_SUPPORT: typing.Final[int] = 100_000
+# past this many outcomes, convolutions are done with FFTs
+FFT_THRESHOLD: typing.Final[int] = 512
+MC_SAMPLES: typing.Final[int] = 20_000
+# for operators that can only be sampled by actually rolling with d20
+SLOW_MC_SAMPLES: typing.Final[int] = 2_000
+
+_BINARY_OPS: dict[str, typing.Callable[[np.ndarray, np.ndarray], np.ndarray]] = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "//": operator.floordiv,
+    "%": operator.mod,
+    "<": operator.lt,
+    ">": operator.gt,
+    "==": operator.eq,
+    ">=": operator.ge,
+    "<=": operator.le,
+    "!=": operator.ne,
+}
+
+
+class _Unsupported(Exception):
+    pass
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class Distribution:
+    """
+    The outcomes of a roll and how likely each is. values is sorted.
+    samples is 0 if the distribution is exact.
+    """
+
+    values: np.ndarray
+    probs: np.ndarray
+    samples: int = 0
+
+    @property
+    def exact(self) -> bool:
+        return not self.samples
+
+    @property
+    def mean(self) -> float:
+        return float(np.dot(self.values, self.probs))
+
+    @property
+    def variance(self) -> float:
+        return float(np.dot((self.values - self.mean) ** 2, self.probs))
+
+    @property
+    def std(self) -> float:
+        return self.variance**0.5
+
+    @property
+    def min(self) -> int:
+        return int(self.values[0])
+
+    @property
+    def max(self) -> int:
+        return int(self.values[-1])
+
+    def percentile(self, percent: float) -> int:
+        """The smallest outcome that at least percent% of rolls are at or below."""
+        cdf = np.cumsum(self.probs)
+        index = np.searchsorted(cdf, percent / 100 - 1e-9)
+        return int(self.values[min(index, len(self.values) - 1)])
+
+    def at_least(self, target: int) -> float:
+        return float(self.probs[self.values >= target].sum())
+
+
+# exact distributions are (lowest outcome, probability of each outcome from there)
+_Pmf: typing.TypeAlias = tuple[int, np.ndarray]
+
+
+def _check_support(pmf: _Pmf) -> _Pmf:
+    if len(pmf[1]) > MAX_SUPPORT:
+        raise _Unsupported
+    return pmf
+
+
+def _convolve(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    size = len(left) + len(right) - 1
+    if size > MAX_SUPPORT:
+        raise _Unsupported
+    if min(len(left), len(right)) <= FFT_THRESHOLD:
+        return np.convolve(left, right)
+
+    # direct convolution is quadratic, which adds up quickly for big dice
+    result = np.fft.irfft(np.fft.rfft(left, size) * np.fft.rfft(right, size), size)
+    return np.clip(result, 0, None)
+
+
+def _add(left: _Pmf, right: _Pmf) -> _Pmf:
+    return left[0] + right[0], _convolve(left[1], right[1])
+
+
+def _negate(pmf: _Pmf) -> _Pmf:
+    return -(pmf[0] + len(pmf[1]) - 1), pmf[1][::-1]
+
+
+def _scale(pmf: _Pmf, factor: int) -> _Pmf:
+    if factor == 0:
+        return 0, np.ones(1)
+    if factor < 0:
+        return _scale(_negate(pmf), -factor)
+
+    scaled = np.zeros((len(pmf[1]) - 1) * factor + 1)
+    scaled[::factor] = pmf[1]
+    return _check_support((pmf[0] * factor, scaled))
+
+
+def _dice_pmf(num: int, size: int | str) -> _Pmf:
+    if size == "%":
+        # d20 rolls percentile dice as 0, 10, ..., 90
+        die = _scale((0, np.full(10, 0.1)), 10)
+    else:
+        die = (1, np.full(size, 1 / size))
+
+    # exponentiation by squaring, so 100 dice is only a handful of convolutions
+    result: _Pmf = (0, np.ones(1))
+    while num:
+        if num & 1:
+            result = _add(result, die)
+        num >>= 1
+        if num:
+            die = _add(die, die)
+    return result
+
+
+def _exact(node: d20.ast.ChildMixin) -> _Pmf:
+    if isinstance(node, d20.ast.Expression):
+        return _exact(node.roll)
+    if isinstance(node, d20.ast.AnnotatedNumber | d20.ast.Parenthetical):
+        return _exact(node.value)
+    if isinstance(node, d20.ast.Literal):
+        if not float(node.value).is_integer():
+            raise _Unsupported
+        return int(node.value), np.ones(1)
+    if isinstance(node, d20.ast.UnOp):
+        pmf = _exact(node.value)
+        return _negate(pmf) if node.op == "-" else pmf
+    if isinstance(node, d20.ast.BinOp):
+        left = _exact(node.left)
+        right = _exact(node.right)
+        if node.op == "+":
+            return _add(left, right)
+        if node.op == "-":
+            return _add(left, _negate(right))
+        if node.op == "*":
+            # only scaling by a constant keeps the outcomes evenly spaced
+            if len(right[1]) == 1:
+                return _scale(left, right[0])
+            if len(left[1]) == 1:
+                return _scale(right, left[0])
+        raise _Unsupported
+    if isinstance(node, d20.ast.OperatedSet):
+        if node.operations:
+            raise _Unsupported
+        return _exact(node.value)
+    if isinstance(node, d20.ast.NumberSet):
+        result: _Pmf = (0, np.ones(1))
+        for value in node.values:
+            result = _add(result, _exact(value))
+        return result
+    if isinstance(node, d20.ast.Dice):
+        if node.num and node.size != "%" and node.size < 1:
+            raise d20.RollValueError("Cannot roll a 0-sided die.")
+        return _dice_pmf(node.num, node.size)
+    raise _Unsupported
+
+
+def _is_vectorizable(operation: d20.ast.SetOperator | d20.ast.ExplodeOperator) -> bool:
+    if operation.op in {"mi", "ma"}:
+        return operation.sels[-1].cat is None
+    return (
+        operation.op in {"k", "p"}
+        and len(operation.sels) == 1
+        and operation.sels[0].cat in {"h", "l"}
+    )
+
+
+def _needs_slow_sampling(node: d20.ast.ChildMixin) -> bool:
+    if (
+        isinstance(node, d20.ast.OperatedSet)
+        and node.operations
+        and not (
+            isinstance(node.value, d20.ast.Dice)
+            and all(_is_vectorizable(operation) for operation in node.operations)
+        )
+    ):
+        return True
+    return any(_needs_slow_sampling(child) for child in node.children)
+
+
+def _sample_operated_dice(
+    node: d20.ast.OperatedSet, samples: int, rng: np.random.Generator
+) -> np.ndarray:
+    dice: d20.ast.Dice = node.value
+    values = _sample_dice_matrix(dice, samples, rng)
+    kept = np.ones(values.shape, dtype=bool)
+
+    for operation in node.operations:
+        selector = operation.sels[-1]
+        if operation.op == "mi":
+            values = np.where(kept & (values < selector.num), selector.num, values)
+            continue
+        if operation.op == "ma":
+            values = np.where(kept & (values > selector.num), selector.num, values)
+            continue
+
+        # dropped dice are sorted to the end, so they're never selected
+        if selector.cat == "h":
+            order = np.argsort(np.where(kept, -values, np.inf), axis=1, kind="stable")
+        else:
+            order = np.argsort(np.where(kept, values, np.inf), axis=1, kind="stable")
+        selected = np.zeros(values.shape, dtype=bool)
+        np.put_along_axis(selected, order[:, : selector.num], True, axis=1)
+        selected &= kept
+
+        kept = selected if operation.op == "k" else kept & ~selected
+
+    return np.where(kept, values, 0).sum(axis=1)
+
+
+def _sample_dice_matrix(
+    dice: d20.ast.Dice, samples: int, rng: np.random.Generator
+) -> np.ndarray:
+    if dice.num and dice.size != "%" and dice.size < 1:
+        raise d20.RollValueError("Cannot roll a 0-sided die.")
+    if dice.size == "%":
+        return rng.integers(0, 10, (samples, dice.num), dtype=np.int32) * 10
+    return rng.integers(1, dice.size + 1, (samples, dice.num), dtype=np.int32)
+
+
+def _sample(
+    node: d20.ast.ChildMixin,
+    samples: int,
+    rng: np.random.Generator,
+    roller: d20.Roller,
+) -> np.ndarray:
+    if isinstance(node, d20.ast.Expression):
+        return _sample(node.roll, samples, rng, roller)
+    if isinstance(node, d20.ast.AnnotatedNumber | d20.ast.Parenthetical):
+        return _sample(node.value, samples, rng, roller)
+    if isinstance(node, d20.ast.Literal):
+        return np.full(samples, node.value)
+    if isinstance(node, d20.ast.UnOp):
+        value = _sample(node.value, samples, rng, roller)
+        return -value if node.op == "-" else value
+    if isinstance(node, d20.ast.BinOp):
+        left = _sample(node.left, samples, rng, roller)
+        right = _sample(node.right, samples, rng, roller)
+        if node.op in {"/", "//", "%"} and not right.all():
+            raise d20.RollValueError("Cannot divide by zero.")
+        return _BINARY_OPS[node.op](left, right).astype(np.float64)
+    if isinstance(node, d20.ast.OperatedSet) and node.operations:
+        if isinstance(node.value, d20.ast.Dice) and all(
+            _is_vectorizable(operation) for operation in node.operations
+        ):
+            return _sample_operated_dice(node, samples, rng)
+        # rerolls and explosions depend on every previous die, so d20 has to
+        # roll them one at a time
+        return np.fromiter(
+            (roller.roll(d20.ast.Expression(node)).total for _ in range(samples)),
+            dtype=np.float64,
+            count=samples,
+        )
+    if isinstance(node, d20.ast.OperatedSet):
+        return _sample(node.value, samples, rng, roller)
+    if isinstance(node, d20.ast.NumberSet):
+        total = np.zeros(samples)
+        for value in node.values:
+            total += _sample(value, samples, rng, roller)
+        return total
+    if isinstance(node, d20.ast.Dice):
+        return _sample_dice_matrix(node, samples, rng).sum(axis=1)
+    raise d20.RollValueError("Unsupported dice expression.")
+
+
+def distribution(tree: d20.ast.Expression) -> Distribution:
+    """
+    Works out the distribution of a parsed expression. Expressions made of
+    plain dice and arithmetic are exact, everything else is sampled.
+
+    Raises:
+        d20.RollError: The expression can't be evaluated.
+    """
+    try:
+        offset, probs = _exact(tree)
+    except _Unsupported:
+        pass
+    else:
+        values = np.arange(offset, offset + len(probs))
+        # the ends are always possible, even if they're too unlikely for a
+        # float, while scaling leaves gaps that nothing can land on
+        possible = probs > 0
+        possible[[0, -1]] = True
+        return Distribution(values[possible], probs[possible])
+
+    samples = SLOW_MC_SAMPLES if _needs_slow_sampling(tree) else MC_SAMPLES
+    # each call gets its own roller, as their state isn't safe to share
+    # between threads
+    roller = d20.Roller(d20.RollContext(rolls.MAX_ROLLS))
+    results = _sample(tree, samples, np.random.default_rng(), roller)
+
+    # d20 truncates the final total, so the same is done here
+    values, counts = np.unique(np.trunc(results).astype(np.int64), return_counts=True)
+    return Distribution(values, counts / samples, samples)
+
+
+async def calculate(expr: str) -> Distribution:
+    """
+    Validates the expression and works out its distribution in a worker
+    thread, so large expressions don't block the event loop.
+
+    Raises:
+        d20.RollError: The expression is invalid or can't be evaluated.
+    """
+    return await asyncio.to_thread(distribution, rolls.validate(expr))
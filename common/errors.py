@@ -0,0 +1,309 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import asyncio
+import contextlib
+import dataclasses
+import datetime
+import logging
+import time
+import traceback
+
+import aiohttp
+import discord
+import sentry_sdk
+import typing_extensions as typing
+
+import common.profiler as profiler
+from common.core import (
+    THIABase,
+    THIABridgeApplicationContext,
+    THIABridgeContext,
+    THIABridgeExtContext,
+)
+
+# like common.caches, this module is not reloaded by extensions
+
+__all__ = ("ErrorReporter", "ErrorSummary", "fingerprint", "reporter")
+
+logger = logging.getLogger("discord")
+
+MESSAGE_LIMIT: typing.Final[int] = 2000
+
+
+def _innermost_frame(error: BaseException) -> traceback.FrameSummary | None:
+    tb = error.__traceback__
+    if tb is None:
+        return None
+
+    while tb.tb_next is not None:
+        tb = tb.tb_next
+    return traceback.FrameSummary(
+        tb.tb_frame.f_code.co_filename,
+        tb.tb_lineno,
+        tb.tb_frame.f_code.co_name,
+        lookup_line=False,
+    )
+
+
+def fingerprint(error: BaseException) -> tuple[str, str]:
+    """
+    Groups errors by their type and the line they were raised from.
+
+    Returns:
+        The fingerprint, and a short description of where the error came from.
+    """
+    frame = _innermost_frame(error)
+    location = (
+        f"{profiler.short_filename(frame.filename)}:{frame.lineno} in {frame.name}"
+        if frame
+        else "unknown"
+    )
+    error_type = type(error)
+    return f"{error_type.__module__}.{error_type.__qualname__}@{location}", location
+
+
+def _contexts(
+    ctx: THIABridgeContext | discord.Interaction | None,
+) -> dict[str, dict[str, typing.Any]]:
+    if isinstance(ctx, THIABridgeApplicationContext):
+        return {
+            type(ctx).__name__: {
+                "options": ctx.options,
+                "message": ctx.message,
+            }
+        }
+    if isinstance(ctx, THIABridgeExtContext):
+        return {
+            type(ctx).__name__: {
+                "args": ctx.args,
+                "kwargs": ctx.kwargs,
+                "message": ctx.message,
+            }
+        }
+    if isinstance(ctx, discord.Interaction):
+        return {
+            type(ctx).__name__: {
+                "data": ctx.data,
+                "type": ctx.type,
+            }
+        }
+    return {}
+
+
+@dataclasses.dataclass(slots=True)
+class ErrorSummary:
+    description: str
+    location: str
+    first_seen: datetime.datetime
+    last_seen: datetime.datetime
+    count: int = 0
+    reported: int = 0
+
+
+@dataclasses.dataclass(slots=True)
+class _Report:
+    error: BaseException
+    scope: sentry_sdk.Scope | None
+
+
+class ErrorReporter:
+    """
+    Reports errors from a background task, so that handling them never holds up
+    whatever ran into them.
+
+    Only the first few errors with the same fingerprint in each window are sent
+    to Sentry or logged with their traceback. Every error is counted, and the
+    counts are sent to the owner as a digest every so often.
+    """
+
+    def __init__(
+        self,
+        *,
+        window: float = 60,
+        burst: int = 3,
+        digest_interval: float = 600,
+        max_queued: int = 500,
+    ) -> None:
+        self.window = window
+        self.burst = burst
+        self.digest_interval = digest_interval
+        self.report_to_sentry = False
+
+        self.bot: THIABase | None = None
+        self.summaries: dict[str, ErrorSummary] = {}
+        self.total = 0
+        self.suppressed = 0
+        self.dropped = 0
+
+        self._window_started = time.monotonic()
+        self._window_counts: dict[str, int] = {}
+        self._queue: asyncio.Queue[_Report] = asyncio.Queue(max_queued)
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self, bot: THIABase) -> None:
+        if self.running:
+            return
+
+        self.bot = bot
+        self._tasks.append(asyncio.create_task(self._run(), name="error_reporter"))
+        if self.digest_interval > 0:
+            self._tasks.append(
+                asyncio.create_task(self._send_digests(), name="error_digest")
+            )
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+
+        # whatever is left is reported here, rather than lost
+        while not self._queue.empty():
+            self._capture(self._queue.get_nowait())
+            self._queue.task_done()
+
+    async def flush(self) -> None:
+        """Waits for every queued error to be reported."""
+        if self.running:
+            await self._queue.join()
+
+    def report(
+        self,
+        error: BaseException,
+        *,
+        ctx: THIABridgeContext | discord.Interaction | None = None,
+    ) -> None:
+        if isinstance(error, aiohttp.ServerDisconnectedError):
+            return
+
+        key, location = fingerprint(error)
+        now = discord.utils.utcnow()
+        self.total += 1
+
+        if (summary := self.summaries.get(key)) is None:
+            summary = self.summaries[key] = ErrorSummary(
+                description=f"{type(error).__name__}: {error}",
+                location=location,
+                first_seen=now,
+                last_seen=now,
+            )
+        summary.count += 1
+        summary.last_seen = now
+
+        if time.monotonic() - self._window_started >= self.window:
+            self._window_started = time.monotonic()
+            self._window_counts.clear()
+
+        seen = self._window_counts.get(key, 0)
+        self._window_counts[key] = seen + 1
+        if seen >= self.burst:
+            self.suppressed += 1
+            if seen == self.burst:
+                logger.warning(
+                    "Error %s keeps happening, not reporting it again for %.0fs.",
+                    key,
+                    self.window,
+                )
+            return
+
+        scope = None
+        if self.report_to_sentry:
+            # the scope has to be copied now, while it still has the context
+            # of whatever ran into the error
+            scope = sentry_sdk.get_current_scope().fork()
+            for name, data in _contexts(ctx).items():
+                scope.set_context(name, data)
+
+        report = _Report(error=error, scope=scope)
+        if not self.running:
+            self._capture(report)
+            summary.reported += 1
+            return
+
+        try:
+            self._queue.put_nowait(report)
+        except asyncio.QueueFull:
+            self.dropped += 1
+        else:
+            summary.reported += 1
+
+    def _capture(self, report: _Report) -> None:
+        if report.scope is not None:
+            sentry_sdk.capture_exception(report.error, scope=report.scope)
+        else:
+            logger.error("An error occured.", exc_info=report.error)
+
+    async def _run(self) -> None:
+        while True:
+            report = await self._queue.get()
+            try:
+                self._capture(report)
+            except Exception:
+                logger.exception("Failed to report an error.")
+            finally:
+                self._queue.task_done()
+
+            # capturing isn't async, so give everything else a turn in a storm
+            await asyncio.sleep(0)
+
+    def digest(self) -> list[str]:
+        """Summarizes the errors since the last digest, split into messages."""
+        summaries = sorted(self.summaries.values(), key=lambda s: s.count, reverse=True)
+        total = sum(s.count for s in summaries)
+
+        lines = [
+            f"**Error digest:** {total} error{'s' if total != 1 else ''},"
+            f" {len(summaries)} distinct."
+        ]
+        for summary in summaries:
+            description = discord.utils.escape_markdown(summary.description)
+            if len(description) > 200:
+                description = f"{description[:197]}..."
+
+            lines.append(
+                f"- `{summary.count}x` {description}\n  at `{summary.location}`,"
+                f" last <t:{int(summary.last_seen.timestamp())}:R>"
+            )
+        if self.dropped:
+            lines.append(f"{self.dropped} errors were dropped from a full queue.")
+
+        chunks: list[str] = []
+        current = ""
+        for line in lines:
+            line = line[:MESSAGE_LIMIT]
+            if len(current) + len(line) + 1 > MESSAGE_LIMIT:
+                chunks.append(current)
+                current = line
+            else:
+                current = f"{current}\n{line}" if current else line
+        chunks.append(current)
+        return chunks
+
+    async def _send_digests(self) -> None:
+        while True:
+            await asyncio.sleep(self.digest_interval)
+
+            # the owner is only known once the bot is ready
+            if not self.summaries or not self.bot or not self.bot.owner:
+                continue
+
+            chunks = self.digest()
+            self.summaries = {}
+            self.dropped = 0
+
+            with contextlib.suppress(discord.HTTPException):
+                for chunk in chunks:
+                    await self.bot.owner.send(chunk)
+
+
+reporter = ErrorReporter()
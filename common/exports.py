@@ -7,13 +7,27 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
+import asyncio
+import collections
+import tempfile
+
 import d20
+import orjson
 import pydantic
 import typing_extensions as typing
+from tortoise.queryset import QuerySet
 
+import common.models as models
+import common.rolls as rolls
 import common.utils as utils
 
-_d20_roll = d20.Roller(d20.RollContext(100)).roll
+EXPORT_PAGE_SIZE: typing.Final[int] = 500
+MAX_EXPORT_SIZE: typing.Final[int] = 10000000
+# exports smaller than this never touch the disk
+SPOOL_SIZE: typing.Final[int] = 1024 * 1024
+
+ExportRow: typing.TypeAlias = typing.Mapping[str, typing.Any]
+ModelT = typing.TypeVar("ModelT", bound=pydantic.BaseModel)
 
 
 def _replace_smart_punc(text: typing.Any) -> typing.Any:
@@ -52,7 +66,7 @@ def _validate_http_url(url: str) -> str:
 
 def _validate_dice_value(value: str) -> str:
     try:
-        _d20_roll(value)
+        rolls.validate(value)
     except d20.errors.RollSyntaxError as e:
         raise ValueError(f"Invalid dice roll syntax: {e!s}") from None
     except d20.errors.TooManyRolls:
@@ -203,9 +217,15 @@ GachaItemContainer = pydantic.RootModel[
     ]
 ]
 
+# built once up front, and safe to share between worker threads
+_gacha_item_adapter = pydantic.TypeAdapter(GachaItemContainer)
+_dice_entry_adapter = pydantic.TypeAdapter(DiceEntryv1Container)
+_items_system_item_adapter = pydantic.TypeAdapter(ItemsSystemItemv1Container)
+_bullet_entry_adapter = pydantic.TypeAdapter(TruthBulletEntryv1Container)
+
 
 def handle_gacha_item_data(json_data: str | bytes) -> list[GachaItemv2]:
-    container = GachaItemContainer.model_validate_json(json_data).root
+    container = _gacha_item_adapter.validate_json(json_data).root
 
     if isinstance(container, GachaItemv1Container):
         items = [
@@ -224,15 +244,147 @@ def handle_gacha_item_data(json_data: str | bytes) -> list[GachaItemv2]:
 
 
 def handle_dice_entry_data(json_data: str | bytes) -> list[DiceEntryv1]:
-    container = DiceEntryv1Container.model_validate_json(json_data)
-    return container.entries
+    return _dice_entry_adapter.validate_json(json_data).entries
 
 
 def handle_items_system_item_data(json_data: str | bytes) -> list[ItemsSystemItemv1]:
-    container = ItemsSystemItemv1Container.model_validate_json(json_data)
-    return container.items
+    return _items_system_item_adapter.validate_json(json_data).items
 
 
 def handle_bullet_entry_data(json_data: str | bytes) -> list[TruthBulletEntryv1]:
-    container = TruthBulletEntryv1Container.model_validate_json(json_data)
-    return container.entries
+    return _bullet_entry_adapter.validate_json(json_data).entries
+
+
+async def validate_import(
+    handler: typing.Callable[[str | bytes], list[ModelT]], json_data: str | bytes
+) -> list[ModelT]:
+    """
+    Runs one of the handlers above in a worker thread, so that validating a
+    large file doesn't hold up the event loop.
+    """
+    return await asyncio.to_thread(handler, json_data)
+
+
+class ExportTooLarge(Exception):
+    pass
+
+
+async def paged_values(
+    queryset: QuerySet,
+    *fields: str,
+    page_size: int = EXPORT_PAGE_SIZE,
+) -> typing.AsyncIterator[list[dict[str, typing.Any]]]:
+    """
+    Yields the given fields of every row in the queryset, a page at a time.
+    Pages are fetched by id rather than offset, so each one is an index lookup.
+    """
+    include_id = "id" in fields
+    query_fields = fields if include_id else ("id", *fields)
+    last_id = 0
+
+    while True:
+        rows = (
+            await queryset.filter(id__gt=last_id)
+            .order_by("id")
+            .limit(page_size)
+            .values(*query_fields)
+        )
+        if not rows:
+            return
+
+        last_id = rows[-1]["id"]
+        if not include_id:
+            for row in rows:
+                del row["id"]
+
+        yield rows
+        if len(rows) < page_size:
+            return
+
+
+async def truth_bullet_pages(
+    bullets: QuerySet[models.TruthBullet],
+) -> typing.AsyncIterator[list[TruthBulletEntryDict]]:
+    """
+    Like paged_values, but yields Truth Bullets in the format they're
+    exported in, with each page's aliases fetched in one query.
+    """
+    async for rows in paged_values(
+        bullets, "id", "trigger", "description", "hidden", "image"
+    ):
+        aliases: collections.defaultdict[int, list[str]] = collections.defaultdict(list)
+        for bullet_id, alias in await models.TruthBulletAlias.filter(
+            bullet_id__in=[row["id"] for row in rows]
+        ).values_list("bullet_id", "alias"):
+            aliases[bullet_id].append(alias)
+
+        yield [
+            {
+                "trigger": row["trigger"],
+                "description": row["description"],
+                "hidden": row["hidden"],
+                "image": row["image"],
+                "aliases": aliases[row["id"]],
+            }
+            for row in rows
+        ]
+
+
+def _encode_rows(rows: typing.Iterable[ExportRow]) -> bytes:
+    # matches what dumping the whole export with OPT_INDENT_2 would give
+    return b",\n".join(
+        b"    "
+        + orjson.dumps(row, option=orjson.OPT_INDENT_2).replace(b"\n", b"\n    ")
+        for row in rows
+    )
+
+
+async def write_json_export(
+    version: int,
+    key: str,
+    pages: typing.AsyncIterable[typing.Sequence[ExportRow]],
+    *,
+    max_size: int = MAX_EXPORT_SIZE,
+) -> typing.BinaryIO:
+    """
+    Writes the export a page at a time to a temporary file, which stays in
+    memory until it gets large. Encoding and writing happen in a worker thread.
+
+    Returns:
+        The file, seeked to the start. The caller has to close it.
+
+    Raises:
+        ExportTooLarge: The export would go over max_size bytes.
+    """
+    # closed by the caller once it's sent
+    file = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)  # noqa: SIM115
+    written = 0
+
+    def write(data: bytes) -> None:
+        nonlocal written
+        written += len(data)
+        if written > max_size:
+            raise ExportTooLarge()
+        file.write(data)
+
+    def write_page(rows: typing.Sequence[ExportRow], first: bool) -> None:
+        write(b"\n" if first else b",\n")
+        write(_encode_rows(rows))
+
+    try:
+        write(f'{{\n  "version": {version},\n  "{key}": ['.encode())
+
+        first = True
+        async for rows in pages:
+            if not rows:
+                continue
+            await asyncio.to_thread(write_page, rows, first)
+            first = False
+
+        write(b"]\n}" if first else b"\n  ]\n}")
+        file.seek(0)
+    except BaseException:
+        file.close()
+        raise
+
+    return file
@@ -9,12 +9,220 @@ file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 import discord
 import typing_extensions as typing
-from tortoise.connection import get_connection
 from tortoise.functions import Lower
 
 import common.models as models
+import common.statements as statements
 import common.utils as utils
 
+_BULLETS_STR = """
+SELECT
+    trigger, strict_word_similarity($2, trigger) AS sml
+FROM thiatruthbullets
+    WHERE channel_id = $1 {extra}
+    AND $2 <% trigger
+ORDER BY sml DESC LIMIT 25;
+""".strip()
+
+AUTOCOMPLETE_BULLETS = statements.registry.register(
+    "autocomplete_bullets",
+    _BULLETS_STR.format(extra=""),
+    statements.column("trigger"),
+)
+AUTOCOMPLETE_BULLETS_NOT_FOUND = statements.registry.register(
+    "autocomplete_bullets_not_found",
+    _BULLETS_STR.format(extra="AND found = FALSE"),
+    statements.column("trigger"),
+)
+
+AUTOCOMPLETE_GACHA_ITEM = statements.registry.register(
+    "autocomplete_gacha_item",
+    """
+    SELECT
+        name, strict_word_similarity($2, name) AS sml
+    FROM thiagachaitems
+        WHERE guild_id = $1
+        AND $2 <% name
+    ORDER BY sml DESC LIMIT 25;
+    """.strip(),
+    statements.column("name"),
+)
+
+AUTOCOMPLETE_GACHA_USER_ITEM_EMPTY = statements.registry.register(
+    "autocomplete_gacha_user_item_empty",
+    """
+    SELECT
+        DISTINCT ON (LOWER(name)) name
+    FROM thiagachaitems
+        JOIN thiagachaitemtoplayer ON thiagachaitemtoplayer.item_id = thiagachaitems.id
+        JOIN thiagachaplayers ON thiagachaplayers.id = thiagachaitemtoplayer.player_id
+    WHERE
+        thiagachaitems.guild_id = $1
+        AND thiagachaplayers.guild_id = $1
+        AND thiagachaplayers.user_id = $2
+    ORDER BY LOWER(name) LIMIT 25;
+    """.strip(),
+    statements.column("name"),
+)
+AUTOCOMPLETE_GACHA_USER_ITEM = statements.registry.register(
+    "autocomplete_gacha_user_item",
+    """
+    SELECT
+        name,
+        sml
+    FROM
+        (
+            SELECT
+                DISTINCT ON (thiagachaitems.id) thiagachaitems.id,
+                thiagachaitems.name,
+                strict_word_similarity($3, thiagachaitems.name) AS sml
+            FROM thiagachaitems
+                JOIN thiagachaitemtoplayer ON thiagachaitemtoplayer.item_id = thiagachaitems.id
+                JOIN thiagachaplayers ON thiagachaplayers.id = thiagachaitemtoplayer.player_id
+            WHERE
+                thiagachaitems.guild_id = $1
+                AND thiagachaplayers.guild_id = $1
+                AND thiagachaplayers.user_id = $2
+                AND $3 <% thiagachaitems.name
+            ORDER BY thiagachaitems.id LIMIT 25
+        )
+    ORDER BY sml DESC;
+    """.strip(),
+    statements.column("name"),
+)
+
+AUTOCOMPLETE_DICE_ENTRIES = statements.registry.register(
+    "autocomplete_dice_entries",
+    """
+    SELECT
+        name, strict_word_similarity($3, name) AS sml
+    FROM thiadicenetry
+        WHERE guild_id = $1
+        AND user_id = $2
+        AND $3 <% name
+    ORDER BY sml DESC LIMIT 25;
+    """.strip(),
+    statements.column("name"),
+)
+
+AUTOCOMPLETE_ITEM_EMPTY = statements.registry.register(
+    "autocomplete_item_empty",
+    """
+    SELECT
+        DISTINCT ON (LOWER(name)) name
+    FROM thiaitemssystemitems
+        WHERE guild_id = $1
+    ORDER BY LOWER(name) LIMIT 25;
+    """.strip(),
+    statements.column("name"),
+)
+AUTOCOMPLETE_ITEM = statements.registry.register(
+    "autocomplete_item",
+    """
+    SELECT
+        name, strict_word_similarity($2, name) AS sml
+    FROM thiaitemssystemitems
+        WHERE guild_id = $1
+        AND $2 <% name
+    ORDER BY sml DESC LIMIT 25;
+    """.strip(),
+    statements.column("name"),
+)
+
+_ITEM_CHANNEL_EMPTY_STR = """
+SELECT
+    DISTINCT ON (LOWER(thiaitemssystemitems.name)) thiaitemssystemitems.name
+FROM thiaitemssystemitems
+    JOIN thiaitemrelation ON thiaitemrelation.item_id = thiaitemssystemitems.id
+WHERE
+    thiaitemrelation.object_id = $1 {extra}
+ORDER BY LOWER(thiaitemssystemitems.name) LIMIT 25;
+""".strip()
+_ITEM_CHANNEL_STR = """
+SELECT
+    name,
+    sml
+FROM
+    (
+        SELECT
+            DISTINCT ON (thiaitemssystemitems.id) thiaitemssystemitems.id,
+            thiaitemssystemitems.name,
+            strict_word_similarity($2, thiaitemssystemitems.name) AS sml
+        FROM thiaitemssystemitems
+            JOIN thiaitemrelation ON thiaitemrelation.item_id = thiaitemssystemitems.id
+        WHERE
+            thiaitemrelation.object_id = $1 {extra}
+            AND $2 <% thiaitemssystemitems.name
+        ORDER BY thiaitemssystemitems.id LIMIT 25
+    )
+ORDER BY sml DESC;
+""".strip()
+_TAKEABLE_EXTRA = "AND thiaitemssystemitems.takeable = TRUE"
+
+AUTOCOMPLETE_ITEM_CHANNEL_EMPTY = statements.registry.register(
+    "autocomplete_item_channel_empty",
+    _ITEM_CHANNEL_EMPTY_STR.format(extra=""),
+    statements.column("name"),
+)
+AUTOCOMPLETE_ITEM_CHANNEL_TAKEABLE_EMPTY = statements.registry.register(
+    "autocomplete_item_channel_takeable_empty",
+    _ITEM_CHANNEL_EMPTY_STR.format(extra=_TAKEABLE_EXTRA),
+    statements.column("name"),
+)
+AUTOCOMPLETE_ITEM_CHANNEL = statements.registry.register(
+    "autocomplete_item_channel",
+    _ITEM_CHANNEL_STR.format(extra=""),
+    statements.column("name"),
+)
+AUTOCOMPLETE_ITEM_CHANNEL_TAKEABLE = statements.registry.register(
+    "autocomplete_item_channel_takeable",
+    _ITEM_CHANNEL_STR.format(extra=_TAKEABLE_EXTRA),
+    statements.column("name"),
+)
+
+AUTOCOMPLETE_ITEM_USER_EMPTY = statements.registry.register(
+    "autocomplete_item_user_empty",
+    """
+    SELECT
+        DISTINCT ON (LOWER(thiaitemssystemitems.name)) thiaitemssystemitems.name
+    FROM thiaitemssystemitems
+        JOIN thiaitemrelation ON thiaitemrelation.item_id = thiaitemssystemitems.id
+    WHERE
+        thiaitemssystemitems.guild_id = $1
+        AND thiaitemrelation.object_id = $2
+    ORDER BY LOWER(thiaitemssystemitems.name) LIMIT 25;
+    """.strip(),
+    statements.column("name"),
+)
+AUTOCOMPLETE_ITEM_USER = statements.registry.register(
+    "autocomplete_item_user",
+    """
+    SELECT
+        name,
+        sml
+    FROM
+        (
+            SELECT
+                DISTINCT ON (thiaitemssystemitems.id) thiaitemssystemitems.id,
+                thiaitemssystemitems.name,
+                strict_word_similarity($3, thiaitemssystemitems.name) AS sml
+            FROM thiaitemssystemitems
+                JOIN thiaitemrelation ON thiaitemrelation.item_id = thiaitemssystemitems.id
+            WHERE
+                thiaitemssystemitems.guild_id = $1
+                AND thiaitemrelation.object_id = $2
+                AND $3 <% thiaitemssystemitems.name
+            ORDER BY id LIMIT 25
+        )
+    ORDER BY sml DESC;
+    """.strip(),
+    statements.column("name"),
+)
+
+
+def _choices(names: typing.Iterable[str]) -> list[discord.OptionChoice]:
+    return [discord.OptionChoice(name=name, value=name) for name in names]
+
 
 async def autocomplete_bullets(
     trigger: str,
@@ -42,22 +250,12 @@ async def autocomplete_bullets(
             discord.OptionChoice(name=entry, value=entry) for entry in channel_bullets
         ]
 
-    conn = get_connection("default")
-    data = await conn.execute_query_dict(
-        f"""
-        SELECT
-            trigger, strict_word_similarity($2, trigger) AS sml
-        FROM thiatruthbullets
-            WHERE channel_id = $1 {"AND found = FALSE" if only_not_found else ""}
-            AND $2 <% trigger
-        ORDER BY sml DESC LIMIT 25;
-        """.strip(),  # noqa: S608
-        values=[int(channel), utils.replace_smart_punc(trigger)],
+    statement = (
+        AUTOCOMPLETE_BULLETS_NOT_FOUND if only_not_found else AUTOCOMPLETE_BULLETS
+    )
+    return _choices(
+        await statement.fetch(int(channel), utils.replace_smart_punc(trigger))
     )
-    return [
-        discord.OptionChoice(name=entry["trigger"], value=entry["trigger"])
-        for entry in data
-    ]
 
 
 async def autocomplete_aliases(
@@ -114,21 +312,11 @@ async def autocomplete_gacha_item(
         )
         return [discord.OptionChoice(name=entry, value=entry) for entry in gacha_items]
 
-    conn = get_connection("default")
-    data = await conn.execute_query_dict(
-        """
-        SELECT
-            name, strict_word_similarity($2, name) AS sml
-        FROM thiagachaitems
-            WHERE guild_id = $1
-            AND $2 <% name
-        ORDER BY sml DESC LIMIT 25;
-        """.strip(),
-        values=[int(ctx.interaction.guild_id), utils.replace_smart_punc(name)],
+    return _choices(
+        await AUTOCOMPLETE_GACHA_ITEM.fetch(
+            int(ctx.interaction.guild_id), utils.replace_smart_punc(name)
+        )
     )
-    return [
-        discord.OptionChoice(name=entry["name"], value=entry["name"]) for entry in data
-    ]
 
 
 async def autocomplete_gacha_user_item(
@@ -143,57 +331,18 @@ async def autocomplete_gacha_user_item(
     if not user:
         user = int(ctx.interaction.user.id)
 
-    conn = get_connection("default")
-
     if not name:
-        data = await conn.execute_query_dict(
-            """
-            SELECT
-                DISTINCT ON (LOWER(name)) name
-            FROM thiagachaitems
-                JOIN thiagachaitemtoplayer ON thiagachaitemtoplayer.item_id = thiagachaitems.id
-                JOIN thiagachaplayers ON thiagachaplayers.id = thiagachaitemtoplayer.player_id
-            WHERE
-                thiagachaitems.guild_id = $1
-                AND thiagachaplayers.guild_id = $1
-                AND thiagachaplayers.user_id = $2
-            ORDER BY LOWER(name) LIMIT 25;
-            """.strip(),
-            values=[int(ctx.interaction.guild_id), int(user)],
+        return _choices(
+            await AUTOCOMPLETE_GACHA_USER_ITEM_EMPTY.fetch(
+                int(ctx.interaction.guild_id), int(user)
+            )
         )
-    else:
-        data = await conn.execute_query_dict(
-            """
-            SELECT
-                name,
-                sml
-            FROM
-                (
-                    SELECT
-                        DISTINCT ON (thiagachaitems.id) thiagachaitems.id,
-                        thiagachaitems.name,
-                        strict_word_similarity($3, thiagachaitems.name) AS sml
-                    FROM thiagachaitems
-                        JOIN thiagachaitemtoplayer ON thiagachaitemtoplayer.item_id = thiagachaitems.id
-                        JOIN thiagachaplayers ON thiagachaplayers.id = thiagachaitemtoplayer.player_id
-                    WHERE
-                        thiagachaitems.guild_id = $1
-                        AND thiagachaplayers.guild_id = $1
-                        AND thiagachaplayers.user_id = $2
-                        AND $3 <% thiagachaitems.name
-                    ORDER BY thiagachaitems.id LIMIT 25
-                )
-            ORDER BY sml DESC;
-            """.strip(),
-            values=[
-                int(ctx.interaction.guild_id),
-                int(user),
-                utils.replace_smart_punc(name),
-            ],
+
+    return _choices(
+        await AUTOCOMPLETE_GACHA_USER_ITEM.fetch(
+            int(ctx.interaction.guild_id), int(user), utils.replace_smart_punc(name)
         )
-    return [
-        discord.OptionChoice(name=entry["name"], value=entry["name"]) for entry in data
-    ]
+    )
 
 
 async def autocomplete_gacha_optional_user_item(
@@ -235,26 +384,11 @@ async def autocomplete_dice_entries_user(
         )
         return [discord.OptionChoice(name=entry, value=entry) for entry in dice_entries]
 
-    conn = get_connection("default")
-    data = await conn.execute_query_dict(
-        """
-        SELECT
-            name, strict_word_similarity($3, name) AS sml
-        FROM thiadicenetry
-            WHERE guild_id = $1
-            AND user_id = $2
-            AND $3 <% name
-        ORDER BY sml DESC LIMIT 25;
-        """.strip(),
-        values=[
-            int(ctx.interaction.guild_id),
-            int(user),
-            utils.replace_smart_punc(name),
-        ],
+    return _choices(
+        await AUTOCOMPLETE_DICE_ENTRIES.fetch(
+            int(ctx.interaction.guild_id), int(user), utils.replace_smart_punc(name)
+        )
     )
-    return [
-        discord.OptionChoice(name=entry["name"], value=entry["name"]) for entry in data
-    ]
 
 
 async def autocomplete_dice_entries_admin(
@@ -274,35 +408,16 @@ async def autocomplete_item(
     name: str,
     **_: typing.Any,
 ) -> list[discord.OptionChoice]:
-    conn = get_connection("default")
-
     if not name:
-        data = await conn.execute_query_dict(
-            """
-            SELECT
-                DISTINCT ON (LOWER(name)) name
-            FROM thiaitemssystemitems
-                WHERE guild_id = $1
-            ORDER BY LOWER(name) LIMIT 25;
-            """.strip(),
-            values=[int(ctx.interaction.guild_id)],
-        )
-    else:
-        data = await conn.execute_query_dict(
-            """
-            SELECT
-                name, strict_word_similarity($2, name) AS sml
-            FROM thiaitemssystemitems
-                WHERE guild_id = $1
-                AND $2 <% name
-            ORDER BY sml DESC LIMIT 25;
-            """.strip(),
-            values=[int(ctx.interaction.guild_id), utils.replace_smart_punc(name)],
+        return _choices(
+            await AUTOCOMPLETE_ITEM_EMPTY.fetch(int(ctx.interaction.guild_id))
         )
 
-    return [
-        discord.OptionChoice(name=entry["name"], value=entry["name"]) for entry in data
-    ]
+    return _choices(
+        await AUTOCOMPLETE_ITEM.fetch(
+            int(ctx.interaction.guild_id), utils.replace_smart_punc(name)
+        )
+    )
 
 
 async def autocomplete_item_channel(
@@ -324,48 +439,20 @@ async def autocomplete_item_channel(
         if not config.autosuggest:
             return []
 
-    conn = get_connection("default")
-
     if not name:
-        data = await conn.execute_query_dict(
-            f"""
-            SELECT
-                DISTINCT ON (LOWER(thiaitemssystemitems.name)) thiaitemssystemitems.name
-            FROM thiaitemssystemitems
-                JOIN thiaitemrelation ON thiaitemrelation.item_id = thiaitemssystemitems.id
-            WHERE
-                thiaitemrelation.object_id = $1 {"AND thiaitemssystemitems.takeable = TRUE" if check_takeable else ""}
-            ORDER BY LOWER(thiaitemssystemitems.name) LIMIT 25;
-            """.strip(),  # noqa: S608
-            values=[int(channel)],
-        )
-    else:
-        data = await conn.execute_query_dict(
-            f"""
-            SELECT
-                name,
-                sml
-            FROM
-                (
-                    SELECT
-                        DISTINCT ON (thiaitemssystemitems.id) thiaitemssystemitems.id,
-                        thiaitemssystemitems.name,
-                        strict_word_similarity($2, thiaitemssystemitems.name) AS sml
-                    FROM thiaitemssystemitems
-                        JOIN thiaitemrelation ON thiaitemrelation.item_id = thiaitemssystemitems.id
-                    WHERE
-                        thiaitemrelation.object_id = $1 {"AND thiaitemssystemitems.takeable = TRUE" if check_takeable else ""}
-                        AND $2 <% thiaitemssystemitems.name
-                    ORDER BY thiaitemssystemitems.id LIMIT 25
-                )
-            ORDER BY sml DESC;
-            """.strip(),  # noqa: S608
-            values=[int(channel), utils.replace_smart_punc(name)],
+        statement = (
+            AUTOCOMPLETE_ITEM_CHANNEL_TAKEABLE_EMPTY
+            if check_takeable
+            else AUTOCOMPLETE_ITEM_CHANNEL_EMPTY
         )
+        return _choices(await statement.fetch(int(channel)))
 
-    return [
-        discord.OptionChoice(name=entry["name"], value=entry["name"]) for entry in data
-    ]
+    statement = (
+        AUTOCOMPLETE_ITEM_CHANNEL_TAKEABLE
+        if check_takeable
+        else AUTOCOMPLETE_ITEM_CHANNEL
+    )
+    return _choices(await statement.fetch(int(channel), utils.replace_smart_punc(name)))
 
 
 async def autocomplete_item_user(
@@ -377,51 +464,15 @@ async def autocomplete_item_user(
     if not user or not ctx.interaction.guild_id:
         return []
 
-    conn = get_connection("default")
-
     if not name:
-        data = await conn.execute_query_dict(
-            """
-            SELECT
-                DISTINCT ON (LOWER(thiaitemssystemitems.name)) thiaitemssystemitems.name
-            FROM thiaitemssystemitems
-                JOIN thiaitemrelation ON thiaitemrelation.item_id = thiaitemssystemitems.id
-            WHERE
-                thiaitemssystemitems.guild_id = $1
-                AND thiaitemrelation.object_id = $2
-            ORDER BY LOWER(thiaitemssystemitems.name) LIMIT 25;
-            """.strip(),
-            values=[int(ctx.interaction.guild_id), int(user)],
-        )
-    else:
-        data = await conn.execute_query_dict(
-            """
-            SELECT
-                name,
-                sml
-            FROM
-                (
-                    SELECT
-                        DISTINCT ON (thiaitemssystemitems.id) thiaitemssystemitems.id,
-                        thiaitemssystemitems.name,
-                        strict_word_similarity($3, thiaitemssystemitems.name) AS sml
-                    FROM thiaitemssystemitems
-                        JOIN thiaitemrelation ON thiaitemrelation.item_id = thiaitemssystemitems.id
-                    WHERE
-                        thiaitemssystemitems.guild_id = $1
-                        AND thiaitemrelation.object_id = $2
-                        AND $3 <% thiaitemssystemitems.name
-                    ORDER BY id LIMIT 25
-                )
-            ORDER BY sml DESC;
-            """.strip(),
-            values=[
-                int(ctx.interaction.guild_id),
-                int(user),
-                utils.replace_smart_punc(name),
-            ],
+        return _choices(
+            await AUTOCOMPLETE_ITEM_USER_EMPTY.fetch(
+                int(ctx.interaction.guild_id), int(user)
+            )
         )
 
-    return [
-        discord.OptionChoice(name=entry["name"], value=entry["name"]) for entry in data
-    ]
+    return _choices(
+        await AUTOCOMPLETE_ITEM_USER.fetch(
+            int(ctx.interaction.guild_id), int(user), utils.replace_smart_punc(name)
+        )
+    )
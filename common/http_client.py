@@ -0,0 +1,98 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import aiohttp
+import typing_extensions as typing
+
+# like common.caches, this module is not reloaded by extensions
+
+__all__ = ("HTTPClient", "ResponseTooLarge")
+
+CHUNK_SIZE: typing.Final[int] = 64 * 1024
+
+
+class ResponseTooLarge(Exception):
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        super().__init__(f"The response is over {max_size} bytes.")
+
+
+class HTTPClient:
+    """
+    A single HTTP session for the whole bot. Connections and DNS lookups are
+    pooled and kept alive, rather than set up again for every request.
+    """
+
+    def __init__(
+        self,
+        *,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        keepalive_timeout: float = 30,
+        dns_cache_ttl: int = 300,
+        timeout: float = 30,
+    ) -> None:
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = timeout
+
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # sessions need a running loop, so this is only made on first use
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def read_limited(
+        self,
+        url: str,
+        *,
+        max_size: int,
+        headers: dict[str, str] | None = None,
+    ) -> bytes:
+        """
+        Downloads the body of the URL, stopping as soon as it goes over max_size.
+
+        Raises:
+            aiohttp.ClientError: The request failed or didn't return a 2XX status.
+            ResponseTooLarge: The body is over max_size bytes.
+        """
+        async with self.session.get(url, headers=headers) as response:
+            response.raise_for_status()
+
+            # no need to download anything if the server already told us
+            if response.content_length is not None and (
+                response.content_length > max_size
+            ):
+                raise ResponseTooLarge(max_size)
+
+            data = bytearray()
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                data += chunk
+                if len(data) > max_size:
+                    raise ResponseTooLarge(max_size)
+            return bytes(data)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
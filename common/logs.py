@@ -0,0 +1,140 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import contextvars
+import copy
+import datetime
+import logging
+import logging.handlers
+import queue
+import sys
+
+import discord
+import orjson
+import typing_extensions as typing
+from discord.ext import commands
+
+# like common.caches, this module is not reloaded by extensions
+
+__all__ = (
+    "JSONFormatter",
+    "LogQueueHandler",
+    "correlation_id",
+    "event_correlation_id",
+    "setup_logging",
+)
+
+TEXT_FORMAT: typing.Final[str] = "%(asctime)s:%(levelname)s:%(name)s: %(message)s"
+
+correlation_id: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "log_correlation_id", default=None
+)
+
+
+def event_correlation_id(args: tuple[typing.Any, ...]) -> str | None:
+    """
+    Finds the id of the interaction or message an event is about, if any.
+    Used to tie together every log line made while handling it.
+    """
+    for arg in args:
+        match arg:
+            case discord.Interaction():
+                return str(arg.id)
+            case discord.ApplicationContext():
+                return str(arg.interaction.id)
+            case commands.Context():
+                return str(arg.message.id)
+            case discord.Message():
+                return str(arg.id)
+    return None
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats each record as a single line of JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, typing.Any] = {
+            "time": (
+                datetime.datetime.fromtimestamp(
+                    record.created, datetime.timezone.utc
+                ).isoformat()
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if cid := getattr(record, "correlation_id", None):
+            entry["correlation_id"] = cid
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return orjson.dumps(entry).decode()
+
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the default formats the whole record, traceback included, in the thread
+        # that logged it - the queue never leaves this process, so we only need to
+        # resolve the message and leave the rest to the writer thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.correlation_id = correlation_id.get()
+        return record
+
+
+def setup_logging(
+    logger: logging.Logger,
+    *,
+    path: str,
+    json_format: bool = False,
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5,
+    rotate_when: str | None = None,
+    stdout: bool = True,
+) -> logging.handlers.QueueListener:
+    """
+    Sends the logger's records through a queue to a background thread that
+    writes them to a rotating file and, optionally, stdout.
+
+    The file is rotated at the interval given by rotate_when (ex. "midnight")
+    if set, and once it reaches max_bytes otherwise.
+
+    Returns:
+        The queue listener, which should be stopped before exiting so that
+        it finishes writing what's left in the queue.
+    """
+    formatter = JSONFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+
+    if rotate_when:
+        file_handler: logging.Handler = logging.handlers.TimedRotatingFileHandler(
+            path, when=rotate_when, backupCount=backup_count, encoding="utf-8"
+        )
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+    file_handler.setFormatter(formatter)
+    handlers = [file_handler]
+
+    if stdout:
+        stream_handler = logging.StreamHandler(sys.stdout)
+        # stdout has always been just the message
+        stream_handler.setFormatter(formatter if json_format else logging.Formatter())
+        handlers.append(stream_handler)
+
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    logger.addHandler(LogQueueHandler(log_queue))
+
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    listener.start()
+    return listener
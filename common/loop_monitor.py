@@ -0,0 +1,244 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import asyncio
+import collections
+import dataclasses
+import datetime
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+import traceback
+
+import discord
+import sentry_sdk
+import typing_extensions as typing
+
+# like common.caches, this module is not reloaded by extensions
+
+__all__ = ("LoopMonitor", "Stall", "monitor")
+
+logger = logging.getLogger("discord")
+
+STACK_LIMIT: typing.Final[int] = 25
+
+
+@dataclasses.dataclass(slots=True)
+class Stall:
+    started: datetime.datetime
+    duration: float
+    stack: list[traceback.FrameSummary] | None
+
+    @property
+    def location(self) -> str:
+        """The innermost frame of the stack that belongs to the bot itself."""
+        if not self.stack:
+            return "unknown"
+
+        directory = os.environ.get("DIRECTORY_OF_FILE", "")
+        frame = self.stack[-1]
+        for candidate in reversed(self.stack):
+            if (
+                directory
+                and candidate.filename.startswith(directory)
+                and "site-packages" not in candidate.filename
+            ):
+                frame = candidate
+                break
+
+        filename = frame.filename.removeprefix(directory).lstrip("/")
+        return f"{filename}:{frame.lineno} in {frame.name}"
+
+    def format_stack(self) -> str:
+        return "".join(traceback.format_list(self.stack)) if self.stack else ""
+
+
+class LoopMonitor:
+    """
+    Measures how late the event loop is to wake up a sleeping task, and captures
+    a stack sample of whatever is running when a callback blocks the loop for
+    longer than the threshold.
+    """
+
+    def __init__(
+        self,
+        *,
+        interval: float = 0.1,
+        threshold: float = 0.25,
+        report_interval: float = 300,
+        history: int = 3000,
+        stall_history: int = 50,
+    ) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self.report_interval = report_interval
+        self.report_to_sentry = False
+
+        self.samples: collections.deque[float] = collections.deque(maxlen=history)
+        self.stalls: collections.deque[Stall] = collections.deque(maxlen=stall_history)
+        self.total_stalls = 0
+
+        self._window: list[float] = []
+        self._next_tick = 0.0
+        self._captured_tick = 0.0
+        self._stack: list[traceback.FrameSummary] | None = None
+
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopping = threading.Event()
+        self._loop_thread_id = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Starts monitoring the running event loop."""
+        if self.running:
+            return
+
+        self._loop_thread_id = threading.get_ident()
+        self._next_tick = time.monotonic() + self.interval
+        self._stopping.clear()
+
+        self._task = asyncio.create_task(self._sample(), name="loop_monitor")
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop_monitor_watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._watchdog = None
+
+    def clear(self) -> None:
+        self.samples.clear()
+        self.stalls.clear()
+        self.total_stalls = 0
+        self._window.clear()
+
+    def percentiles(
+        self, samples: typing.Iterable[float] | None = None
+    ) -> dict[str, float] | None:
+        samples = list(self.samples if samples is None else samples)
+        if not samples:
+            return None
+
+        if len(samples) == 1:
+            p50 = p90 = p99 = samples[0]
+        else:
+            cuts = statistics.quantiles(samples, n=100, method="inclusive")
+            p50, p90, p99 = cuts[49], cuts[89], cuts[98]
+
+        return {
+            "count": len(samples),
+            "p50": p50,
+            "p90": p90,
+            "p99": p99,
+            "max": max(samples),
+        }
+
+    async def _sample(self) -> None:
+        last_report = time.monotonic()
+
+        while True:
+            self._next_tick = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+
+            now = time.monotonic()
+            lag = max(now - self._next_tick, 0.0)
+            stack, self._stack = self._stack, None
+
+            self.samples.append(lag)
+            self._window.append(lag)
+
+            if lag >= self.threshold:
+                self._record_stall(
+                    Stall(
+                        started=discord.utils.utcnow()
+                        - datetime.timedelta(seconds=lag),
+                        duration=lag,
+                        stack=stack,
+                    )
+                )
+
+            if now - last_report >= self.report_interval:
+                last_report = now
+                self._report_lag()
+
+    def _watch(self) -> None:
+        # runs in its own thread, so it can look at the loop while it's stuck
+        # a callback that never lets go of the gil can't be caught in the act though
+        while not self._stopping.wait(self.threshold / 2):
+            next_tick = self._next_tick
+            if (
+                time.monotonic() - next_tick < self.threshold
+                or self._captured_tick == next_tick
+            ):
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+
+            self._captured_tick = next_tick
+            self._stack = traceback.extract_stack(frame, limit=STACK_LIMIT)
+            del frame
+
+    def _record_stall(self, stall: Stall) -> None:
+        self.total_stalls += 1
+        self.stalls.append(stall)
+
+        logger.warning(
+            "Event loop was blocked for %.0fms at %s.\n%s",
+            stall.duration * 1000,
+            stall.location,
+            stall.format_stack(),
+        )
+
+        if not self.report_to_sentry:
+            return
+
+        transaction = sentry_sdk.start_transaction(
+            op="event_loop.stall",
+            name=stall.location,
+            sampled=True,
+            start_timestamp=stall.started,
+        )
+        transaction.set_data("duration_ms", round(stall.duration * 1000, 2))
+        transaction.set_data("stack", stall.format_stack())
+        transaction.finish(
+            end_timestamp=stall.started + datetime.timedelta(seconds=stall.duration)
+        )
+
+    def _report_lag(self) -> None:
+        window, self._window = self._window, []
+        if not self.report_to_sentry or not (summary := self.percentiles(window)):
+            return
+
+        transaction = sentry_sdk.start_transaction(
+            op="event_loop.lag",
+            name="event loop lag",
+            sampled=True,
+            start_timestamp=discord.utils.utcnow()
+            - datetime.timedelta(seconds=self.report_interval),
+        )
+        for key in ("p50", "p90", "p99", "max"):
+            transaction.set_data(f"lag_{key}_ms", round(summary[key] * 1000, 2))
+        transaction.set_data("samples", summary["count"])
+        transaction.finish()
+
+
+monitor = LoopMonitor()
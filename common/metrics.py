@@ -0,0 +1,391 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import bisect
+import collections
+import logging
+import math
+
+import typing_extensions as typing
+from aiohttp import web
+from tortoise.connection import connections
+
+import common.caches as caches
+import common.loop_monitor as loop_monitor
+import common.statements as statements
+import common.tracing as tracing
+import db_settings
+
+if typing.TYPE_CHECKING:
+    from common.core import THIABase
+
+# like common.caches, this module is not reloaded by extensions
+
+__all__ = (
+    "Counter",
+    "Histogram",
+    "MetricsServer",
+    "bullet_hits",
+    "bullet_scans",
+    "invocation_duration",
+    "render",
+)
+
+logger = logging.getLogger("discord")
+
+CONTENT_TYPE: typing.Final[str] = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS: typing.Final[tuple[float, ...]] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+Labels: typing.TypeAlias = tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _sample(name: str, labels: dict[str, str] | None, value: float) -> str:
+    if not labels:
+        return f"{name} {_format_value(value)}"
+
+    label_str = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+    return f"{name}{{{label_str}}} {_format_value(value)}"
+
+
+def _header(name: str, metric_type: str, documentation: str) -> list[str]:
+    return [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, label_names: Labels = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.values: collections.Counter[Labels] = collections.Counter()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] += amount
+
+    def render(self) -> list[str]:
+        lines = _header(self.name, "counter", self.documentation)
+        lines.extend(
+            _sample(self.name, dict(zip(self.label_names, labels, strict=True)), value)
+            for labels, value in self.values.items()
+        )
+        if not self.values and not self.label_names:
+            lines.append(_sample(self.name, None, 0))
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Labels = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+
+        # the counts are per bucket here, they're made cumulative when rendered
+        self.counts: dict[Labels, list[int]] = {}
+        self.sums: collections.Counter[Labels] = collections.Counter()
+
+    def observe(self, value: float, *labels: str) -> None:
+        if (counts := self.counts.get(labels)) is None:
+            counts = self.counts[labels] = [0] * (len(self.buckets) + 1)
+
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sums[labels] += value
+
+    def render(self) -> list[str]:
+        lines = _header(self.name, "histogram", self.documentation)
+
+        for labels, counts in self.counts.items():
+            label_dict = dict(zip(self.label_names, labels, strict=True))
+
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts, strict=True):
+                cumulative += count
+                lines.append(
+                    _sample(
+                        f"{self.name}_bucket",
+                        label_dict | {"le": _format_value(bound)},
+                        cumulative,
+                    )
+                )
+
+            lines.append(_sample(f"{self.name}_sum", label_dict, self.sums[labels]))
+            lines.append(_sample(f"{self.name}_count", label_dict, cumulative))
+
+        return lines
+
+
+invocation_duration = Histogram(
+    "pythia_invocation_duration_seconds",
+    "How long commands, interactions and listeners take to run.",
+    ("kind", "name"),
+)
+bullet_scans = Counter(
+    "pythia_bullet_scans_total",
+    "Messages checked for Truth Bullet triggers.",
+)
+bullet_hits = Counter(
+    "pythia_bullet_hits_total",
+    "Messages that found a Truth Bullet.",
+)
+
+
+def _observe_invocation(invocation: tracing.Invocation) -> None:
+    # labels look like "button:gacha_roll_button", except for application commands
+    kind, _, name = invocation.label.rpartition(":")
+    invocation_duration.observe(invocation.wall_time, kind or "command", name)
+
+
+def _bot_metrics(bot: "THIABase") -> list[str]:
+    lines = _header(
+        "pythia_gateway_latency_seconds", "gauge", "Heartbeat latency of each shard."
+    )
+    lines.extend(
+        _sample("pythia_gateway_latency_seconds", {"shard": str(shard_id)}, latency)
+        for shard_id, latency in bot.latencies
+    )
+
+    lines.extend(
+        _header(
+            "pythia_background_tasks",
+            "gauge",
+            "Background tasks created through the bot that are still running.",
+        )
+    )
+    lines.append(_sample("pythia_background_tasks", None, len(bot.background_tasks)))
+
+    lines.extend(_header("pythia_guilds", "gauge", "Guilds the bot is in."))
+    lines.append(_sample("pythia_guilds", None, bot.guild_count))
+    return lines
+
+
+def _db_metrics() -> list[str]:
+    lines: list[str] = []
+
+    pool_stats: list[tuple[str, str, int]] = []
+    for name in db_settings.tortoise_config()["connections"]:
+        pool = getattr(connections.get(name), "_pool", None)
+        if pool is None:
+            continue
+
+        pool_stats.extend(
+            (
+                (name, "size", pool.get_size()),
+                (name, "idle", pool.get_idle_size()),
+                (name, "max", pool.get_max_size()),
+            )
+        )
+
+    lines.extend(
+        _header(
+            "pythia_db_pool_connections",
+            "gauge",
+            "Connections in each database pool, by state.",
+        )
+    )
+    lines.extend(
+        _sample("pythia_db_pool_connections", {"pool": pool, "state": state}, value)
+        for pool, state, value in pool_stats
+    )
+
+    statement_stats = statements.registry.stats()
+    lines.extend(
+        _header(
+            "pythia_statement_calls_total",
+            "counter",
+            "Times each registered SQL statement was run.",
+        )
+    )
+    lines.extend(
+        _sample("pythia_statement_calls_total", {"statement": name}, stats.calls)
+        for name, stats in statement_stats.items()
+    )
+    lines.extend(
+        _header(
+            "pythia_statement_seconds_total",
+            "counter",
+            "Time spent running each registered SQL statement.",
+        )
+    )
+    lines.extend(
+        _sample("pythia_statement_seconds_total", {"statement": name}, stats.total_time)
+        for name, stats in statement_stats.items()
+    )
+
+    lines.extend(
+        _header(
+            "pythia_queries_total",
+            "counter",
+            "Queries made by each command, interaction and listener.",
+        )
+    )
+    lines.extend(
+        _sample("pythia_queries_total", {"label": label}, stats.queries)
+        for label, stats in tracing.tracer.labels.items()
+    )
+    lines.extend(
+        _header(
+            "pythia_query_seconds_total",
+            "counter",
+            "Time spent in queries by each command, interaction and listener.",
+        )
+    )
+    lines.extend(
+        _sample("pythia_query_seconds_total", {"label": label}, stats.total_time)
+        for label, stats in tracing.tracer.labels.items()
+    )
+    return lines
+
+
+def _cache_metrics() -> list[str]:
+    stats = caches.channel_cache.stats
+
+    lines = _header(
+        "pythia_channel_cache_lookups_total",
+        "counter",
+        "Channel cache lookups, by how they were answered.",
+    )
+    lines.extend(
+        _sample("pythia_channel_cache_lookups_total", {"result": result}, value)
+        for result, value in (
+            ("gateway", stats.gateway_hits),
+            ("fetched", stats.fetched_hits),
+            ("negative", stats.negative_hits),
+            ("coalesced", stats.coalesced),
+            ("http", stats.http_fetches),
+        )
+    )
+    lines.extend(
+        _header(
+            "pythia_channel_cache_hit_ratio",
+            "gauge",
+            "Share of channel lookups that didn't need an HTTP request.",
+        )
+    )
+    lines.append(_sample("pythia_channel_cache_hit_ratio", None, stats.hit_ratio))
+    lines.extend(
+        _header(
+            "pythia_channel_cache_warmup_requests_total",
+            "counter",
+            "HTTP requests made to warm up the channel cache.",
+        )
+    )
+    lines.append(
+        _sample(
+            "pythia_channel_cache_warmup_requests_total", None, stats.warmup_requests
+        )
+    )
+    return lines
+
+
+def _loop_metrics() -> list[str]:
+    monitor = loop_monitor.monitor
+    if not monitor.running:
+        return []
+
+    lines = _header(
+        "pythia_event_loop_stalls_total",
+        "counter",
+        "Times a callback blocked the event loop for longer than the threshold.",
+    )
+    lines.append(_sample("pythia_event_loop_stalls_total", None, monitor.total_stalls))
+
+    if summary := monitor.percentiles():
+        lines.extend(
+            _header(
+                "pythia_event_loop_lag_seconds",
+                "gauge",
+                "Recent event loop lag, by quantile.",
+            )
+        )
+        lines.extend(
+            _sample("pythia_event_loop_lag_seconds", {"quantile": quantile}, value)
+            for quantile, value in (
+                ("0.5", summary["p50"]),
+                ("0.9", summary["p90"]),
+                ("0.99", summary["p99"]),
+                ("1", summary["max"]),
+            )
+        )
+    return lines
+
+
+def render(bot: "THIABase") -> str:
+    """Renders every metric in the Prometheus text format."""
+    lines: list[str] = []
+    lines.extend(invocation_duration.render())
+    lines.extend(bullet_scans.render())
+    lines.extend(bullet_hits.render())
+    lines.extend(_bot_metrics(bot))
+    lines.extend(_db_metrics())
+    lines.extend(_cache_metrics())
+    lines.extend(_loop_metrics())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """A small HTTP server that serves the bot's metrics at /metrics."""
+
+    def __init__(self, bot: "THIABase") -> None:
+        self.bot = bot
+        self._runner: web.AppRunner | None = None
+
+    async def start(self, *, host: str, port: int) -> None:
+        if self._runner is not None:
+            return
+
+        # the histogram is fed by the tracer, so it only fills up while serving
+        if _observe_invocation not in tracing.tracer.observers:
+            tracing.tracer.observers.append(_observe_invocation)
+
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info("Serving metrics on %s:%s.", host, port)
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, _: web.Request) -> web.Response:
+        return web.Response(
+            body=render(self.bot).encode(), headers={"Content-Type": CONTENT_TYPE}
+        )
@@ -12,8 +12,11 @@ from .main_models import *
 from .utils import *
 
 __all__ = (
+    "FIND_TRUTH_BULLET",
     "FIND_TRUTH_BULLET_STR",
     "GACHA_RARITIES_LIST",
+    "GACHA_ROLL",
+    "GACHA_ROLL_NO_DUPS",
     "GACHA_ROLL_NO_DUPS_STR",
     "GACHA_ROLL_STR",
     "TEMPLATE_MARKDOWN",
@@ -24,6 +27,7 @@ __all__ = (
     "GachaConfig",
     "GachaHash",
     "GachaItem",
+    "GachaItemRow",
     "GachaPlayer",
     "GachaRarities",
     "GuildConfig",
@@ -43,6 +47,7 @@ __all__ = (
     "Rarity",
     "TruthBullet",
     "TruthBulletAlias",
+    "TruthBulletRow",
     "code_template",
     "generate_regexp",
     "guild_id_model",
@@ -7,6 +7,7 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
+import dataclasses
 import random
 from collections import Counter
 from decimal import Decimal
@@ -16,8 +17,9 @@ from itertools import accumulate
 import discord
 import typing_extensions as typing
 from tortoise import Model, fields
-from tortoise.connection import get_connection
 
+import common.statements as statements
+import db_settings
 from common.models.utils import guild_id_model, parse_hex_number, short_desc
 
 if typing.TYPE_CHECKING:
@@ -25,12 +27,17 @@ if typing.TYPE_CHECKING:
 
 
 __all__ = (
+    "CLONE_GACHA_ITEMS",
     "GACHA_RARITIES_LIST",
+    "GACHA_ROLL",
+    "GACHA_ROLL_NO_DUPS",
     "GACHA_ROLL_NO_DUPS_STR",
     "GACHA_ROLL_STR",
+    "INSERT_GACHA_ITEMS",
     "GachaConfig",
     "GachaHash",
     "GachaItem",
+    "GachaItemRow",
     "GachaPlayer",
     "GachaRarities",
     "ItemToPlayer",
@@ -146,22 +153,17 @@ class GachaRarities(Model):
         table = "thiagachararities"
 
 
-@guild_id_model
-class GachaItem(Model):
-    id: fields.Field[int] = fields.IntField(pk=True)
-    guild: fields.ForeignKeyRelation[GachaConfig] = fields.ForeignKeyField(
-        "models.GachaConfig", "items", db_index=True
-    )
-    name = fields.TextField()
-    description = fields.TextField()
-    image: fields.Field[str | None] = fields.TextField(null=True)
-    rarity = fields.IntEnumField(Rarity, default=Rarity.COMMON, db_index=True)
-    amount: fields.Field[int] = fields.IntField(default=-1, db_index=True)
+class _GachaItemDisplay:
+    """Shared between GachaItem and GachaItemRow."""
 
-    players: fields.ReverseRelation["ItemToPlayer"]
+    __slots__ = ()
 
-    class Meta:
-        table = "thiagachaitems"
+    id: int
+    name: str
+    description: str
+    image: str | None
+    rarity: Rarity
+    amount: int
 
     def container(
         self,
@@ -208,23 +210,112 @@ class GachaItem(Model):
 
         return container
 
+
+@dataclasses.dataclass(slots=True)
+class GachaItemRow(_GachaItemDisplay):
+    """
+    A plain row from thiagachaitems, used when rolling where building a full
+    model is wasted work. Use to_model to persist changes.
+    """
+
+    id: int
+    guild_id: int
+    name: str
+    description: str
+    image: str | None
+    rarity: Rarity
+    amount: int
+
     @classmethod
-    async def roll(cls, guild_id: int, rarity: Rarity) -> list[typing.Self] | None:
-        conn = get_connection("default")
-        data = await conn.execute_query_dict(
-            GACHA_ROLL_STR, values=[guild_id, rarity.value]
+    def from_record(cls, record: typing.Mapping[str, typing.Any]) -> typing.Self:
+        return cls(
+            id=record["id"],
+            guild_id=record["guild_id"],
+            name=record["name"],
+            description=record["description"],
+            image=record["image"],
+            rarity=Rarity(record["rarity"]),
+            amount=record["amount"],
         )
-        return [cls(**entry) for entry in data] if data else None
+
+    def to_model(self) -> "GachaItem":
+        return GachaItem._init_from_db(**dataclasses.asdict(self))
+
+
+@guild_id_model
+class GachaItem(_GachaItemDisplay, Model):
+    id: fields.Field[int] = fields.IntField(pk=True)
+    guild: fields.ForeignKeyRelation[GachaConfig] = fields.ForeignKeyField(
+        "models.GachaConfig", "items", db_index=True
+    )
+    name = fields.TextField()
+    description = fields.TextField()
+    image: fields.Field[str | None] = fields.TextField(null=True)
+    rarity = fields.IntEnumField(Rarity, default=Rarity.COMMON, db_index=True)
+    amount: fields.Field[int] = fields.IntField(default=-1, db_index=True)
+
+    players: fields.ReverseRelation["ItemToPlayer"]
+
+    class Meta:
+        table = "thiagachaitems"
+        # the unique UPPER() index on the name is made by migration 0011, as
+        # tortoise can't declare expression indexes
+
+    @classmethod
+    async def roll(cls, guild_id: int, rarity: Rarity) -> list[GachaItemRow] | None:
+        return await GACHA_ROLL.fetch(guild_id, rarity.value) or None
 
     @classmethod
     async def roll_no_duplicates(
         cls, guild_id: int, item_ids: set[int], rarity: Rarity
-    ) -> typing.Self | None:
-        conn = get_connection("default")
-        data = await conn.execute_query_dict(
-            GACHA_ROLL_NO_DUPS_STR, values=[guild_id, list(item_ids), rarity.value]
+    ) -> GachaItemRow | None:
+        return await GACHA_ROLL_NO_DUPS.fetchrow(guild_id, list(item_ids), rarity.value)
+
+    @classmethod
+    async def insert_unique(
+        cls,
+        guild_id: int,
+        items: typing.Sequence[typing.Self],
+        *,
+        overwrite: bool = False,
+    ) -> list[int]:
+        """
+        Inserts the items in one query. Items with a name that is already used
+        in the server, ignoring case, are skipped - or overwrite the existing
+        item if overwrite is true.
+
+        Returns:
+            The IDs of the items that were inserted or overwritten.
+        """
+        return await INSERT_GACHA_ITEMS.fetch(
+            guild_id,
+            [item.name for item in items],
+            [item.description for item in items],
+            [int(item.rarity) for item in items],
+            [item.amount for item in items],
+            [item.image for item in items],
+            overwrite,
+            connection_name=db_settings.PRIMARY,
+        )
+
+    @classmethod
+    async def clone_guild(
+        cls, source_guild_id: int, guild_id: int, *, overwrite: bool = False
+    ) -> tuple[int, int]:
+        """
+        Copies every item from the source server into the server in one query.
+        Conflicting names are handled like in insert_unique.
+
+        Returns:
+            The number of items in the source server, and the number of items
+            that were copied.
+        """
+        return await CLONE_GACHA_ITEMS.fetchrow(
+            source_guild_id,
+            guild_id,
+            overwrite,
+            connection_name=db_settings.PRIMARY,
         )
-        return cls(**data[0]) if data else None
 
 
 class GachaHash:
@@ -453,3 +544,67 @@ ORDER BY
     RANDOM()
     LIMIT 1;
 """.strip()  # noqa: S608
+
+GACHA_ROLL = statements.registry.register(
+    "gacha_roll", GACHA_ROLL_STR, GachaItemRow.from_record
+)
+GACHA_ROLL_NO_DUPS = statements.registry.register(
+    "gacha_roll_no_dups", GACHA_ROLL_NO_DUPS_STR, GachaItemRow.from_record
+)
+
+# the unique index on the name makes the conflict check part of the insert
+# DO UPDATE only touches the row when overwriting, otherwise it acts like DO NOTHING
+INSERT_GACHA_ITEMS = statements.registry.register(
+    "insert_gacha_items",
+    """
+INSERT INTO thiagachaitems
+    (guild_id, name, description, rarity, amount, image)
+SELECT
+    $1, item.*
+FROM
+    UNNEST($2::text[], $3::text[], $4::smallint[], $5::integer[], $6::text[])
+    AS item(name, description, rarity, amount, image)
+ON CONFLICT (guild_id, UPPER(name)) DO UPDATE SET
+    name = EXCLUDED.name,
+    description = EXCLUDED.description,
+    rarity = EXCLUDED.rarity,
+    amount = EXCLUDED.amount,
+    image = EXCLUDED.image
+WHERE
+    $7::boolean
+RETURNING
+    id;
+""".strip(),
+    statements.column("id"),
+)
+
+# the same as above, but the rows come straight from the other server
+CLONE_GACHA_ITEMS = statements.registry.register(
+    "clone_gacha_items",
+    """
+WITH cloned AS (
+    INSERT INTO thiagachaitems
+        (guild_id, name, description, rarity, amount, image)
+    SELECT
+        $2, name, description, rarity, amount, image
+    FROM
+        thiagachaitems
+    WHERE
+        guild_id = $1
+    ON CONFLICT (guild_id, UPPER(name)) DO UPDATE SET
+        name = EXCLUDED.name,
+        description = EXCLUDED.description,
+        rarity = EXCLUDED.rarity,
+        amount = EXCLUDED.amount,
+        image = EXCLUDED.image
+    WHERE
+        $3::boolean
+    RETURNING
+        id
+)
+SELECT
+    (SELECT COUNT(*) FROM thiagachaitems WHERE guild_id = $1),
+    (SELECT COUNT(*) FROM cloned);
+""".strip(),
+    tuple,
+)
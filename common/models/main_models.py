@@ -8,20 +8,38 @@ file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
 import collections
+import dataclasses
 import os
 from enum import Enum, IntEnum
 
 import discord
 import typing_extensions as typing
 from tortoise import Model, fields
-from tortoise.connection import get_connection
 from tortoise.expressions import Q
 
+import common.rolls as rolls
+import common.statements as statements
+import db_settings
 from common.models.gacha_models import GachaConfig, Rarity
 from common.models.utils import generate_regexp, guild_id_model, yesno_friendly_str
 
+if typing.TYPE_CHECKING:
+    import d20
+
+    from common.exports import TruthBulletEntryv1
+
 __all__ = (
+    "CLONE_ITEMS_SYSTEM_ITEMS",
+    "CLONE_TRUTH_BULLETS",
+    "CREATE_TRUTH_BULLET",
+    "DELETE_CLONE_CONFLICTING_TRUTH_BULLETS",
+    "FIND_CONFLICTING_TRUTH_BULLETS",
+    "FIND_TRUTH_BULLET",
     "FIND_TRUTH_BULLET_STR",
+    "INSERT_DICE_ENTRIES",
+    "INSERT_ITEMS_SYSTEM_ITEMS",
+    "INSERT_TRUTH_BULLETS",
+    "INSERT_TRUTH_BULLET_ALIASES",
     "BulletConfig",
     "BulletThreadBehavior",
     "DiceConfig",
@@ -41,6 +59,7 @@ __all__ = (
     "Names",
     "TruthBullet",
     "TruthBulletAlias",
+    "TruthBulletRow",
 )
 
 
@@ -210,6 +229,54 @@ class ItemsSystemItem(Model):
 
     class Meta:
         table = "thiaitemssystemitems"
+        # the unique UPPER() index on the name is made by migration 0011, as
+        # tortoise can't declare expression indexes
+
+    @classmethod
+    async def insert_unique(
+        cls,
+        guild_id: int,
+        items: typing.Sequence[typing.Self],
+        *,
+        overwrite: bool = False,
+    ) -> list[int]:
+        """
+        Inserts the items in one query. Items with a name that is already used
+        in the server, ignoring case, are skipped - or overwrite the existing
+        item if overwrite is true.
+
+        Returns:
+            The IDs of the items that were inserted or overwritten.
+        """
+        return await INSERT_ITEMS_SYSTEM_ITEMS.fetch(
+            guild_id,
+            [item.name for item in items],
+            [item.description for item in items],
+            [item.image for item in items],
+            [item.takeable for item in items],
+            overwrite,
+            connection_name=db_settings.PRIMARY,
+        )
+
+    @classmethod
+    async def clone_guild(
+        cls, source_guild_id: int, guild_id: int, *, overwrite: bool = False
+    ) -> tuple[int, int]:
+        """
+        Copies every item from the source server into the server in one query.
+        Conflicting names are handled like in insert_unique. Where the items
+        have been placed is not copied.
+
+        Returns:
+            The number of items in the source server, and the number of items
+            that were copied.
+        """
+        return await CLONE_ITEMS_SYSTEM_ITEMS.fetchrow(
+            source_guild_id,
+            guild_id,
+            overwrite,
+            connection_name=db_settings.PRIMARY,
+        )
 
     def embeds(self, *, count: int | None = None) -> list[discord.Embed]:
         embeds: list[discord.Embed] = []
@@ -370,8 +437,47 @@ class DiceEntry(Model):
 
     class Meta:
         table = "thiadicenetry"
+        # the unique UPPER() index on the name is made by migration 0011, as
+        # tortoise can't declare expression indexes
         indexes: typing.ClassVar[list[tuple[str, ...]]] = [("guild_id", "user_id")]
 
+    @property
+    def parsed(self) -> "d20.ast.Expression":
+        """
+        The value as a d20 AST. Parsed once and then shared between every
+        entry with the same value.
+
+        Raises:
+            d20.RollSyntaxError: The value isn't valid d20 notation.
+        """
+        return rolls.parse(self.value)
+
+    @classmethod
+    async def insert_unique(
+        cls,
+        guild_id: int,
+        user_id: int,
+        entries: typing.Sequence[typing.Self],
+        *,
+        overwrite: bool = False,
+    ) -> list[int]:
+        """
+        Inserts the entries in one query. Entries with a name the user already
+        has, ignoring case, are skipped - or overwrite the existing entry if
+        overwrite is true.
+
+        Returns:
+            The IDs of the entries that were inserted or overwritten.
+        """
+        return await INSERT_DICE_ENTRIES.fetch(
+            guild_id,
+            user_id,
+            [entry.name for entry in entries],
+            [entry.value for entry in entries],
+            overwrite,
+            connection_name=db_settings.PRIMARY,
+        )
+
 
 class TruthBulletAlias(Model):
     id: fields.Field[int] = fields.IntField(pk=True)
@@ -382,24 +488,19 @@ class TruthBulletAlias(Model):
 
     class Meta:
         table = "thiatruthbulletalias"
-        indexes: typing.ClassVar[list[tuple[str, ...]]] = [("bullet_id", "alias")]
+        # the unique UPPER() index on the alias is made by migration 0011, as
+        # tortoise can't declare expression indexes
 
 
-class TruthBullet(Model):
-    id: fields.Field[int] = fields.IntField(pk=True)
-    trigger: fields.Field[str] = fields.TextField()
-    description = fields.TextField()
-    channel_id = fields.BigIntField(db_index=True)
-    guild_id = fields.BigIntField(db_index=True)
-    found: fields.Field[bool] = fields.BooleanField(db_index=True)
-    finder: fields.Field[int | None] = fields.BigIntField(null=True)
-    hidden: fields.Field[bool] = fields.BooleanField(default=False)
-    image: fields.Field[str | None] = fields.TextField(null=True)
+class _TruthBulletDisplay:
+    """Shared between TruthBullet and TruthBulletRow."""
 
-    aliases: fields.ReverseRelation["TruthBulletAlias"]
+    __slots__ = ()
 
-    class Meta:
-        table = "thiatruthbullets"
+    trigger: str
+    description: str
+    channel_id: int
+    image: str | None
 
     @property
     def chan_mention(self) -> str:
@@ -444,15 +545,51 @@ class TruthBullet(Model):
 
         return discord.ui.DesignerView(container, store=False)
 
+
+@dataclasses.dataclass(slots=True)
+class TruthBulletRow(_TruthBulletDisplay):
+    """
+    A plain row from thiatruthbullets, used on the message hot path where
+    building a full model is wasted work. Use to_model to persist changes.
+    """
+
+    id: int
+    trigger: str
+    description: str
+    channel_id: int
+    guild_id: int
+    found: bool
+    finder: int | None
+    hidden: bool
+    image: str | None
+
+    def to_model(self) -> "TruthBullet":
+        return TruthBullet._init_from_db(**dataclasses.asdict(self))
+
+
+class TruthBullet(_TruthBulletDisplay, Model):
+    id: fields.Field[int] = fields.IntField(pk=True)
+    trigger: fields.Field[str] = fields.TextField()
+    description = fields.TextField()
+    channel_id = fields.BigIntField(db_index=True)
+    guild_id = fields.BigIntField(db_index=True)
+    found: fields.Field[bool] = fields.BooleanField(db_index=True)
+    finder: fields.Field[int | None] = fields.BigIntField(null=True)
+    hidden: fields.Field[bool] = fields.BooleanField(default=False)
+    image: fields.Field[str | None] = fields.TextField(null=True)
+
+    aliases: fields.ReverseRelation["TruthBulletAlias"]
+
+    class Meta:
+        table = "thiatruthbullets"
+        # the unique UPPER() index on the trigger is made by migration 0011, as
+        # tortoise can't declare expression indexes
+
     @classmethod
     async def find(
         cls, channel_id: "discord.Snowflake", content: str
-    ) -> typing.Self | None:
-        conn = get_connection("default")
-        data = await conn.execute_query_dict(
-            FIND_TRUTH_BULLET_STR, values=[int(channel_id), content]
-        )
-        return cls(**data[0]) if data else None
+    ) -> TruthBulletRow | None:
+        return await FIND_TRUTH_BULLET.fetchrow(int(channel_id), content)
 
     @classmethod
     async def find_exact(
@@ -487,6 +624,122 @@ class TruthBullet(Model):
             & (Q(trigger__iexact=trigger) | Q(aliases__alias__iexact=trigger))
         )
 
+    @classmethod
+    async def create_unique(
+        cls,
+        channel_id: "discord.Snowflake",
+        guild_id: "discord.Snowflake",
+        *,
+        trigger: str,
+        description: str,
+        hidden: bool,
+        image: str | None,
+    ) -> int | None:
+        """
+        Creates the Truth Bullet, unless the trigger is already a trigger or
+        alias in the channel, ignoring case.
+
+        Returns:
+            The ID of the new Truth Bullet, or None if the trigger was taken.
+        """
+        return await CREATE_TRUTH_BULLET.fetchrow(
+            int(channel_id),
+            int(guild_id),
+            trigger,
+            description,
+            hidden,
+            image,
+            connection_name=db_settings.PRIMARY,
+        )
+
+    @classmethod
+    async def find_conflicting(
+        cls, channel_id: "discord.Snowflake", names: list[str]
+    ) -> list[int]:
+        """
+        Finds the Truth Bullets in the channel with a trigger or alias that
+        matches any of the names, ignoring case.
+
+        Returns:
+            The IDs of the Truth Bullets.
+        """
+        return await FIND_CONFLICTING_TRUTH_BULLETS.fetch(
+            int(channel_id), names, connection_name=db_settings.PRIMARY
+        )
+
+    @classmethod
+    async def bulk_import(
+        cls,
+        channel_id: "discord.Snowflake",
+        guild_id: "discord.Snowflake",
+        entries: "typing.Sequence[TruthBulletEntryv1]",
+    ) -> None:
+        """
+        Creates the Truth Bullets and all of their aliases in two queries.
+        Should be run inside of a transaction.
+        """
+        ids = dict(
+            await INSERT_TRUTH_BULLETS.fetch(
+                int(channel_id),
+                int(guild_id),
+                [entry.trigger for entry in entries],
+                [entry.description for entry in entries],
+                [entry.hidden for entry in entries],
+                [entry.image for entry in entries],
+                connection_name=db_settings.PRIMARY,
+            )
+        )
+
+        bullet_ids: list[int] = []
+        aliases: list[str] = []
+        for entry in entries:
+            bullet_ids.extend(ids[entry.trigger] for _ in entry.aliases)
+            aliases.extend(entry.aliases)
+
+        if aliases:
+            await INSERT_TRUTH_BULLET_ALIASES.fetch(
+                bullet_ids, aliases, connection_name=db_settings.PRIMARY
+            )
+
+    @classmethod
+    async def clone_channel(
+        cls,
+        source_channel_id: "discord.Snowflake",
+        channel_id: "discord.Snowflake",
+        guild_id: "discord.Snowflake",
+        *,
+        overwrite: bool = False,
+    ) -> tuple[int, int, int]:
+        """
+        Copies every Truth Bullet and alias from the source channel into the
+        channel, all within the database. The copies start out unfound.
+        Truth Bullets with a trigger or alias already used in the channel are
+        skipped - or replace the Truth Bullets using them if overwrite is true.
+        Should be run inside of a transaction.
+
+        Returns:
+            The number of Truth Bullets in the source channel, the number of
+            Truth Bullets that were copied, and the number of Truth Bullets
+            that were replaced.
+        """
+        replaced = 0
+        if overwrite:
+            replaced = len(
+                await DELETE_CLONE_CONFLICTING_TRUTH_BULLETS.fetch(
+                    int(source_channel_id),
+                    int(channel_id),
+                    connection_name=db_settings.PRIMARY,
+                )
+            )
+
+        total, cloned = await CLONE_TRUTH_BULLETS.fetchrow(
+            int(source_channel_id),
+            int(channel_id),
+            int(guild_id),
+            connection_name=db_settings.PRIMARY,
+        )
+        return total, cloned, replaced
+
 
 class GuildConfigInclude(typing.TypedDict, total=False):
     names: bool
@@ -538,18 +791,20 @@ class GuildConfig(Model):
     async def fetch_create(
         cls, guild_id: int, include: GuildConfigInclude | None = None
     ) -> typing.Self:
-        queryset = cls.get_or_none(guild_id=guild_id)
-        if include:
-            queryset = queryset.prefetch_related(*include.keys())
-        config = await queryset
-
-        if not config:
-            config = await cls.create(guild_id=guild_id)
+        # this can create rows, so it can't trust a replica that might be behind
+        with db_settings.use_primary():
+            queryset = cls.get_or_none(guild_id=guild_id)
             if include:
-                for field in include.keys():
-                    setattr(config, f"_{field}", None)
+                queryset = queryset.prefetch_related(*include.keys())
+            config = await queryset
+
+            if not config:
+                config = await cls.create(guild_id=guild_id)
+                if include:
+                    for field in include.keys():
+                        setattr(config, f"_{field}", None)
 
-        return await config._fill_in_include(include)
+            return await config._fill_in_include(include)
 
     @classmethod
     async def fetch(
@@ -579,3 +834,272 @@ WHERE
         )
     );
 """.strip()  # noqa: S608
+
+FIND_TRUTH_BULLET = statements.registry.register(
+    "find_truth_bullet", FIND_TRUTH_BULLET_STR, lambda r: TruthBulletRow(**r)
+)
+
+FIND_CONFLICTING_TRUTH_BULLETS = statements.registry.register(
+    "find_conflicting_truth_bullets",
+    """
+SELECT DISTINCT
+    thiatruthbullets.id
+FROM
+    thiatruthbullets
+LEFT JOIN
+    thiatruthbulletalias ON thiatruthbulletalias.bullet_id = thiatruthbullets.id
+WHERE
+    channel_id = $1
+    AND (
+        UPPER(trigger) = ANY (SELECT UPPER(name) FROM UNNEST($2::text[]) AS name)
+        OR UPPER(thiatruthbulletalias.alias) = ANY (
+            SELECT UPPER(name) FROM UNNEST($2::text[]) AS name
+        )
+    );
+""".strip(),
+    statements.column("id"),
+)
+
+# triggers are covered by the unique index, but aliases live in another table
+# and have to be checked in the same statement
+CREATE_TRUTH_BULLET = statements.registry.register(
+    "create_truth_bullet",
+    """
+INSERT INTO thiatruthbullets
+    (channel_id, guild_id, trigger, description, hidden, image, found, finder)
+SELECT
+    $1, $2, $3, $4, $5, $6, false, NULL
+WHERE
+    NOT EXISTS (
+        SELECT
+            1
+        FROM
+            thiatruthbulletalias
+        JOIN
+            thiatruthbullets ON thiatruthbullets.id = thiatruthbulletalias.bullet_id
+        WHERE
+            thiatruthbullets.channel_id = $1
+            AND UPPER(thiatruthbulletalias.alias) = UPPER($3)
+    )
+ON CONFLICT (channel_id, UPPER(trigger)) DO NOTHING
+RETURNING
+    id;
+""".strip(),
+    statements.column("id"),
+)
+
+# unnest turns the arrays into rows, so any number of bullets is one query
+INSERT_TRUTH_BULLETS = statements.registry.register(
+    "insert_truth_bullets",
+    """
+INSERT INTO thiatruthbullets
+    (channel_id, guild_id, trigger, description, hidden, image, found, finder)
+SELECT
+    $1, $2, entry.trigger, entry.description, entry.hidden, entry.image, false, NULL
+FROM
+    UNNEST($3::text[], $4::text[], $5::boolean[], $6::text[])
+    AS entry(trigger, description, hidden, image)
+RETURNING
+    trigger, id;
+""".strip(),
+    tuple,
+)
+
+# the unique indexes on the names make the conflict checks part of the inserts
+# DO UPDATE only touches the row when overwriting, otherwise it acts like DO NOTHING
+INSERT_ITEMS_SYSTEM_ITEMS = statements.registry.register(
+    "insert_items_system_items",
+    """
+INSERT INTO thiaitemssystemitems
+    (guild_id, name, description, image, takeable)
+SELECT
+    $1, item.*
+FROM
+    UNNEST($2::text[], $3::text[], $4::text[], $5::boolean[])
+    AS item(name, description, image, takeable)
+ON CONFLICT (guild_id, UPPER(name)) DO UPDATE SET
+    name = EXCLUDED.name,
+    description = EXCLUDED.description,
+    image = EXCLUDED.image,
+    takeable = EXCLUDED.takeable
+WHERE
+    $6::boolean
+RETURNING
+    id;
+""".strip(),
+    statements.column("id"),
+)
+
+INSERT_DICE_ENTRIES = statements.registry.register(
+    "insert_dice_entries",
+    """
+INSERT INTO thiadicenetry
+    (guild_id, user_id, name, value)
+SELECT
+    $1, $2, entry.*
+FROM
+    UNNEST($3::text[], $4::text[]) AS entry(name, value)
+ON CONFLICT (guild_id, user_id, UPPER(name)) DO UPDATE SET
+    name = EXCLUDED.name,
+    value = EXCLUDED.value
+WHERE
+    $5::boolean
+RETURNING
+    id;
+""".strip(),
+    statements.column("id"),
+)
+
+INSERT_TRUTH_BULLET_ALIASES = statements.registry.register(
+    "insert_truth_bullet_aliases",
+    """
+INSERT INTO thiatruthbulletalias
+    (bullet_id, alias)
+SELECT
+    *
+FROM
+    UNNEST($1::integer[], $2::text[]);
+""".strip(),
+)
+
+# the same as above, but the rows come straight from the other server
+CLONE_ITEMS_SYSTEM_ITEMS = statements.registry.register(
+    "clone_items_system_items",
+    """
+WITH cloned AS (
+    INSERT INTO thiaitemssystemitems
+        (guild_id, name, description, image, takeable)
+    SELECT
+        $2, name, description, image, takeable
+    FROM
+        thiaitemssystemitems
+    WHERE
+        guild_id = $1
+    ON CONFLICT (guild_id, UPPER(name)) DO UPDATE SET
+        name = EXCLUDED.name,
+        description = EXCLUDED.description,
+        image = EXCLUDED.image,
+        takeable = EXCLUDED.takeable
+    WHERE
+        $3::boolean
+    RETURNING
+        id
+)
+SELECT
+    (SELECT COUNT(*) FROM thiaitemssystemitems WHERE guild_id = $1),
+    (SELECT COUNT(*) FROM cloned);
+""".strip(),
+    tuple,
+)
+
+# every trigger and alias in a channel, uppercased for matching
+_CHANNEL_BULLET_NAMES = """
+SELECT
+    UPPER(trigger) AS name
+FROM
+    thiatruthbullets
+WHERE
+    channel_id = {channel}
+UNION ALL
+SELECT
+    UPPER(thiatruthbulletalias.alias)
+FROM
+    thiatruthbulletalias
+JOIN
+    thiatruthbullets ON thiatruthbullets.id = thiatruthbulletalias.bullet_id
+WHERE
+    thiatruthbullets.channel_id = {channel}
+""".strip()
+
+# aliases cascade with their truth bullets
+DELETE_CLONE_CONFLICTING_TRUTH_BULLETS = statements.registry.register(
+    "delete_clone_conflicting_truth_bullets",
+    f"""
+WITH source_names AS (
+    {_CHANNEL_BULLET_NAMES.format(channel="$1")}
+)
+DELETE FROM
+    thiatruthbullets
+WHERE
+    id IN (
+        SELECT
+            thiatruthbullets.id
+        FROM
+            thiatruthbullets
+        LEFT JOIN
+            thiatruthbulletalias
+            ON thiatruthbulletalias.bullet_id = thiatruthbullets.id
+        WHERE
+            thiatruthbullets.channel_id = $2
+            AND (
+                UPPER(trigger) IN (SELECT name FROM source_names)
+                OR UPPER(thiatruthbulletalias.alias) IN (
+                    SELECT name FROM source_names
+                )
+            )
+    )
+RETURNING
+    id;
+""".strip(),  # noqa: S608
+    statements.column("id"),
+)
+
+# a truth bullet is only copied if none of its names are taken, and its
+# aliases are matched back up by trigger, which is unique in a channel
+CLONE_TRUTH_BULLETS = statements.registry.register(
+    "clone_truth_bullets",
+    f"""
+WITH source AS (
+    SELECT
+        thiatruthbullets.*,
+        ARRAY(
+            SELECT UPPER(thiatruthbullets.trigger)
+            UNION ALL
+            SELECT
+                UPPER(alias)
+            FROM
+                thiatruthbulletalias
+            WHERE
+                bullet_id = thiatruthbullets.id
+        ) AS names
+    FROM
+        thiatruthbullets
+    WHERE
+        channel_id = $1
+),
+existing_names AS (
+    {_CHANNEL_BULLET_NAMES.format(channel="$2")}
+),
+cloned AS (
+    INSERT INTO thiatruthbullets
+        (channel_id, guild_id, trigger, description, hidden, image, found, finder)
+    SELECT
+        $2, $3, trigger, description, hidden, image, false, NULL
+    FROM
+        source
+    WHERE
+        NOT EXISTS (
+            SELECT 1 FROM existing_names WHERE name = ANY (source.names)
+        )
+    ON CONFLICT (channel_id, UPPER(trigger)) DO NOTHING
+    RETURNING
+        id, trigger
+),
+cloned_aliases AS (
+    INSERT INTO thiatruthbulletalias
+        (bullet_id, alias)
+    SELECT
+        cloned.id, thiatruthbulletalias.alias
+    FROM
+        cloned
+    JOIN
+        source ON UPPER(source.trigger) = UPPER(cloned.trigger)
+    JOIN
+        thiatruthbulletalias ON thiatruthbulletalias.bullet_id = source.id
+)
+SELECT
+    (SELECT COUNT(*) FROM source),
+    (SELECT COUNT(*) FROM cloned);
+""".strip(),  # noqa: S608
+    tuple,
+)
@@ -0,0 +1,188 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import collections
+import os
+import sys
+import sysconfig
+import threading
+import time
+import tracemalloc
+
+import typing_extensions as typing
+
+if typing.TYPE_CHECKING:
+    import types
+
+# like common.caches, this module is not reloaded by extensions
+
+__all__ = (
+    "MemoryTracker",
+    "SamplingProfiler",
+    "memory_tracker",
+    "profiler",
+    "short_filename",
+)
+
+_STDLIB = sysconfig.get_paths()["stdlib"]
+
+
+def short_filename(filename: str) -> str:
+    directory = os.environ.get("DIRECTORY_OF_FILE", "")
+    if directory and filename.startswith(directory):
+        return filename.removeprefix(directory).lstrip("/")
+    if (index := filename.rfind("site-packages")) != -1:
+        return filename[index + len("site-packages") + 1 :]
+    return filename.removeprefix(_STDLIB).lstrip("/")
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of the event loop's thread from another thread, and
+    counts how often each stack shows up.
+
+    The results are in the collapsed stack format, which flamegraph.pl,
+    inferno and speedscope can all read.
+    """
+
+    def __init__(self, *, interval: float = 0.01) -> None:
+        self.interval = interval
+        self.stacks: collections.Counter[str] = collections.Counter()
+        self.samples = 0
+        self.started = 0.0
+        self.finished = 0.0
+
+        self._thread: threading.Thread | None = None
+        self._stopping = threading.Event()
+        self._target_thread_id = 0
+        self._labels: dict[types.CodeType, str] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def duration(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    def start(self, thread_id: int | None = None) -> None:
+        """Starts sampling the given thread, or the current one if not given."""
+        if self.running:
+            raise RuntimeError("The profiler is already running.")
+
+        self.stacks.clear()
+        self.samples = 0
+        self.started = time.monotonic()
+        self.finished = 0.0
+
+        self._target_thread_id = thread_id or threading.get_ident()
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling_profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.finished = time.monotonic()
+
+    def _label(self, code: "types.CodeType") -> str:
+        # building these strings is most of the cost of a sample, so cache them
+        if (label := self._labels.get(code)) is None:
+            label = f"{code.co_name} ({short_filename(code.co_filename)})"
+            self._labels[code] = label
+        return label
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            frame = sys._current_frames().get(self._target_thread_id)
+            if frame is None:
+                continue
+
+            labels: list[str] = []
+            while frame is not None:
+                labels.append(self._label(frame.f_code))
+                frame = frame.f_back
+            del frame
+
+            self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "\n".join(
+            f"{stack} {count}" for stack, count in self.stacks.most_common()
+        )
+
+    def top_functions(self, amount: int = 10) -> list[tuple[str, int]]:
+        """The functions that were on top of the stack the most."""
+        counter: collections.Counter[str] = collections.Counter()
+        for stack, count in self.stacks.items():
+            counter[stack.rpartition(";")[2]] += count
+        return counter.most_common(amount)
+
+
+class MemoryTracker:
+    """
+    Wraps tracemalloc so that allocations can be compared between
+    two points in time.
+    """
+
+    def __init__(self) -> None:
+        self.baseline: tracemalloc.Snapshot | None = None
+        self.baseline_time = 0.0
+
+    @property
+    def running(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.take_baseline()
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self.baseline = None
+
+    def take_baseline(self) -> None:
+        self.baseline = self._snapshot()
+        self.baseline_time = time.monotonic()
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            )
+        )
+
+    def diff(self, amount: int = 15) -> list[tracemalloc.StatisticDiff]:
+        """
+        Compares the current allocations to the baseline, then makes the
+        current allocations the new baseline.
+
+        This is slow, and should be run in a thread.
+        """
+        if self.baseline is None:
+            raise RuntimeError("Memory tracking has not been started.")
+
+        snapshot = self._snapshot()
+        stats = snapshot.compare_to(self.baseline, "lineno")
+
+        self.baseline = snapshot
+        self.baseline_time = time.monotonic()
+        return stats[:amount]
+
+
+profiler = SamplingProfiler()
+memory_tracker = MemoryTracker()
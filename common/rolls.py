@@ -0,0 +1,215 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import contextlib
+import functools
+import signal
+import threading
+
+import d20
+import typing_extensions as typing
+
+# like common.caches, this module is not reloaded by extensions, so parsed
+# expressions survive cog reloads
+
+__all__ = (
+    "INLINE_MAX_DICE",
+    "INLINE_MAX_NODES",
+    "MAX_RESULT_LENGTH",
+    "MAX_ROLLS",
+    "PARSE_CACHE_SIZE",
+    "RollLimitExceeded",
+    "count_dice",
+    "is_trivial",
+    "parse",
+    "roll",
+    "roll_many",
+    "roll_results",
+    "validate",
+)
+
+MAX_ROLLS: typing.Final[int] = 100
+PARSE_CACHE_SIZE: typing.Final[int] = 1024
+# leaves room for everything else in a message
+MAX_RESULT_LENGTH: typing.Final[int] = 3500
+# expressions this small are always rolled in-process, as handing them to a
+# worker process would cost more than rolling them
+INLINE_MAX_DICE: typing.Final[int] = 20
+INLINE_MAX_NODES: typing.Final[int] = 16
+
+_roller = d20.Roller(d20.RollContext(MAX_ROLLS))
+# validation parses in worker threads, and d20's own parse cache isn't safe
+# to use from more than one thread at once
+_parse_lock = threading.Lock()
+
+
+class RollLimitExceeded(d20.RollError):
+    """A roll went over its time, output size or memory budget."""
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse(expr: str) -> d20.ast.Expression:
+    """
+    Parses the expression into a d20 AST. Rolling never modifies the AST,
+    so the same one is shared by everything using the same expression.
+
+    Raises:
+        d20.RollSyntaxError: The expression isn't valid d20 notation.
+    """
+    with _parse_lock:
+        return _roller.parse(expr)
+
+
+def roll(expr: str | d20.ast.Expression) -> d20.RollResult:
+    """
+    Rolls the expression, parsing it first if needed.
+
+    Raises:
+        d20.RollSyntaxError: The expression isn't valid d20 notation.
+        d20.TooManyRolls: More than MAX_ROLLS dice were rolled.
+        d20.RollValueError: The expression can't be evaluated.
+    """
+    if isinstance(expr, str):
+        expr = parse(expr)
+    return _roller.roll(expr)
+
+
+def count_dice(tree: d20.ast.Expression) -> int:
+    """
+    Counts the dice the expression always rolls. Rerolls and explosions can
+    roll more.
+
+    Raises:
+        d20.RollValueError: The expression has a 0-sided die.
+    """
+    count = 0
+    nodes: list[d20.ast.ChildMixin] = [tree]
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, d20.ast.Dice):
+            if node.num and node.size != "%" and node.size < 1:
+                raise d20.RollValueError("Cannot roll a 0-sided die.")
+            count += node.num
+        nodes.extend(node.children)
+    return count
+
+
+def roll_many(expr: str | d20.ast.Expression, times: int) -> list[d20.RollResult]:
+    """
+    Rolls the expression multiple times. All of the rolls share one budget of
+    MAX_ROLLS dice, as if they were a single roll.
+
+    Raises:
+        d20.RollSyntaxError: The expression isn't valid d20 notation.
+        d20.TooManyRolls: More than MAX_ROLLS dice were rolled in total.
+        d20.RollValueError: The expression can't be evaluated.
+    """
+    if isinstance(expr, str):
+        expr = parse(expr)
+
+    # fail before rolling anything if the budget can't possibly be met
+    if count_dice(expr) * times > MAX_ROLLS:
+        raise d20.TooManyRolls("Too many dice rolled.")
+
+    results: list[d20.RollResult] = []
+    rolled = 0
+    for _ in range(times):
+        results.append(_roller.roll(expr))
+        rolled += _roller.context.rolls
+        if rolled > MAX_ROLLS:
+            raise d20.TooManyRolls("Too many dice rolled.")
+    return results
+
+
+def validate(expr: str) -> d20.ast.Expression:
+    """
+    Checks the expression without rolling it. Errors only a roll can run into,
+    like dividing by zero or exploding too many times, are left to roll.
+
+    Raises:
+        d20.RollSyntaxError: The expression isn't valid d20 notation.
+        d20.TooManyRolls: The expression always rolls more than MAX_ROLLS dice.
+        d20.RollValueError: The expression has a 0-sided die.
+    """
+    tree = parse(expr)
+    if count_dice(tree) > MAX_ROLLS:
+        raise d20.TooManyRolls("Too many dice rolled.")
+    return tree
+
+
+def is_trivial(tree: d20.ast.Expression, times: int = 1) -> bool:
+    """
+    Checks if the expression is small enough to roll without any isolation:
+    a handful of plain dice, with no rerolls, explosions or the like.
+    """
+    dice = 0
+    seen = 0
+    nodes: list[d20.ast.ChildMixin] = [tree]
+    while nodes:
+        node = nodes.pop()
+        seen += 1
+        if seen > INLINE_MAX_NODES:
+            return False
+        if isinstance(node, d20.ast.OperatedSet) and node.operations:
+            return False
+        if isinstance(node, d20.ast.Dice):
+            dice += node.num
+        nodes.extend(node.children)
+    return dice * times <= INLINE_MAX_DICE
+
+
+@contextlib.contextmanager
+def _time_limit(seconds: float | None) -> typing.Generator[None, None, None]:
+    # signals only reach the main thread, which is where pool workers run
+    # their tasks - the event loop's thread must never use this
+    if (
+        not seconds
+        or not hasattr(signal, "setitimer")
+        or threading.current_thread() is not threading.main_thread()
+    ):
+        yield
+        return
+
+    def on_alarm(*_: typing.Any) -> typing.NoReturn:
+        raise RollLimitExceeded("The roll took too long.")
+
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def roll_results(
+    expr: str | d20.ast.Expression,
+    times: int = 1,
+    *,
+    max_length: int = MAX_RESULT_LENGTH,
+    timeout: float | None = None,
+) -> list[tuple[str, int]]:
+    """
+    Rolls the expression like roll_many, and renders each roll. The results
+    are plain strings and ints, so they can be sent back from a worker process.
+    The timeout uses SIGALRM, so only worker processes should pass one.
+
+    Raises:
+        d20.RollError: The roll failed, see roll_many.
+        RollLimitExceeded: The roll took too long, or a rendered roll is
+            longer than max_length.
+    """
+    results: list[tuple[str, int]] = []
+    with _time_limit(timeout):
+        for result in roll_many(expr, times):
+            rendered = result.result
+            if len(rendered) > max_length:
+                raise RollLimitExceeded("The result of the roll is too long to show.")
+            results.append((rendered, result.total))
+    return results
@@ -0,0 +1,379 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import asyncio
+import dataclasses
+import datetime
+import io
+import tempfile
+import zipfile
+
+import asyncpg
+import orjson
+import typing_extensions as typing
+from tortoise import Model
+from tortoise.connection import connections
+
+import common.exports as exports
+import common.models as models
+import db_settings
+
+__all__ = (
+    "SNAPSHOT_VERSION",
+    "TABLES",
+    "SnapshotError",
+    "SnapshotTable",
+    "restore_snapshot",
+    "write_snapshot",
+)
+
+SNAPSHOT_VERSION: typing.Final[int] = 1
+MANIFEST_NAME: typing.Final[str] = "manifest.json"
+# snapshots compress well, so this is much higher than the upload limit
+MAX_UNCOMPRESSED_SIZE: typing.Final[int] = 200 * 1024 * 1024
+CHUNK_SIZE: typing.Final[int] = 256 * 1024
+
+
+class SnapshotError(Exception):
+    pass
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class SnapshotTable:
+    model: type[Model]
+    # selects the rows for the guild given as $1
+    where: str = "guild_id = $1"
+    # columns that point to a table earlier in the snapshot
+    references: dict[str, type[Model]] = dataclasses.field(default_factory=dict)
+    # rows are only restored for channels in the guild, as Truth Bullets and
+    # the like are looked up by channel alone
+    channel_column: str | None = None
+
+    @property
+    def table(self) -> str:
+        return self.model._meta.db_table
+
+    @property
+    def columns(self) -> tuple[str, ...]:
+        return tuple(self.model._meta.fields_db_projection.values())
+
+    @property
+    def serial(self) -> bool:
+        # serial ids are given out again on restore, everything else is kept
+        return self.model._meta.db_pk_column == "id"
+
+
+# parents come before the tables that point to them
+TABLES: typing.Final[tuple[SnapshotTable, ...]] = (
+    SnapshotTable(models.GuildConfig),
+    SnapshotTable(models.Names),
+    SnapshotTable(models.BulletConfig),
+    SnapshotTable(models.GachaConfig),
+    SnapshotTable(models.MessageConfig),
+    SnapshotTable(models.DiceConfig),
+    SnapshotTable(models.ItemsConfig),
+    SnapshotTable(models.GachaRarities),
+    SnapshotTable(models.GachaItem),
+    SnapshotTable(models.GachaPlayer),
+    SnapshotTable(
+        models.ItemToPlayer,
+        where="player_id IN (SELECT id FROM thiagachaplayers WHERE guild_id = $1)",
+        references={"item_id": models.GachaItem, "player_id": models.GachaPlayer},
+    ),
+    SnapshotTable(models.ItemsSystemItem),
+    SnapshotTable(models.ItemRelation, references={"item_id": models.ItemsSystemItem}),
+    SnapshotTable(models.MessageLink, channel_column="channel_id"),
+    SnapshotTable(
+        models.MessageThread,
+        where="message_link_id IN (SELECT id FROM thiamessagelink WHERE guild_id = $1)",
+        references={"message_link_id": models.MessageLink},
+    ),
+    SnapshotTable(models.DiceEntry),
+    SnapshotTable(models.TruthBullet, channel_column="channel_id"),
+    SnapshotTable(
+        models.TruthBulletAlias,
+        where="bullet_id IN (SELECT id FROM thiatruthbullets WHERE guild_id = $1)",
+        references={"bullet_id": models.TruthBullet},
+    ),
+)
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _column_list(columns: typing.Iterable[str]) -> str:
+    return ", ".join(_quote(column) for column in columns)
+
+
+def _temp_table(table: str) -> str:
+    return _quote(f"snapshot_{table}")
+
+
+async def write_snapshot(guild_id: int) -> typing.BinaryIO:
+    """
+    Writes every row the guild has into a zip archive, one binary COPY
+    per table. All of the tables are read from the same point in time.
+
+    Returns:
+        The archive, seeked to the start. The caller has to close it.
+
+    Raises:
+        ExportTooLarge: The archive is over the export size limit.
+    """
+    # closed by the caller once it's sent
+    file = tempfile.SpooledTemporaryFile(max_size=exports.SPOOL_SIZE)  # noqa: SIM115
+
+    try:
+        manifest: dict[str, typing.Any] = {
+            "version": SNAPSHOT_VERSION,
+            "guild_id": guild_id,
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "tables": {},
+        }
+
+        with zipfile.ZipFile(file, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            client = connections.get(db_settings.read_connection())
+            async with client.acquire_connection() as conn:
+                async with conn.transaction(isolation="repeatable_read", readonly=True):
+                    for spec in TABLES:
+                        manifest["tables"][spec.table] = {
+                            "columns": spec.columns,
+                            "rows": await _copy_table_out(
+                                conn, archive, spec, guild_id
+                            ),
+                        }
+
+            archive.writestr(MANIFEST_NAME, orjson.dumps(manifest))
+
+        if file.tell() > exports.MAX_EXPORT_SIZE:
+            raise exports.ExportTooLarge()
+        file.seek(0)
+    except BaseException:
+        file.close()
+        raise
+
+    return file
+
+
+async def _copy_table_out(
+    conn: asyncpg.Connection,
+    archive: zipfile.ZipFile,
+    spec: SnapshotTable,
+    guild_id: int,
+) -> int:
+    with archive.open(f"{spec.table}.copy", "w", force_zip64=True) as member:
+
+        async def write(chunk: bytes) -> None:
+            # compressing is the slow part, so keep it off of the loop
+            await asyncio.to_thread(member.write, chunk)
+
+        query = f"""
+SELECT {_column_list(spec.columns)} FROM {_quote(spec.table)} WHERE {spec.where}
+""".strip()  # noqa: S608
+        status: str = await conn.copy_from_query(
+            query,
+            guild_id,
+            output=write,
+            format="binary",
+        )
+
+    # the status is in the form of "COPY <rows>"
+    return int(status.rsplit(" ", 1)[-1])
+
+
+def _read_manifest(archive: zipfile.ZipFile) -> dict[str, list[str]]:
+    try:
+        manifest = orjson.loads(archive.read(MANIFEST_NAME))
+    except (KeyError, orjson.JSONDecodeError):
+        raise SnapshotError("The snapshot is missing its manifest.") from None
+
+    if not isinstance(manifest, dict) or manifest.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError("This snapshot version is not supported.")
+
+    if sum(info.file_size for info in archive.infolist()) > MAX_UNCOMPRESSED_SIZE:
+        raise SnapshotError("The snapshot is too large to restore.")
+
+    given = manifest.get("tables")
+    if not isinstance(given, dict) or not set(given) <= {spec.table for spec in TABLES}:
+        raise SnapshotError("The snapshot has tables that aren't known.")
+
+    tables: dict[str, list[str]] = {}
+
+    # parents are checked before their children, since they come first
+    for spec in TABLES:
+        if (info := given.get(spec.table)) is None:
+            continue
+
+        table = spec.table
+        columns = info.get("columns") if isinstance(info, dict) else None
+        # these get put into queries, so they have to be columns we know of
+        if not isinstance(columns, list) or not set(columns) <= set(spec.columns):
+            raise SnapshotError(f"The snapshot has unknown columns for {table}.")
+        if (spec.serial and "id" not in columns) or (
+            spec.channel_column and spec.channel_column not in columns
+        ):
+            raise SnapshotError(f"The snapshot is missing ids for {table}.")
+        if not set(spec.references) <= set(columns) or any(
+            parent._meta.db_table not in tables for parent in spec.references.values()
+        ):
+            raise SnapshotError(f"The snapshot is missing references for {table}.")
+        if f"{table}.copy" not in archive.namelist():
+            raise SnapshotError(f"The snapshot is missing the rows for {table}.")
+
+        tables[table] = columns
+
+    return tables
+
+
+async def _read_member(
+    archive: zipfile.ZipFile, name: str
+) -> typing.AsyncIterator[bytes]:
+    with archive.open(name) as member:
+        while chunk := await asyncio.to_thread(member.read, CHUNK_SIZE):
+            yield chunk
+
+
+def _insert_query(spec: SnapshotTable, columns: list[str]) -> str:
+    temp = _temp_table(spec.table)
+    insert_columns = list(columns)
+    if "guild_id" in spec.columns and "guild_id" not in insert_columns:
+        insert_columns.append("guild_id")
+
+    values: list[str] = []
+    joins: list[str] = []
+    for column in insert_columns:
+        if column == "guild_id":
+            values.append("$1")
+        elif column == "id" and spec.serial:
+            values.append("snapshot.new_id")
+        elif parent := spec.references.get(column):
+            # rows pointing to something that isn't in the snapshot are left out
+            alias = _quote(f"parent_{column}")
+            joins.append(
+                f"JOIN {_temp_table(parent._meta.db_table)} {alias} ON"
+                f" {alias}.id = snapshot.{_quote(column)}"
+            )
+            values.append(f"{alias}.new_id")
+        else:
+            values.append(f"snapshot.{_quote(column)}")
+
+    return f"""
+INSERT INTO {_quote(spec.table)} ({_column_list(insert_columns)})
+SELECT {", ".join(values)} FROM {temp} snapshot {" ".join(joins)}
+""".strip()  # noqa: S608
+
+
+async def restore_snapshot(
+    guild_id: int, data: bytes, *, channel_ids: typing.Iterable[int]
+) -> dict[str, int]:
+    """
+    Replaces all of the guild's data with what's in the snapshot, in one
+    transaction. Rows are bulk loaded with binary COPY into temporary tables
+    and then inserted, getting new ids along the way.
+
+    Rows tied to a channel are only restored if the channel is in channel_ids
+    or already has data for this guild.
+
+    Returns:
+        The number of rows restored for each table.
+
+    Raises:
+        SnapshotError: The snapshot is invalid.
+    """
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile:
+        raise SnapshotError("The file is not a snapshot.") from None
+
+    restored: dict[str, int] = {}
+
+    with archive:
+        tables = _read_manifest(archive)
+
+        client = connections.get(db_settings.PRIMARY)
+        async with client.acquire_connection() as conn:
+            try:
+                async with conn.transaction():
+                    existing = await conn.fetch(
+                        "SELECT channel_id FROM thiatruthbullets WHERE guild_id = $1"
+                        " UNION SELECT channel_id FROM thiamessagelink WHERE guild_id"
+                        " = $1",
+                        guild_id,
+                    )
+                    allowed_channels = list(
+                        {*channel_ids, *(row["channel_id"] for row in existing)}
+                    )
+
+                    # everything else goes along with these through cascades
+                    await conn.execute(
+                        "DELETE FROM thiaguildconfig WHERE guild_id = $1", guild_id
+                    )
+                    await conn.execute(
+                        "DELETE FROM thiatruthbullets WHERE guild_id = $1", guild_id
+                    )
+
+                    for spec in TABLES:
+                        if (columns := tables.get(spec.table)) is None:
+                            continue
+
+                        restored[spec.table] = await _copy_table_in(
+                            conn, archive, spec, columns, guild_id, allowed_channels
+                        )
+            except (
+                asyncpg.DataError,
+                asyncpg.IntegrityConstraintViolationError,
+                zipfile.BadZipFile,
+            ) as e:
+                raise SnapshotError(f"The snapshot could not be restored: {e}") from e
+
+    return restored
+
+
+async def _copy_table_in(
+    conn: asyncpg.Connection,
+    archive: zipfile.ZipFile,
+    spec: SnapshotTable,
+    columns: list[str],
+    guild_id: int,
+    channel_ids: list[int],
+) -> int:
+    temp = _temp_table(spec.table)
+    await conn.execute(f"""
+CREATE TEMPORARY TABLE {temp} ON COMMIT DROP AS
+SELECT {_column_list(columns)} FROM {_quote(spec.table)} WITH NO DATA
+""".strip())  # noqa: S608
+    await conn.copy_to_table(
+        f"snapshot_{spec.table}",
+        source=_read_member(archive, f"{spec.table}.copy"),
+        columns=columns,
+        format="binary",
+    )
+
+    if spec.channel_column:
+        # done before ids are given out, so that children of these rows are
+        # left out too
+        await conn.execute(
+            f"""
+DELETE FROM {temp} WHERE NOT ({_quote(spec.channel_column)} = ANY($1::bigint[]))
+""".strip(),  # noqa: S608
+            channel_ids,
+        )
+
+    if spec.serial:
+        await conn.execute(f"""
+ALTER TABLE {temp} ADD COLUMN new_id integer;
+UPDATE {temp} SET new_id = nextval(pg_get_serial_sequence('{spec.table}', 'id'));
+""".strip())  # noqa: S608
+
+    # only tables with a guild_id column take the guild id
+    args = (guild_id,) if "guild_id" in spec.columns else ()
+    status: str = await conn.execute(_insert_query(spec, columns), *args)
+    # the status is in the form of "INSERT 0 <rows>"
+    return int(status.rsplit(" ", 1)[-1])
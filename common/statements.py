@@ -0,0 +1,155 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import dataclasses
+import logging
+import operator
+import time
+
+import typing_extensions as typing
+from tortoise.connection import get_connection
+
+import db_settings
+
+if typing.TYPE_CHECKING:
+    import asyncpg
+
+# like common.caches, this module is not reloaded by extensions
+
+__all__ = (
+    "Statement",
+    "StatementRegistry",
+    "StatementStats",
+    "column",
+    "prepare_connection",
+    "registry",
+)
+
+logger = logging.getLogger("discord")
+
+RowT = typing.TypeVar("RowT")
+
+
+def column(name: str) -> typing.Callable[["asyncpg.Record"], typing.Any]:
+    return operator.itemgetter(name)
+
+
+@dataclasses.dataclass(slots=True)
+class StatementStats:
+    calls: int = 0
+    rows: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+    @property
+    def avg_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+    def record(self, elapsed: float, rows: int) -> None:
+        self.calls += 1
+        self.rows += rows
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+
+class Statement(typing.Generic[RowT]):
+    """
+    A raw SQL statement that is declared once and executed through asyncpg's
+    per-connection statement cache, skipping Tortoise's dict conversion.
+    """
+
+    __slots__ = ("mapper", "name", "query", "stats")
+
+    def __init__(
+        self,
+        name: str,
+        query: str,
+        mapper: typing.Callable[["asyncpg.Record"], RowT],
+    ) -> None:
+        self.name = name
+        self.query = query
+        self.mapper = mapper
+        self.stats = StatementStats()
+
+    def __repr__(self) -> str:
+        return f"<Statement name={self.name!r}>"
+
+    async def fetch(
+        self, *args: typing.Any, connection_name: str | None = None
+    ) -> list[RowT]:
+        start = time.perf_counter()
+        connection_name = connection_name or db_settings.read_connection()
+
+        # inside of a transaction, this gives back the transaction's connection
+        async with get_connection(connection_name).acquire_connection() as conn:
+            records = await conn.fetch(self.query, *args)
+
+        self.stats.record(time.perf_counter() - start, len(records))
+        return [self.mapper(record) for record in records]
+
+    async def fetchrow(
+        self, *args: typing.Any, connection_name: str | None = None
+    ) -> RowT | None:
+        rows = await self.fetch(*args, connection_name=connection_name)
+        return rows[0] if rows else None
+
+
+class StatementRegistry:
+    def __init__(self) -> None:
+        self.statements: dict[str, Statement] = {}
+
+    @typing.overload
+    def register(self, name: str, query: str) -> Statement["asyncpg.Record"]: ...
+
+    @typing.overload
+    def register(
+        self,
+        name: str,
+        query: str,
+        mapper: typing.Callable[["asyncpg.Record"], RowT],
+    ) -> Statement[RowT]: ...
+
+    def register(
+        self,
+        name: str,
+        query: str,
+        mapper: typing.Callable[["asyncpg.Record"], typing.Any] | None = None,
+    ) -> Statement:
+        mapper = mapper or (lambda r: r)
+
+        # modules get reloaded - keep stats around if nothing changed
+        if (existing := self.statements.get(name)) and existing.query == query:
+            existing.mapper = mapper
+            return existing
+
+        statement = Statement(name, query, mapper)
+        self.statements[name] = statement
+        return statement
+
+    def stats(self) -> dict[str, StatementStats]:
+        return {name: stmt.stats for name, stmt in self.statements.items()}
+
+
+registry = StatementRegistry()
+
+
+async def prepare_connection(conn: "asyncpg.Connection") -> None:
+    """
+    Prepares every registered statement on a new connection, so that the
+    first real execution doesn't pay for parsing. Meant to be the pool's
+    init hook, so that connections the pool opens later are prepared too.
+    """
+    for statement in registry.statements.values():
+        try:
+            # conn.prepare's statements stop working once the connection goes
+            # back to the pool - only the cache that fetch uses outlives that,
+            # and asyncpg has no public way of filling it without running the query
+            await conn._prepare(statement.query, use_cache=True)
+        except Exception:
+            logger.exception("Failed to prepare %s.", statement.name)
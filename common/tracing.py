@@ -0,0 +1,319 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import asyncio
+import collections
+import contextlib
+import contextvars
+import dataclasses
+import functools
+import logging
+import time
+
+import discord
+import orjson
+import typing_extensions as typing
+
+import common.defer as defer
+
+if typing.TYPE_CHECKING:
+    import asyncpg
+    from discord.ext import commands
+
+    from common.core import THIABase
+
+# like common.caches, this module is not reloaded by extensions
+
+__all__ = (
+    "Invocation",
+    "LabelStats",
+    "QueryTracer",
+    "current",
+    "install",
+    "setup_query_tracing",
+    "traced",
+    "tracer",
+)
+
+logger = logging.getLogger("discord")
+
+# transactions issue these constantly, they aren't what we're looking for
+_CONTROL_PREFIXES: typing.Final[tuple[str, ...]] = (
+    "BEGIN",
+    "COMMIT",
+    "ROLLBACK",
+    "SAVEPOINT",
+    "RELEASE",
+)
+
+_current: contextvars.ContextVar["Invocation | None"] = contextvars.ContextVar(
+    "query_invocation", default=None
+)
+
+P = typing.ParamSpec("P")
+R = typing.TypeVar("R")
+
+
+@dataclasses.dataclass(slots=True)
+class Invocation:
+    label: str
+    count: int = 0
+    total_time: float = 0.0
+    statements: collections.Counter[str] = dataclasses.field(
+        default_factory=collections.Counter
+    )
+    started: float = dataclasses.field(default_factory=time.monotonic)
+    ended: float = 0.0
+    finished: bool = False
+
+    @property
+    def wall_time(self) -> float:
+        return (self.ended or time.monotonic()) - self.started
+
+    def end(self) -> None:
+        # the trace may close later than the work it's timing
+        if not self.ended:
+            self.ended = time.monotonic()
+
+    def duplicates(self, threshold: int) -> dict[str, int]:
+        return {
+            query: count
+            for query, count in self.statements.items()
+            if count >= threshold and not query.lstrip().startswith(_CONTROL_PREFIXES)
+        }
+
+
+@dataclasses.dataclass(slots=True)
+class LabelStats:
+    invocations: int = 0
+    queries: int = 0
+    max_queries: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+    flagged: int = 0
+
+    @property
+    def avg_queries(self) -> float:
+        return self.queries / self.invocations if self.invocations else 0.0
+
+    @property
+    def avg_time(self) -> float:
+        return self.total_time / self.invocations if self.invocations else 0.0
+
+    def record(self, invocation: Invocation, *, flagged: bool) -> None:
+        self.invocations += 1
+        self.queries += invocation.count
+        self.max_queries = max(self.max_queries, invocation.count)
+        self.total_time += invocation.total_time
+        self.max_time = max(self.max_time, invocation.total_time)
+        self.flagged += flagged
+
+
+class QueryTracer:
+    """
+    Attributes every query made through asyncpg to the command, autocomplete,
+    button or listener that is running, and flags invocations that go over
+    their query budget or repeat the same statement (usually an N+1).
+    """
+
+    def __init__(
+        self,
+        *,
+        max_queries: int = 10,
+        max_time: float = 0.5,
+        duplicate_threshold: int = 3,
+        history: int = 50,
+    ) -> None:
+        self.max_queries = max_queries
+        self.max_time = max_time
+        self.duplicate_threshold = duplicate_threshold
+
+        self.labels: collections.defaultdict[str, LabelStats] = collections.defaultdict(
+            LabelStats
+        )
+        self.flagged: collections.deque[dict[str, typing.Any]] = collections.deque(
+            maxlen=history
+        )
+        self.untracked = 0
+        self.observers: list[typing.Callable[[Invocation], None]] = []
+
+    def on_query(self, record: "asyncpg.connection.LoggedQuery") -> None:
+        # asyncpg's pool runs this when a connection is released, it isn't ours
+        if record.query.endswith("RESET ALL;"):
+            return
+
+        # asyncpg calls this with call_soon, which keeps the query's context
+        invocation = _current.get()
+        if invocation is None or invocation.finished:
+            self.untracked += 1
+            return
+
+        invocation.count += 1
+        invocation.total_time += record.elapsed
+        invocation.statements[record.query] += 1
+
+    @contextlib.asynccontextmanager
+    async def trace(self, label: str) -> typing.AsyncGenerator[Invocation, None]:
+        # anything nested (ex. a command invoked by a listener) counts towards the outer trace
+        if (existing := _current.get()) is not None and not existing.finished:
+            yield existing
+            return
+
+        invocation = Invocation(label)
+        token = _current.set(invocation)
+        try:
+            yield invocation
+        finally:
+            # let any pending query logger callbacks run before we close this out
+            await asyncio.sleep(0)
+            invocation.end()
+            invocation.finished = True
+            _current.reset(token)
+            self.finish(invocation)
+
+    def finish(self, invocation: Invocation) -> None:
+        reasons: list[str] = []
+        if invocation.count > self.max_queries:
+            reasons.append("query_count")
+        if invocation.total_time > self.max_time:
+            reasons.append("query_time")
+
+        duplicates = invocation.duplicates(self.duplicate_threshold)
+        if duplicates:
+            reasons.append("duplicate_statements")
+
+        self.labels[invocation.label].record(invocation, flagged=bool(reasons))
+        for observer in self.observers:
+            observer(invocation)
+
+        if not reasons:
+            return
+
+        entry = {
+            "event": "query_budget_exceeded",
+            "label": invocation.label,
+            "reasons": reasons,
+            "queries": invocation.count,
+            "query_time_ms": round(invocation.total_time * 1000, 2),
+            "wall_time_ms": round(invocation.wall_time * 1000, 2),
+            "duplicates": [
+                {"query": " ".join(query.split())[:200], "count": count}
+                for query, count in sorted(
+                    duplicates.items(), key=lambda x: x[1], reverse=True
+                )
+            ],
+        }
+        self.flagged.append(entry)
+        logger.warning("Query budget exceeded: %s", orjson.dumps(entry).decode())
+
+    def clear(self) -> None:
+        self.labels.clear()
+        self.flagged.clear()
+        self.untracked = 0
+
+
+tracer = QueryTracer()
+
+
+def _chain_init(
+    previous: typing.Callable[["asyncpg.Connection"], typing.Awaitable[None]] | None,
+) -> typing.Callable[["asyncpg.Connection"], typing.Awaitable[None]]:
+    async def init_connection(conn: "asyncpg.Connection") -> None:
+        # statements are prepared before the logger is added, so they don't
+        # get counted against whatever happens to be running
+        if previous is not None:
+            await previous(conn)
+        conn.add_query_logger(tracer.on_query)
+
+    return init_connection
+
+
+def current() -> Invocation | None:
+    """The invocation being traced, if any."""
+    return _current.get()
+
+
+def traced(
+    label: str,
+) -> typing.Callable[
+    [typing.Callable[P, typing.Awaitable[R]]], typing.Callable[P, typing.Awaitable[R]]
+]:
+    def decorator(
+        func: typing.Callable[P, typing.Awaitable[R]],
+    ) -> typing.Callable[P, typing.Awaitable[R]]:
+        @functools.wraps(func)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            async with tracer.trace(label):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _command_label(
+    command: "discord.ApplicationCommand | commands.Command | None",
+) -> str:
+    return command.qualified_name if command is not None else "unknown"
+
+
+def install(tortoise_config: dict[str, typing.Any]) -> None:
+    """
+    Makes every connection Tortoise creates report its queries to the tracer.
+    Needs to be called before Tortoise is initialized.
+    """
+    # asyncpg runs init on every connection the pool makes
+    for connection in tortoise_config["connections"].values():
+        credentials = connection["credentials"]
+        credentials["init"] = _chain_init(credentials.get("init"))
+
+
+def setup_query_tracing(
+    bot: "THIABase",
+    tortoise_config: dict[str, typing.Any],
+    *,
+    enabled: bool = True,
+    max_queries: int = 10,
+    max_time: float = 0.5,
+    duplicate_threshold: int = 3,
+) -> QueryTracer:
+    """
+    Sets up the query tracer for application and prefixed commands.
+    Needs to be called before Tortoise is initialized.
+
+    Returns:
+        The query tracer.
+    """
+    tracer.max_queries = max_queries
+    tracer.max_time = max_time
+    tracer.duplicate_threshold = duplicate_threshold
+
+    if enabled:
+        install(tortoise_config)
+
+    original_invoke_application_command = bot.invoke_application_command
+    original_invoke = bot.invoke
+
+    async def invoke_application_command(ctx: discord.ApplicationContext) -> None:
+        label = _command_label(defer.resolve_command(ctx))
+        async with tracer.trace(label):
+            await original_invoke_application_command(ctx)
+
+    async def invoke(ctx: "commands.Context") -> None:
+        # every message goes through here, most of them aren't commands
+        if ctx.command is None:
+            await original_invoke(ctx)
+            return
+
+        async with tracer.trace(f"text:{_command_label(ctx.command)}"):
+            await original_invoke(ctx)
+
+    bot.invoke_application_command = invoke_application_command
+    bot.invoke = invoke
+    return tracer
@@ -12,29 +12,56 @@ import os
 import platform
 import re
 import textwrap
-import traceback
 from pathlib import Path
 
 import aiohttp
 import discord
-import sentry_sdk
 import typing_extensions as typing
 from discord.ext import commands
 
+import common.caches as caches
+import common.errors as errors
+import common.http_client as http_client
+import common.tracing as tracing
 from common.core import *
 
 OS_TRUE_VALUES = frozenset({"true", "True", "TRUE", "t", "T", "1"})
 SENTRY_ENABLED = bool(os.environ.get("SENTRY_DSN", False))  # type: ignore
 VOTING_ENABLED = bool(os.environ.get("TOP_GG_TOKEN") or os.environ.get("DBL_TOKEN"))
+METRICS_ENABLED = bool(os.environ.get("METRICS_PORT"))
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT") or 0)
 DOCKER_ENABLED = os.environ.get("DOCKER_MODE") in OS_TRUE_VALUES
+CHANNEL_WARMUP_ENABLED = os.environ.get("CHANNEL_WARMUP") in OS_TRUE_VALUES
+AUTO_DEFER_BUDGET = float(os.environ.get("AUTO_DEFER_BUDGET", 1.5))
+QUERY_TRACING_ENABLED = os.environ.get("QUERY_TRACING", "true") in OS_TRUE_VALUES
+QUERY_BUDGET = int(os.environ.get("QUERY_BUDGET", 10))
+QUERY_TIME_BUDGET = float(os.environ.get("QUERY_TIME_BUDGET", 0.5))
+QUERY_DUPLICATE_THRESHOLD = int(os.environ.get("QUERY_DUPLICATE_THRESHOLD", 3))
+LOOP_MONITOR_ENABLED = os.environ.get("LOOP_MONITOR", "true") in OS_TRUE_VALUES
+SLOW_CALLBACK_THRESHOLD = float(os.environ.get("SLOW_CALLBACK_THRESHOLD", 0.25))
+SENTRY_TRACES_SAMPLE_RATE = float(os.environ.get("SENTRY_TRACES_SAMPLE_RATE", 0))
+LOG_JSON = os.environ.get("LOG_JSON") in OS_TRUE_VALUES
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", 5))
+LOG_ROTATE_WHEN = os.environ.get("LOG_ROTATE_WHEN") or None
+ERROR_BURST_LIMIT = int(os.environ.get("ERROR_BURST_LIMIT", 3))
+ERROR_DIGEST_INTERVAL = float(os.environ.get("ERROR_DIGEST_INTERVAL", 600))
+SHUTDOWN_TIMEOUT = float(os.environ.get("SHUTDOWN_TIMEOUT", 8))
+DICE_POOL_ENABLED = os.environ.get("DICE_POOL") in OS_TRUE_VALUES
+DICE_POOL_WORKERS = int(os.environ.get("DICE_POOL_WORKERS", 2))
+DICE_ROLL_TIMEOUT = float(os.environ.get("DICE_ROLL_TIMEOUT", 2))
+DICE_WORKER_MEMORY = int(os.environ.get("DICE_WORKER_MEMORY", 64 * 1024 * 1024))
 BOT_COLOR = discord.Color(int(os.environ["BOT_COLOR"]))
 MAX_DICE_ENTRIES: typing.Final[int] = 50
+MAX_IMPORT_SIZE: typing.Final[int] = 10 * 1024 * 1024
 PYTHON_VERSION = platform.python_version_tuple()
 PYTHON_IMPLEMENTATION = platform.python_implementation()
 
 logger = logging.getLogger("discord")
 
 CogT = typing.TypeVar("CogT", bound=discord.Cog)
+CallbackT = typing.TypeVar("CallbackT", bound=typing.Callable)
 
 if typing.TYPE_CHECKING:
     ChannelT = typing.TypeVar("ChannelT", bound=discord.abc.MessageableChannel)
@@ -168,6 +195,32 @@ def role_check(ctx: THIASlashContext, role: discord.Role) -> discord.Role:
     return role
 
 
+async def source_guild_check(ctx: THIASlashContext, guild_id: str) -> discord.Guild:
+    """
+    Makes sure the user can manage the server given by ID, so that its data
+    can be copied into the current server.
+    """
+    try:
+        source_guild_id = int(guild_id)
+    except ValueError:
+        raise BadArgument("Invalid server ID.") from None
+
+    if source_guild_id == ctx.guild_id:
+        raise BadArgument("The server to copy from must be a different server.")
+
+    # the same error either way, so this can't be used to see what servers
+    # the bot is in
+    guild = ctx.bot.get_guild(source_guild_id)
+    member = await guild.get_or_fetch(discord.Member, ctx.author.id) if guild else None
+    if not member or not member.guild_permissions.manage_guild:
+        raise CustomCheckFailure(
+            "Could not find that server, or you do not have the Manage Server"
+            " permission in it."
+        )
+
+    return guild
+
+
 def valid_channel_check(channel: "ChannelT", perms: discord.Permissions) -> "ChannelT":
     if not perms:
         raise commands.BadArgument(f"Cannot resolve permissions for {channel.name}.")
@@ -208,6 +261,15 @@ def alias(
     return new_cmd
 
 
+def replica_reads(callback: CallbackT) -> CallbackT:
+    """
+    Marks a command as only reading data that can be a little stale,
+    so that its queries can be routed to the read replica.
+    """
+    callback.__replica_reads__ = True  # type: ignore
+    return callback
+
+
 def parse_modal_responses(view: discord.ui.DesignerModal) -> dict[str, typing.Any]:
     return {
         child.item.custom_id: getattr(
@@ -221,55 +283,51 @@ def parse_modal_responses(view: discord.ui.DesignerModal) -> dict[str, typing.An
 async def getch_channel(
     guild: discord.Guild, channel_id: int
 ) -> discord.abc.GuildChannel | discord.Thread | None:
-    if not channel_id:
-        return None
+    return await caches.channel_cache.getch(guild, channel_id)
 
-    # annoying, guild.get_or_fetch doesn't work with threads, so we have to do this manually
-    if channel := guild.get_channel_or_thread(channel_id):
-        return channel
 
+async def read_attachment(
+    bot: THIABase, attachment: discord.Attachment, *, max_size: int = MAX_IMPORT_SIZE
+) -> bytes:
+    """
+    Downloads a file given to a command.
+
+    Raises:
+        BadArgument: The file couldn't be downloaded.
+        CustomCheckFailure: The file is over max_size.
+    """
     try:
-        return await guild.fetch_channel(channel_id)
-    except discord.HTTPException:
-        return None
+        return await bot.http_client.read_limited(attachment.url, max_size=max_size)
+    except http_client.ResponseTooLarge:
+        raise CustomCheckFailure(
+            f"This file is over {max_size // (1024 * 1024)} MiB, which is not supported"
+            " by this bot."
+        ) from None
+    except aiohttp.ClientError:
+        raise BadArgument("Failed to fetch the file.") from None
+
+
+async def read_json_attachment(bot: THIABase, attachment: discord.Attachment) -> bytes:
+    """
+    Downloads a JSON file given to an import command.
+
+    Raises:
+        BadArgument: The file isn't JSON or couldn't be downloaded.
+        CustomCheckFailure: The file is over MAX_IMPORT_SIZE.
+    """
+    if not attachment.content_type or not attachment.content_type.startswith(
+        "application/json"
+    ):
+        raise BadArgument("The file must be a JSON file.")
+
+    return await read_attachment(bot, attachment)
 
 
 async def error_handle(
     error: Exception, *, ctx: THIABridgeContext | discord.Interaction | None = None
 ) -> None:
-    if not isinstance(error, aiohttp.ServerDisconnectedError):
-        if SENTRY_ENABLED:
-            scope = sentry_sdk.Scope.get_current_scope()
-            if ctx:
-                if isinstance(ctx, THIABridgeApplicationContext):
-                    scope.set_context(
-                        type(ctx).__name__,
-                        {
-                            "options": ctx.options,
-                            "message": ctx.message,
-                        },
-                    )
-                elif isinstance(ctx, THIABridgeExtContext):
-                    scope.set_context(
-                        type(ctx).__name__,
-                        {
-                            "args": ctx.args,
-                            "kwargs": ctx.kwargs,
-                            "message": ctx.message,
-                        },
-                    )
-                elif isinstance(ctx, discord.Interaction):
-                    scope.set_context(
-                        type(ctx).__name__,
-                        {
-                            "data": ctx.data,
-                            "type": ctx.type,
-                        },
-                    )
-            sentry_sdk.capture_exception(error)
-        else:
-            traceback.print_exception(error)
-            logger.error("An error occured.", exc_info=error)
+    # reporting happens in the background, only responding to the user is awaited
+    errors.reporter.report(error, ctx=ctx)
     if ctx and isinstance(
         ctx,
         (THIABridgeApplicationContext, THIABridgeExtContext, discord.Interaction),
@@ -313,11 +371,12 @@ def button_handler(
                 return
 
             try:
-                await func(
-                    self,
-                    inter,
-                    inter.data["custom_id"],
-                )
+                async with tracing.tracer.trace(f"button:{func.__name__}"):
+                    await func(
+                        self,
+                        inter,
+                        inter.data["custom_id"],
+                    )
             except Exception as error:
                 inter.client.dispatch("view_error", error, None, inter)
 
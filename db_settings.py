@@ -7,19 +7,138 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
+import contextlib
+import contextvars
+import functools
 import os
 
+import typing_extensions as typing
+from tortoise.backends.base.config_generator import expand_db_url
+
+import common.statements as statements
 import load_env
 
 load_env.load_env()
 
+if typing.TYPE_CHECKING:
+    from tortoise import Model
+
+__all__ = (
+    "PRIMARY",
+    "REPLICA",
+    "REPLICA_ENABLED",
+    "ReplicaRouter",
+    "read_connection",
+    "route_to_replica",
+    "tortoise_config",
+    "use_primary",
+    "use_replica",
+)
+
+PRIMARY: typing.Final[str] = "default"
+REPLICA: typing.Final[str] = "replica"
+REPLICA_ENABLED: typing.Final[bool] = bool(os.environ.get("DB_READ_URL"))
+
+_use_replica: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "use_replica", default=False
+)
+
+
+def _optional_env(name: str, cast: typing.Callable[[str], typing.Any]) -> typing.Any:
+    value = os.environ.get(name)
+    return cast(value) if value else None
+
+
+def _connection_config(db_url: str) -> dict[str, typing.Any]:
+    config = expand_db_url(db_url)
+    credentials: dict[str, typing.Any] = config["credentials"]
+
+    # passed straight through to asyncpg.create_pool
+    pool_options = {
+        "minsize": _optional_env("DB_POOL_MIN_SIZE", int),
+        "maxsize": _optional_env("DB_POOL_MAX_SIZE", int),
+        "command_timeout": _optional_env("DB_COMMAND_TIMEOUT", float),
+        "statement_cache_size": _optional_env("DB_STATEMENT_CACHE_SIZE", int),
+    }
+    credentials.update({k: v for k, v in pool_options.items() if v is not None})
+
+    # with the statement cache off, there's nowhere to keep them prepared
+    if credentials.get("statement_cache_size") != 0:
+        credentials["init"] = statements.prepare_connection
+    return config
+
+
+@contextlib.contextmanager
+def use_replica() -> typing.Generator[None, None, None]:
+    """
+    Routes reads made inside of this block to the read replica, if there is one.
+    Only use this for reads that can tolerate some replication lag.
+    """
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+@contextlib.contextmanager
+def use_primary() -> typing.Generator[None, None, None]:
+    """
+    Forces reads made inside of this block to go to the primary, even if
+    the surrounding code was routed to the replica.
+    """
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def route_to_replica() -> None:
+    """
+    Like use_replica, but lasts for the rest of the current task.
+    Meant for command hooks, where there is no block to wrap.
+    """
+    _use_replica.set(True)
+
+
+def read_connection() -> str:
+    return REPLICA if REPLICA_ENABLED and _use_replica.get() else PRIMARY
+
+
+class ReplicaRouter:
+    def db_for_read(self, _: type["Model"]) -> str | None:
+        return REPLICA if REPLICA_ENABLED and _use_replica.get() else None
+
+    def db_for_write(self, _: type["Model"]) -> str | None:
+        return None
+
+
+@functools.cache
+def tortoise_config() -> dict[str, typing.Any]:
+    """
+    Builds the Tortoise config from the environment. This is only done when
+    it's first needed, so importing the models doesn't need a database.
+    """
+    config = {
+        "connections": {PRIMARY: _connection_config(os.environ["DB_URL"])},
+        "apps": {
+            "models": {
+                "models": ["common.models"],
+                "migrations": "migrations",
+                "default_connection": PRIMARY,
+            }
+        },
+        "routers": ["db_settings.ReplicaRouter"],
+    }
+
+    if REPLICA_ENABLED:
+        config["connections"][REPLICA] = _connection_config(os.environ["DB_READ_URL"])
+    return config
+
 
-TORTOISE_ORM = {
-    "connections": {"default": os.environ["DB_URL"]},
-    "apps": {
-        "models": {
-            "models": ["common.models"],
-            "migrations": "migrations",
-        }
-    },
-}
+def __getattr__(name: str) -> typing.Any:
+    # the tortoise cli looks for TORTOISE_ORM, see pyproject.toml
+    if name == "TORTOISE_ORM":
+        return tortoise_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -7,19 +7,14 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
-import asyncio
 import collections
 import importlib
-import io
 import typing
 
-import aiohttp
 import discord
-import orjson
 import pydantic
 import ragwort
 from discord.ext import commands
-from tortoise.expressions import Q
 from tortoise.transactions import in_transaction
 
 import common.classes as classes
@@ -32,12 +27,7 @@ from . import bullet_common
 
 
 class AddTruthBulletModal(discord.ui.DesignerModal):
-    def __init__(
-        self,
-        channel: discord.TextChannel | discord.Thread,
-        bullet_creation_locks: collections.defaultdict[str, asyncio.Lock],
-    ) -> None:
-        self.bullet_creation_locks = bullet_creation_locks
+    def __init__(self, channel: discord.TextChannel | discord.Thread) -> None:
         self.channel = channel
 
         super().__init__(
@@ -109,52 +99,46 @@ class AddTruthBulletModal(discord.ui.DesignerModal):
                 " to follow the parent channel."
             )
 
-        async with self.bullet_creation_locks[
-            f"{self.channel.id}-{responses['truth_bullet_trigger'].lower()}"
-        ]:
-            if await models.TruthBullet.trigger_exists(
-                self.channel.id, responses["truth_bullet_trigger"]
-            ):
-                raise utils.BadArgument(
-                    f"A Truth Bullet in {self.channel.mention} already has the trigger"
-                    f" `{responses['truth_bullet_trigger']}` or has an"
-                    " alias named that!"
-                )
+        trigger = utils.replace_smart_punc(responses["truth_bullet_trigger"])
 
-            try:
-                if isinstance(responses["truth_bullet_hidden"], list):
-                    hidden = utils.convert_to_bool(responses["truth_bullet_hidden"][0])
-                else:
-                    hidden = utils.convert_to_bool(responses["truth_bullet_hidden"])
-            except utils.BadArgument:
-                raise utils.BadArgument(
-                    "Invalid value for hiding the Truth Bullet! Giving a simple"
-                    " 'yes' or 'no' will work."
-                ) from None
-
-            image: str | None = (
-                responses["truth_bullet_image"].strip()
-                if responses.get("truth_bullet_image")
-                else None
-            )
-            if image and not utils.HTTP_URL_REGEX.fullmatch(image):
-                raise utils.BadArgument("The image given must be a valid URL.")
-
-            await models.TruthBullet.create(
-                trigger=utils.replace_smart_punc(responses["truth_bullet_trigger"]),
-                description=responses["truth_bullet_desc"],
-                channel_id=self.channel.id,
-                guild_id=inter.guild_id,
-                found=False,
-                finder=None,
-                hidden=hidden,
-                image=image,
+        try:
+            if isinstance(responses["truth_bullet_hidden"], list):
+                hidden = utils.convert_to_bool(responses["truth_bullet_hidden"][0])
+            else:
+                hidden = utils.convert_to_bool(responses["truth_bullet_hidden"])
+        except utils.BadArgument:
+            raise utils.BadArgument(
+                "Invalid value for hiding the Truth Bullet! Giving a simple"
+                " 'yes' or 'no' will work."
+            ) from None
+
+        image: str | None = (
+            responses["truth_bullet_image"].strip()
+            if responses.get("truth_bullet_image")
+            else None
+        )
+        if image and not utils.HTTP_URL_REGEX.fullmatch(image):
+            raise utils.BadArgument("The image given must be a valid URL.")
+
+        # the trigger is checked against existing triggers and aliases as part of
+        # the insert itself
+        if not await models.TruthBullet.create_unique(
+            self.channel.id,
+            inter.guild_id,
+            trigger=trigger,
+            description=responses["truth_bullet_desc"],
+            hidden=hidden,
+            image=image,
+        ):
+            raise utils.BadArgument(
+                f"A Truth Bullet in {self.channel.mention} already has the trigger"
+                f" `{trigger}` or has an alias named that!"
             )
 
         await inter.respond(
             view=utils.make_view(
-                "Added Truth Bullet with trigger"
-                f" `{responses['truth_bullet_trigger']}` to {self.channel.mention}!"
+                f"Added Truth Bullet with trigger `{trigger}` to"
+                f" {self.channel.mention}!"
             ),
         )
 
@@ -291,11 +275,6 @@ class BulletManagement(utils.Cog):
         self.bot = bot
         self.__cog__ = "Bullet Management"
 
-        # i sure do love weird edge cases with race conditions!
-        self.bullet_creation_locks: collections.defaultdict[str, asyncio.Lock] = (
-            collections.defaultdict(asyncio.Lock)
-        )
-
     manage = ragwort.SlashCommandGroup(
         name="bullet-manage",
         description="Handles management of Truth Bullets.",
@@ -398,9 +377,7 @@ class BulletManagement(utils.Cog):
 
             await ctx.respond(view=utils.quick_view(*containers))
         else:
-            await ctx.send_modal(
-                AddTruthBulletModal(channel, self.bullet_creation_locks)
-            )
+            await ctx.send_modal(AddTruthBulletModal(channel))
 
     add_bullet_full = utils.alias(
         add_bullets,
@@ -419,9 +396,7 @@ class BulletManagement(utils.Cog):
             raise utils.CustomCheckFailure(
                 "Could not find the channel this was associated to. Was it deleted?"
             )
-        await inter.response.send_modal(
-            AddTruthBulletModal(channel, self.bullet_creation_locks)
-        )
+        await inter.response.send_modal(AddTruthBulletModal(channel))
 
     @utils.button_handler(custom_id_prefix="ui-button:add_bullets-")
     async def on_add_bullets_button_old(
@@ -434,9 +409,7 @@ class BulletManagement(utils.Cog):
             raise utils.CustomCheckFailure(
                 "Could not find the channel this was associated to. Was it deleted?"
             )
-        await inter.response.send_modal(
-            AddTruthBulletModal(channel, self.bullet_creation_locks)
-        )
+        await inter.response.send_modal(AddTruthBulletModal(channel))
 
     @manage.command(
         name="remove",
@@ -518,6 +491,7 @@ class BulletManagement(utils.Cog):
         name="list",
         description="Lists all Truth Bullets in the server.",
     )
+    @utils.replica_reads
     async def list_bullets(self, ctx: utils.THIASlashContext) -> None:
         guild_bullets = await models.TruthBullet.filter(
             guild_id=ctx.guild_id,
@@ -909,6 +883,7 @@ class BulletManagement(utils.Cog):
         description="Exports all Truth Bullets for a channel to a JSON file.",
     )
     @commands.cooldown(1, 60, commands.BucketType.guild)
+    @utils.replica_reads
     async def export_channel(
         self,
         ctx: utils.THIASlashContext,
@@ -921,39 +896,22 @@ class BulletManagement(utils.Cog):
             ],
         ),
     ) -> None:
-        bullets = await models.TruthBullet.filter(
-            channel_id=channel.id
-        ).prefetch_related("aliases")
-        if not bullets:
+        bullets = models.TruthBullet.filter(channel_id=channel.id)
+        if not await bullets.exists():
             raise utils.CustomCheckFailure(
                 "There are no Truth Bullets for this channel!"
             )
 
-        bullets_dict: list[exports.TruthBulletEntryDict] = [
-            {
-                "trigger": bullet.trigger,
-                "description": bullet.description,
-                "hidden": bullet.hidden,
-                "image": bullet.image,
-                "aliases": (
-                    [alias.alias for alias in bullet.aliases]
-                    if bullet.aliases._fetched and bullet.aliases
-                    else []
-                ),
-            }
-            for bullet in bullets
-        ]
-        bullets_json = orjson.dumps(
-            {"version": 1, "entries": bullets_dict}, option=orjson.OPT_INDENT_2
-        )
-
-        if len(bullets_json) > 10000000:
+        try:
+            bullets_io = await exports.write_json_export(
+                1, "entries", exports.truth_bullet_pages(bullets)
+            )
+        except exports.ExportTooLarge:
             raise utils.CustomCheckFailure(
                 "The file is too large to send. Please try again with fewer Truth"
                 " Bullets."
-            )
+            ) from None
 
-        bullets_io = io.BytesIO(bullets_json)
         bullets_file = discord.File(
             bullets_io,
             filename=f"bullets_{channel.id}_{int(ctx.interaction.created_at.timestamp())}.json",
@@ -1019,26 +977,12 @@ class BulletManagement(utils.Cog):
                 " to follow the parent channel."
             )
 
-        if not json_file.content_type or not json_file.content_type.startswith(
-            "application/json"
-        ):
-            raise utils.BadArgument("The file must be a JSON file.")
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(json_file.url) as response:
-                if response.status != 200:
-                    raise utils.BadArgument("Failed to fetch the file.")
-
-                try:
-                    await response.content.readexactly(10485760 + 1)
-                    raise utils.CustomCheckFailure(
-                        "This file is over 10 MiB, which is not supported by this bot."
-                    )
-                except asyncio.IncompleteReadError as e:
-                    bullets_json = e.partial
+        bullets_json = await utils.read_json_attachment(self.bot, json_file)
 
         try:
-            bullets = exports.handle_bullet_entry_data(bullets_json)
+            bullets = await exports.validate_import(
+                exports.handle_bullet_entry_data, bullets_json
+            )
         except pydantic.ValidationError as e:
             # let's remove the first line that tells what class the error is for
             error_str = "\n".join(str(e).splitlines()[1:])
@@ -1046,69 +990,34 @@ class BulletManagement(utils.Cog):
                 f"The file is not in the correct format.\n```\n{error_str}\n```"
             ) from None
 
-        trigger_and_aliases_set: set[str] = set()
         trigger_and_aliases: list[str] = []
-
         for entry in bullets:
-            trigger_and_aliases_set.add(entry.trigger)
-            trigger_and_aliases_set.update(entry.aliases)
             trigger_and_aliases.append(entry.trigger)
             trigger_and_aliases.extend(entry.aliases)
 
-        if len(trigger_and_aliases_set) != len(trigger_and_aliases):
+        # matching is case insensitive, so uniqueness has to be too
+        if len({name.upper() for name in trigger_and_aliases}) != len(
+            trigger_and_aliases
+        ):
             raise utils.BadArgument(
                 "There are duplicate triggers and/or aliases in the file. Please ensure"
                 " all triggers and aliases are unique."
             )
 
+        # a fixed number of queries no matter how big the file is, so the
+        # transaction stays short
         async with in_transaction():
-            # TODO: this is flawed - how do we do case insensitive unique checks without doing multiple queries?
-            if await models.TruthBullet.exists(
-                Q(channel_id=channel.id)
-                & (
-                    Q(trigger__in=trigger_and_aliases)
-                    | Q(aliases__alias__in=trigger_and_aliases)
-                )
+            if conflicting := await models.TruthBullet.find_conflicting(
+                channel.id, trigger_and_aliases
             ):
-                if override:
-                    # workaround for the fact that we can't join in deletes
-                    to_delete = await models.TruthBullet.filter(
-                        Q(channel_id=channel.id)
-                        & (
-                            Q(trigger__in=trigger_and_aliases)
-                            | Q(aliases__alias__in=trigger_and_aliases)
-                        )
-                    )
-                    await models.TruthBullet.filter(
-                        id__in=[b.id for b in to_delete]
-                    ).delete()
-                else:
+                if not override:
                     raise utils.BadArgument(
                         "One or more Truth Bullets in the file has a trigger or alias"
                         " with a Truth Bullet already in this channel."
                     )
+                await models.TruthBullet.filter(id__in=conflicting).delete()
 
-            for entry in bullets:
-                created_bullet = await models.TruthBullet.create(
-                    channel_id=channel.id,
-                    guild_id=ctx.guild_id,
-                    trigger=entry.trigger,
-                    description=entry.description,
-                    hidden=entry.hidden,
-                    image=entry.image,
-                    found=False,
-                    finder=None,
-                )
-
-                if entry.aliases:
-                    await models.TruthBulletAlias.bulk_create(
-                        [
-                            models.TruthBulletAlias(
-                                bullet_id=created_bullet.id, alias=alias
-                            )
-                            for alias in entry.aliases
-                        ]
-                    )
+            await models.TruthBullet.bulk_import(channel.id, ctx.guild_id, bullets)
 
         await ctx.respond(
             view=utils.make_view(
@@ -1117,6 +1026,90 @@ class BulletManagement(utils.Cog):
             ),
         )
 
+    @manage.command(
+        name="clone-channel",
+        description="Copies all Truth Bullets from one channel to another.",
+    )
+    @commands.cooldown(1, 15, commands.BucketType.guild)
+    async def clone_channel(
+        self,
+        ctx: utils.THIASlashContext,
+        source_channel: discord.TextChannel | discord.Thread = ragwort.Option(
+            "The channel to copy Truth Bullets from.",
+            channel_types=[
+                discord.ChannelType.text,
+                discord.ChannelType.public_thread,
+                discord.ChannelType.private_thread,
+            ],
+        ),
+        channel: discord.TextChannel | discord.Thread = ragwort.Option(
+            "The channel to copy Truth Bullets to.",
+            channel_types=[
+                discord.ChannelType.text,
+                discord.ChannelType.public_thread,
+                discord.ChannelType.private_thread,
+            ],
+        ),
+        _override: str = ragwort.Option(
+            "Should Truth Bullets with the same trigger or alias be overridden? If"
+            " not, they are skipped.",
+            name="override",
+            choices=[
+                discord.OptionChoice("yes", "yes"),
+                discord.OptionChoice("no", "no"),
+            ],
+            default="no",
+        ),
+    ) -> None:
+        override = _override == "yes"
+        if source_channel.id == channel.id:
+            raise utils.BadArgument("The channels to copy from and to must differ.")
+
+        channel = utils.valid_channel_check(
+            channel, channel.permissions_for(ctx.guild.me)
+        )
+
+        config = await ctx.fetch_config({"bullets": True})
+        if typing.TYPE_CHECKING:
+            assert config.bullets and isinstance(config.bullets, models.BulletConfig)
+
+        if (
+            config.bullets.thread_behavior == models.BulletThreadBehavior.PARENT
+            and isinstance(channel, discord.Thread)
+        ):
+            raise utils.CustomCheckFailure(
+                "Cannot copy Truth Bullets to a thread while thread behavior is set"
+                " to follow the parent channel."
+            )
+
+        # copied entirely within the database, so nothing is loaded here
+        async with in_transaction():
+            total, cloned, replaced = await models.TruthBullet.clone_channel(
+                source_channel.id, channel.id, ctx.guild_id, overwrite=override
+            )
+
+        if not total:
+            raise utils.CustomCheckFailure(
+                f"There are no Truth Bullets in {source_channel.mention} to copy."
+            )
+
+        extra = ""
+        if replaced:
+            extra = f"\nReplaced {replaced} Truth Bullets that used the same names."
+        elif total != cloned:
+            extra = (
+                f"\nSkipped {total - cloned} Truth Bullets with triggers or aliases"
+                " already in use."
+            )
+
+        await ctx.respond(
+            view=utils.make_view(
+                f"Copied {cloned} Truth Bullets from {source_channel.mention} to"
+                f" {channel.mention}.{extra}",
+                title="Truth Bullets Clone",
+            ),
+        )
+
     @remove_bullet.autocomplete("trigger")
     @delete_bullet.autocomplete("trigger")
     @bullet_info.autocomplete("trigger")
@@ -15,7 +15,9 @@ import typing_extensions as typing
 from discord.ext import commands
 
 import common.fuzzy as fuzzy
+import common.metrics as metrics
 import common.models as models
+import common.tracing as tracing
 import common.utils as utils
 
 from . import bullet_common
@@ -38,6 +40,7 @@ class BulletFinding(utils.Cog):
         self.__cog_name__ = "BDA Investigation Finding"
 
     @discord.Cog.listener("on_message")
+    @tracing.traced("message:bullet_finding")
     async def on_message(self, message: discord.Message) -> None:
         # if the message is from a bot, from discord, not from a guild, not a default message or a reply, or is empty
         if (
@@ -87,12 +90,15 @@ class BulletFinding(utils.Cog):
         else:
             channel_id = message.channel.id
 
+        metrics.bullet_scans.inc()
         bullet_found = await models.TruthBullet.find(
             channel_id, utils.replace_smart_punc(message.content)
         )
         if not bullet_found:
             return
 
+        metrics.bullet_hits.inc()
+
         bullet_found.found = True
         bullet_found.finder = message.author.id
 
@@ -143,7 +149,7 @@ class BulletFinding(utils.Cog):
                 )
                 return
 
-        await bullet_found.save(force_update=True)
+        await bullet_found.to_model().save(update_fields=("found", "finder"))
         await bullet_common.check_for_finish(
             self.bot, message.guild, bullet_chan, config
         )
@@ -7,9 +7,7 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
-import asyncio
 import importlib
-from collections import defaultdict
 
 import d20
 import discord
@@ -20,6 +18,7 @@ from discord.ext import commands
 import common.classes as classes
 import common.fuzzy as fuzzy
 import common.models as models
+import common.rolls as rolls
 import common.utils as utils
 
 from . import dice_common
@@ -30,12 +29,6 @@ class DiceManagement(utils.Cog):
         self.bot = bot
         self.__cog_name__ = "Dice Management"
 
-        # i sure do love weird edge cases with race conditions!
-        # TODO: locks should be shared with dice_cmds cmds to prevent race conditions
-        self.dice_creation_locks: defaultdict[str, asyncio.Lock] = defaultdict(
-            asyncio.Lock
-        )
-
     config = ragwort.SlashCommandGroup(
         name="dice-config",
         description="Handles configuration of dice mechanics.",
@@ -147,17 +140,8 @@ class DiceManagement(utils.Cog):
                 "No registered dice found with that name for that user."
             )
 
-        try:
-            result = dice_common.d20_roll(entry.value)
-        except d20.errors.RollSyntaxError as e:
-            raise utils.BadArgument(f"Invalid dice roll syntax.\n{e!s}") from None
-        except d20.errors.TooManyRolls:
-            raise utils.BadArgument("Too many dice rolls in the expression.") from None
-        except d20.errors.RollValueError:
-            raise utils.BadArgument("Invalid dice roll value.") from None
-
-        await ctx.respond(
-            view=utils.make_view(result.result), ephemeral=hidden == "yes"
+        await dice_common.dice_roll_actual(
+            ctx, entry.value, parsed=entry.parsed, ephemeral=hidden == "yes"
         )
 
     @manage.command(
@@ -189,32 +173,23 @@ class DiceManagement(utils.Cog):
                 " server."
             )
 
-        async with self.dice_creation_locks[f"{ctx.guild_id}-{user.id}-{name.lower()}"]:
-            if await models.DiceEntry.exists(
-                guild_id=ctx.guild_id, user_id=user.id, name__iexact=name
-            ):
-                raise utils.BadArgument(
-                    "A dice with that name already exists for that user."
-                )
-
-            await ctx.fetch_config({"dice": True})
-
-            try:
-                dice_common.d20_roll(dice)
-            except d20.errors.RollSyntaxError as e:
-                raise utils.BadArgument(f"Invalid dice roll syntax.\n{e!s}") from None
-            except d20.errors.TooManyRolls:
-                raise utils.BadArgument(
-                    "Too many dice rolls in the expression."
-                ) from None
-            except d20.errors.RollValueError:
-                raise utils.BadArgument("Invalid dice roll value.") from None
-
-            await models.DiceEntry.create(
-                guild_id=ctx.guild_id,
-                user_id=user.id,
-                name=name,
-                value=dice,
+        await ctx.fetch_config({"dice": True})
+
+        try:
+            rolls.validate(dice)
+        except d20.errors.RollSyntaxError as e:
+            raise utils.BadArgument(f"Invalid dice roll syntax.\n{e!s}") from None
+        except d20.errors.TooManyRolls:
+            raise utils.BadArgument("Too many dice rolls in the expression.") from None
+        except d20.errors.RollValueError:
+            raise utils.BadArgument("Invalid dice roll value.") from None
+
+        # the unique index on the name decides if it already exists
+        if not await models.DiceEntry.insert_unique(
+            ctx.guild_id, user.id, [models.DiceEntry(name=name, value=dice)]
+        ):
+            raise utils.BadArgument(
+                "A dice with that name already exists for that user."
             )
 
         await ctx.respond(
@@ -225,6 +200,7 @@ class DiceManagement(utils.Cog):
         name="list-for",
         description="Lists dice registered for a user.",
     )
+    @utils.replica_reads
     async def dice_list_for(
         self,
         ctx: utils.THIASlashContext,
@@ -325,6 +301,7 @@ class DiceManagement(utils.Cog):
         description="Exports all registered dice for a user to a JSON file.",
     )
     @commands.cooldown(1, 20, commands.BucketType.guild)
+    @utils.replica_reads
     async def dice_export_for(
         self,
         ctx: utils.THIASlashContext,
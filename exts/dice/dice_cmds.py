@@ -7,9 +7,7 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
-import asyncio
 import importlib
-from collections import defaultdict
 
 import d20
 import discord
@@ -21,6 +19,7 @@ import common.classes as classes
 import common.exports as exports
 import common.fuzzy as fuzzy
 import common.models as models
+import common.rolls as rolls
 import common.utils as utils
 
 from . import dice_common
@@ -32,12 +31,6 @@ class DiceCMDs(utils.Cog):
         self.bot = bot
         self.__cog_name__ = "Dice"
 
-        # i sure do love weird edge cases with race conditions!
-        # TODO: locks should be shared with dice_admin cmds to prevent race conditions
-        self.dice_creation_locks: defaultdict[str, asyncio.Lock] = defaultdict(
-            asyncio.Lock
-        )
-
     dice = ragwort.SlashCommandGroup(
         name="dice",
         description="Hosts public-facing dice commands.",
@@ -56,7 +49,7 @@ class DiceCMDs(utils.Cog):
         name="roll",
         description="Rolls a dice in d20 notation.",
     )
-    @ragwort.auto_defer(enabled=False)
+    @ragwort.auto_defer()
     async def dice_roll(
         self,
         ctx: utils.THIASlashContext,
@@ -64,6 +57,12 @@ class DiceCMDs(utils.Cog):
             "The dice roll to perform in d20 notation. 100 characters max.",
             max_length=100,
         ),
+        times: int = ragwort.Option(
+            "How many times to roll. Defaults to 1.",
+            min_value=1,
+            max_value=dice_common.MAX_ROLL_TIMES,
+            default=1,
+        ),
     ) -> None:
         visible = True
         if (
@@ -76,24 +75,19 @@ class DiceCMDs(utils.Cog):
 
             visible = config.dice.visible
 
-        await ctx.defer(ephemeral=not visible)
-
-        try:
-            result = dice_common.d20_roll(dice)
-        except d20.errors.RollSyntaxError as e:
-            raise utils.BadArgument(f"Invalid dice roll syntax.\n{e!s}") from None
-        except d20.errors.TooManyRolls:
-            raise utils.BadArgument("Too many dice rolls in the expression.") from None
-        except d20.errors.RollValueError:
-            raise utils.BadArgument("Invalid dice roll value.") from None
+        # rolling is usually quick, so the auto defer only kicks in if it stalls
+        # if it does, it needs to match the roll's visibility
+        ctx.defer_ephemeral = not visible
 
-        await ctx.respond(view=utils.make_view(result.result), ephemeral=not visible)
+        await dice_common.dice_roll_actual(
+            ctx, dice, times=times, ephemeral=not visible
+        )
 
     @dice.command(
         name="roll-registered",
         description="Rolls a previously registered dice.",
     )
-    @ragwort.auto_defer(enabled=False)
+    @ragwort.auto_defer()
     async def dice_roll_registered(
         self,
         ctx: utils.THIASlashContext,
@@ -102,6 +96,12 @@ class DiceCMDs(utils.Cog):
             input_type=utils.ReplaceSmartPuncConverter,
             max_length=100,
         ),
+        times: int = ragwort.Option(
+            "How many times to roll. Defaults to 1.",
+            min_value=1,
+            max_value=dice_common.MAX_ROLL_TIMES,
+            default=1,
+        ),
     ) -> None:
         visible = True
         guild_id = 0
@@ -116,7 +116,7 @@ class DiceCMDs(utils.Cog):
             visible = config.dice.visible
             guild_id = ctx.guild_id
 
-        await ctx.defer(ephemeral=not visible)
+        ctx.defer_ephemeral = not visible
 
         entry = await models.DiceEntry.get_or_none(
             guild_id=guild_id, user_id=ctx.author.id, name=name
@@ -124,16 +124,67 @@ class DiceCMDs(utils.Cog):
         if not entry:
             raise utils.BadArgument("No registered dice found with that name.")
 
-        try:
-            result = dice_common.d20_roll(entry.value)
-        except d20.errors.RollSyntaxError as e:
-            raise utils.BadArgument(f"Invalid dice roll syntax.\n{e!s}") from None
-        except d20.errors.TooManyRolls:
-            raise utils.BadArgument("Too many dice rolls in the expression.") from None
-        except d20.errors.RollValueError:
-            raise utils.BadArgument("Invalid dice roll value.") from None
+        await dice_common.dice_roll_actual(
+            ctx,
+            entry.value,
+            parsed=entry.parsed,
+            times=times,
+            ephemeral=not visible,
+        )
 
-        await ctx.respond(view=utils.make_view(result.result), ephemeral=not visible)
+    @dice.command(
+        name="stats",
+        description="Shows the odds of a dice roll in d20 notation.",
+    )
+    @ragwort.auto_defer(ephemeral=True)
+    async def dice_stats(
+        self,
+        ctx: utils.THIASlashContext,
+        dice: str = ragwort.Option(
+            "The dice roll to show the odds of in d20 notation. 100 characters max.",
+            max_length=100,
+        ),
+        target: int | None = ragwort.Option(
+            "A total to show the chance of rolling at least.", default=None
+        ),
+    ) -> None:
+        await dice_common.dice_stats_actual(
+            ctx, dice, title="Dice Stats", target=target
+        )
+
+    @dice.command(
+        name="stats-registered",
+        description="Shows the odds of a previously registered dice.",
+    )
+    @ragwort.auto_defer(ephemeral=True)
+    async def dice_stats_registered(
+        self,
+        ctx: utils.THIASlashContext,
+        name: str = ragwort.Option(
+            "The name of the dice to show the odds of.",
+            input_type=utils.ReplaceSmartPuncConverter,
+            max_length=100,
+        ),
+        target: int | None = ragwort.Option(
+            "A total to show the chance of rolling at least.", default=None
+        ),
+    ) -> None:
+        guild_id = 0
+        if (
+            ctx.interaction.authorizing_integration_owners.guild_id
+            and ctx.interaction.authorizing_integration_owners.guild_id == ctx.guild_id
+        ):
+            guild_id = ctx.guild_id
+
+        entry = await models.DiceEntry.get_or_none(
+            guild_id=guild_id, user_id=ctx.author.id, name=name
+        )
+        if not entry:
+            raise utils.BadArgument("No registered dice found with that name.")
+
+        await dice_common.dice_stats_actual(
+            ctx, entry.value, title=f"Dice Stats for {entry.name}", target=target
+        )
 
     @dice.command(
         name="register",
@@ -176,33 +227,22 @@ class DiceCMDs(utils.Cog):
                     " yourself."
                 )
 
-        async with self.dice_creation_locks[
-            f"{guild_id}-{ctx.author.id}-{name.lower()}"
-        ]:
-            if await models.DiceEntry.exists(
-                guild_id=guild_id, user_id=ctx.author.id, name__iexact=name
-            ):
-                raise utils.BadArgument("A dice with that name already exists.")
-
-            await models.GuildConfig.fetch_create(int(guild_id), {"dice": True})
-
-            try:
-                dice_common.d20_roll(dice)
-            except d20.errors.RollSyntaxError as e:
-                raise utils.BadArgument(f"Invalid dice roll syntax.\n{e!s}") from None
-            except d20.errors.TooManyRolls:
-                raise utils.BadArgument(
-                    "Too many dice rolls in the expression."
-                ) from None
-            except d20.errors.RollValueError:
-                raise utils.BadArgument("Invalid dice roll value.") from None
-
-            await models.DiceEntry.create(
-                guild_id=guild_id,
-                user_id=ctx.author.id,
-                name=name,
-                value=dice,
-            )
+        await models.GuildConfig.fetch_create(int(guild_id), {"dice": True})
+
+        try:
+            rolls.validate(dice)
+        except d20.errors.RollSyntaxError as e:
+            raise utils.BadArgument(f"Invalid dice roll syntax.\n{e!s}") from None
+        except d20.errors.TooManyRolls:
+            raise utils.BadArgument("Too many dice rolls in the expression.") from None
+        except d20.errors.RollValueError:
+            raise utils.BadArgument("Invalid dice roll value.") from None
+
+        # the unique index on the name decides if it already exists
+        if not await models.DiceEntry.insert_unique(
+            guild_id, ctx.author.id, [models.DiceEntry(name=name, value=dice)]
+        ):
+            raise utils.BadArgument("A dice with that name already exists.")
 
         await ctx.respond(
             view=utils.make_view(f"Registered dice {name}."), ephemeral=True
@@ -212,6 +252,7 @@ class DiceCMDs(utils.Cog):
         name="list",
         description="Lists your registered dice.",
     )
+    @utils.replica_reads
     async def dice_list(
         self,
         ctx: utils.THIASlashContext,
@@ -309,6 +350,7 @@ class DiceCMDs(utils.Cog):
         name="export", description="Exports all registered dice to a JSON file."
     )
     @commands.cooldown(1, 60, commands.BucketType.user)
+    @utils.replica_reads
     async def dice_export(
         self,
         ctx: utils.THIASlashContext,
@@ -356,6 +398,7 @@ class DiceCMDs(utils.Cog):
 
     @dice_remove.autocomplete("name")
     @dice_roll_registered.autocomplete("name")
+    @dice_stats_registered.autocomplete("name")
     async def dice_name_autocomplete(
         self,
         ctx: discord.AutocompleteContext,
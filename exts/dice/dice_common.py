@@ -7,21 +7,124 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
-import asyncio
-import io
-
-import aiohttp
+import asyncpg
 import d20
 import discord
-import orjson
 import pydantic
+import typing_extensions as typing
 from tortoise.transactions import in_transaction
 
+import common.classes as classes
+import common.dice_pool as dice_pool
+import common.dice_stats as dice_stats
 import common.exports as exports
 import common.models as models
+import common.rolls as rolls
 import common.utils as utils
 
-d20_roll = d20.Roller(d20.RollContext(100)).roll
+MAX_ROLL_TIMES: typing.Final[int] = 50
+ROLLS_PER_PAGE: typing.Final[int] = 10
+
+
+async def dice_roll_actual(
+    ctx: utils.THIASlashContext,
+    dice: str,
+    *,
+    parsed: d20.ast.Expression | None = None,
+    times: int = 1,
+    ephemeral: bool = False,
+) -> None:
+    # each roll shares a page with others when rolling multiple times
+    max_length = (
+        rolls.MAX_RESULT_LENGTH
+        if times == 1
+        else rolls.MAX_RESULT_LENGTH // ROLLS_PER_PAGE
+    )
+
+    try:
+        tree = parsed or rolls.parse(dice)
+        # small rolls aren't worth sending to another process, which only
+        # takes the expression as text
+        if ctx.bot.dice_pool and not rolls.is_trivial(tree, times):
+            results = await ctx.bot.dice_pool.roll(dice, times, max_length=max_length)
+        else:
+            results = rolls.roll_results(tree, times, max_length=max_length)
+    except d20.errors.RollSyntaxError as e:
+        raise utils.BadArgument(f"Invalid dice roll syntax.\n{e!s}") from None
+    except d20.errors.TooManyRolls:
+        raise utils.BadArgument("Too many dice rolls in the expression.") from None
+    except (rolls.RollLimitExceeded, dice_pool.PoolUnavailable) as e:
+        raise utils.BadArgument(str(e)) from None
+    except d20.errors.RollValueError:
+        raise utils.BadArgument("Invalid dice roll value.") from None
+
+    if times == 1:
+        await ctx.respond(view=utils.make_view(results[0][0]), ephemeral=ephemeral)
+        return
+
+    totals = [total for _, total in results]
+    summary = discord.ui.TextDisplay(
+        f"**Sum:** {sum(totals)} | **Average:** {sum(totals) / times:.2f} |"
+        f" **Highest:** {max(totals)} | **Lowest:** {min(totals)}"
+    )
+    entries = [f"**{i}.** {rendered}" for i, (rendered, _) in enumerate(results, 1)]
+
+    # every page gets the summary, so it's never hidden behind the buttons
+    pages = [
+        [
+            summary,
+            discord.ui.Separator(),
+            discord.ui.TextDisplay("\n".join(entries[x : x + ROLLS_PER_PAGE])),
+        ]
+        for x in range(0, times, ROLLS_PER_PAGE)
+    ]
+    pag = classes.ContainerPaginator(
+        *pages, title=f"Rolled {times} times", author_id=ctx.author.id
+    )
+    await ctx.respond(view=pag, ephemeral=ephemeral)
+
+
+async def dice_stats_actual(
+    ctx: utils.THIASlashContext,
+    dice: str,
+    *,
+    title: str,
+    target: int | None = None,
+    ephemeral: bool = True,
+) -> None:
+    try:
+        distribution = await dice_stats.calculate(dice)
+    except d20.errors.RollSyntaxError as e:
+        raise utils.BadArgument(f"Invalid dice roll syntax.\n{e!s}") from None
+    except d20.errors.TooManyRolls:
+        raise utils.BadArgument("Too many dice rolls in the expression.") from None
+    except d20.errors.RollValueError:
+        raise utils.BadArgument("Invalid dice roll value.") from None
+
+    str_builder = [
+        f"**Dice:** `{dice}`",
+        f"- Average: {distribution.mean:.2f}",
+        f"- Standard deviation: {distribution.std:.2f}",
+        f"- Range: {distribution.min} to {distribution.max}",
+        f"- Median: {distribution.percentile(50)}",
+        f"- Middle 90%: {distribution.percentile(5)} to {distribution.percentile(95)}",
+    ]
+    if target is not None:
+        str_builder.append(
+            f"- Chance of at least {target}: {distribution.at_least(target):.2%}"
+        )
+
+    if distribution.exact:
+        str_builder.append("-# These are exact.")
+    else:
+        str_builder.append(
+            f"-# These are estimated from {distribution.samples:,} simulated rolls."
+        )
+
+    await ctx.respond(
+        view=utils.make_view("\n".join(str_builder), title=title),
+        ephemeral=ephemeral,
+    )
 
 
 async def dice_export_actual(
@@ -42,29 +145,21 @@ async def dice_export_actual(
         guild_id = ctx.guild_id
         extra = " for this server"
 
-    entries = await models.DiceEntry.filter(guild_id=guild_id, user_id=user.id)
-    if not entries:
+    entries = models.DiceEntry.filter(guild_id=guild_id, user_id=user.id)
+    if not await entries.exists():
         raise utils.BadArgument(f"No registered dice{extra} found.")
 
-    entries_dict: list[exports.DiceEntryDict] = [
-        {
-            "name": entry.name,
-            "value": entry.value,
-        }
-        for entry in entries
-    ]
-    entries_json = orjson.dumps(
-        {"version": 1, "entries": entries_dict}, option=orjson.OPT_INDENT_2
-    )
-
-    # how would this happen? no clue
-    if len(entries_json) > 10000000:
+    try:
+        entries_io = await exports.write_json_export(
+            1, "entries", exports.paged_values(entries, "name", "value")
+        )
+    except exports.ExportTooLarge:
+        # how would this happen? no clue
         raise utils.CustomCheckFailure(
             "The file is too large to send. Please try again with fewer registered"
             " dice."
-        )
+        ) from None
 
-    entries_io = io.BytesIO(entries_json)
     entries_file = discord.File(
         entries_io,
         filename=(
@@ -99,26 +194,12 @@ async def dice_import_actual(
     if not user:
         user = ctx.author
 
-    if not json_file.content_type or not json_file.content_type.startswith(
-        "application/json"
-    ):
-        raise utils.BadArgument("The file must be a JSON file.")
-
-    async with aiohttp.ClientSession() as session:
-        async with session.get(json_file.url) as response:
-            if response.status != 200:
-                raise utils.BadArgument("Failed to fetch the file.")
-
-            try:
-                await response.content.readexactly(10485760 + 1)
-                raise utils.CustomCheckFailure(
-                    "This file is over 10 MiB, which is not supported by this bot."
-                )
-            except asyncio.IncompleteReadError as e:
-                items_json = e.partial
+    items_json = await utils.read_json_attachment(ctx.bot, json_file)
 
     try:
-        entries = exports.handle_dice_entry_data(items_json)
+        entries = await exports.validate_import(
+            exports.handle_dice_entry_data, items_json
+        )
     except pydantic.ValidationError as e:
         # let's remove the first line that tells what class the error is for
         error_str = "\n".join(str(e).splitlines()[1:])
@@ -163,33 +244,28 @@ async def dice_import_actual(
                     f" {utils.MAX_DICE_ENTRIES} dice entries for yourself."
                 )
 
-    async with in_transaction():
-        # TODO: this is flawed - how do we do case insensitive unique checks without doing multiple queries?
-        if await models.DiceEntry.exists(
-            guild_id=guild_id,
-            user_id=user.id,
-            name__in=[entry.name for entry in entries],
-        ):
-            if override:
-                await models.DiceEntry.filter(
-                    guild_id=guild_id,
-                    user_id=user.id,
-                    name__in=[entry.name for entry in entries],
-                ).delete()
-            else:
+    if len({entry.name.upper() for entry in entries}) != len(entries):
+        raise utils.BadArgument("One or more die in the file share the same name.")
+
+    to_create: list[models.DiceEntry] = [
+        models.DiceEntry(name=entry.name, value=entry.value) for entry in entries
+    ]
+
+    try:
+        async with in_transaction():
+            created_ids = await models.DiceEntry.insert_unique(
+                guild_id, user.id, to_create, overwrite=override
+            )
+            if len(created_ids) != len(to_create):
                 raise utils.BadArgument(
                     "One or more die in the file shares a name with an existing"
                     " registered die."
                 )
-
-        to_create: list[models.DiceEntry] = [
-            models.DiceEntry(
-                guild_id=guild_id, user_id=user.id, name=entry.name, value=entry.value
-            )
-            for entry in entries
-        ]
-
-        await models.DiceEntry.bulk_create(to_create)
+    except asyncpg.CardinalityViolationError:
+        # postgres and python don't always agree on what upper case is
+        raise utils.BadArgument(
+            "One or more die in the file share the same name."
+        ) from None
 
     await ctx.respond(
         view=utils.make_view(
@@ -9,11 +9,9 @@ file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 import asyncio
 import importlib
-import io
 
-import aiohttp
+import asyncpg
 import discord
-import orjson
 import pydantic
 import ragwort
 import typing_extensions as typing
@@ -175,6 +173,7 @@ class GachaManagement(utils.Cog):
     @manage.command(
         name="list-items", description="Lists all gacha items for this server."
     )
+    @utils.replica_reads
     async def gacha_view_items(
         self,
         ctx: utils.THIASlashContext,
@@ -278,34 +277,28 @@ class GachaManagement(utils.Cog):
         name="export-items", description="Exports all gacha items to a JSON file."
     )
     @commands.cooldown(1, 60, commands.BucketType.guild)
+    @utils.replica_reads
     async def gacha_export_items(
         self,
         ctx: utils.THIASlashContext,
     ) -> None:
-        items = await models.GachaItem.filter(guild_id=ctx.guild_id)
-        if not items:
+        items = models.GachaItem.filter(guild_id=ctx.guild_id)
+        if not await items.exists():
             raise utils.CustomCheckFailure("This server has no items to export.")
 
-        items_dict: list[exports.GachaItemDict] = [
-            {
-                "name": item.name,
-                "description": item.description,
-                "rarity": item.rarity.value,
-                "amount": item.amount,
-                "image": item.image,
-            }
-            for item in items
-        ]
-        items_json = orjson.dumps(
-            {"version": 2, "items": items_dict}, option=orjson.OPT_INDENT_2
-        )
-
-        if len(items_json) > 10000000:
+        try:
+            items_io = await exports.write_json_export(
+                2,
+                "items",
+                exports.paged_values(
+                    items, "name", "description", "rarity", "amount", "image"
+                ),
+            )
+        except exports.ExportTooLarge:
             raise utils.CustomCheckFailure(
                 "The file is too large to send. Please try again with fewer items."
-            )
+            ) from None
 
-        items_io = io.BytesIO(items_json)
         items_file = discord.File(
             items_io,
             filename=f"gacha_items_{ctx.guild_id}_{int(ctx.interaction.created_at.timestamp())}.json",
@@ -346,26 +339,12 @@ class GachaManagement(utils.Cog):
     ) -> None:
         override = _override == "yes"
 
-        if not json_file.content_type or not json_file.content_type.startswith(
-            "application/json"
-        ):
-            raise utils.BadArgument("The file must be a JSON file.")
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(json_file.url) as response:
-                if response.status != 200:
-                    raise utils.BadArgument("Failed to fetch the file.")
-
-                try:
-                    await response.content.readexactly(10485760 + 1)
-                    raise utils.CustomCheckFailure(
-                        "This file is over 10 MiB, which is not supported by this bot."
-                    )
-                except asyncio.IncompleteReadError as e:
-                    items_json = e.partial
+        items_json = await utils.read_json_attachment(self.bot, json_file)
 
         try:
-            items = exports.handle_gacha_item_data(items_json)
+            items = await exports.validate_import(
+                exports.handle_gacha_item_data, items_json
+            )
         except pydantic.ValidationError as e:
             # let's remove the first line that tells what class the error is for
             error_str = "\n".join(str(e).splitlines()[1:])
@@ -375,35 +354,39 @@ class GachaManagement(utils.Cog):
 
         await ctx.fetch_config({"gacha": True})
 
-        async with in_transaction():
-            # TODO: this is flawed - how do we do case insensitive unique checks without doing multiple queries?
-            if await models.GachaItem.exists(
-                guild_id=ctx.guild_id,
-                name__in=[item.name for item in items],
-            ):
-                if override:
-                    await models.GachaItem.filter(
-                        guild_id=ctx.guild_id,
-                        name__in=[item.name for item in items],
-                    ).delete()
-                else:
-                    raise utils.BadArgument(
-                        "One or more items in the file has a name with an item already"
-                        " in this server."
-                    )
+        if len({item.name.upper() for item in items}) != len(items):
+            raise utils.BadArgument(
+                "One or more items in the file share the same name."
+            )
 
-            to_create: list[models.GachaItem] = [
-                models.GachaItem(
-                    guild_id=ctx.guild_id,
-                    name=item.name,
-                    description=item.description,
-                    rarity=item.rarity,
-                    amount=item.amount,
-                    image=item.image,
+        to_create: list[models.GachaItem] = [
+            models.GachaItem(
+                name=item.name,
+                description=item.description,
+                rarity=item.rarity,
+                amount=item.amount,
+                image=item.image,
+            )
+            for item in items
+        ]
+
+        try:
+            async with in_transaction():
+                # overriding updates the existing items in place, so anything
+                # that refers to them is kept
+                created_ids = await models.GachaItem.insert_unique(
+                    ctx.guild_id, to_create, overwrite=override
                 )
-                for item in items
-            ]
-            await models.GachaItem.bulk_create(to_create)
+                if len(created_ids) != len(to_create):
+                    raise utils.BadArgument(
+                        "One or more items in the file has a name with an item"
+                        " already in this server."
+                    )
+        except asyncpg.CardinalityViolationError:
+            # postgres and python don't always agree on what upper case is
+            raise utils.BadArgument(
+                "One or more items in the file share the same name."
+            ) from None
 
         await ctx.respond(
             view=utils.make_view(
@@ -411,6 +394,54 @@ class GachaManagement(utils.Cog):
             ),
         )
 
+    @manage.command(
+        name="clone-items",
+        description="Copies all gacha items from another server into this one.",
+    )
+    @commands.cooldown(1, 60, commands.BucketType.guild)
+    async def gacha_clone_items(
+        self,
+        ctx: utils.THIASlashContext,
+        server_id: str = ragwort.Option(
+            "The ID of the server to copy items from. You must be able to manage it."
+        ),
+        _override: str = ragwort.Option(
+            "Should pre-existing items with the same name be overridden? If not,"
+            " they are skipped.",
+            name="override",
+            choices=[
+                discord.OptionChoice("yes", "yes"),
+                discord.OptionChoice("no", "no"),
+            ],
+            default="no",
+        ),
+    ) -> None:
+        override = _override == "yes"
+        source_guild = await utils.source_guild_check(ctx, server_id)
+
+        await ctx.fetch_config({"gacha": True})
+
+        # copied entirely within the database, so nothing is loaded here
+        total, cloned = await models.GachaItem.clone_guild(
+            source_guild.id, ctx.guild_id, overwrite=override
+        )
+        if not total:
+            raise utils.CustomCheckFailure(
+                f"There are no items in {source_guild.name} to copy."
+            )
+
+        skipped = (
+            f"\nSkipped {total - cloned} items with names already in use."
+            if total != cloned
+            else ""
+        )
+        await ctx.respond(
+            view=utils.make_view(
+                f"Copied {cloned} items from {source_guild.name}.{skipped}",
+                title="Gacha Items Clone",
+            ),
+        )
+
     @manage.command(
         name="add-currency",
         description="Adds an amount of currency to a user.",
@@ -758,6 +789,7 @@ class GachaManagement(utils.Cog):
         name="list-currency-amounts",
         description="Lists the currency amounts of all users.",
     )
+    @utils.replica_reads
     async def gacha_view_all_currencies(self, ctx: utils.THIASlashContext) -> None:
         config = await ctx.fetch_config({"names": True})
         if typing.TYPE_CHECKING:
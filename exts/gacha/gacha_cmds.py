@@ -141,7 +141,7 @@ async def gacha_roll_actual(
         async with in_transaction():
             if item.amount != -1:
                 item.amount -= 1
-                await item.save(force_update=True)
+                await item.to_model().save(update_fields=("amount",))
 
             await models.GachaPlayer.filter(id=player.id).update(
                 currency_amount=F("currency_amount") - config.gacha.currency_cost
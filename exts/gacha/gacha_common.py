@@ -7,19 +7,12 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
-import asyncio
-import collections
-
 import discord
 
 import common.classes as classes
 import common.models as models
 import common.utils as utils
 
-_item_creation_locks: collections.defaultdict[str, asyncio.Lock] = (
-    collections.defaultdict(asyncio.Lock)
-)
-
 __all__ = ("CreateGachaItemModal", "EditGachaItemModal", "gacha_item_button")
 
 
@@ -104,55 +97,56 @@ class CreateGachaItemModal(discord.ui.DesignerModal):
         else:
             str_rarity: str = responses["item_rarity"]
 
-        async with _item_creation_locks[f"{inter.guild_id}-{name.lower()}"]:
-            if await models.GachaItem.exists(
-                guild_id=inter.guild_id, name__iexact=name
-            ):
-                raise utils.BadArgument("An item with that name already exists.")
-
-            try:
-                rarity = models.Rarity[str_rarity.upper()]
-            except (KeyError, ValueError):
-                raise utils.BadArgument(
-                    "Invalid rarity. Rarity must be one of: common, uncommon, rare,"
-                    " epic, legendary."
-                ) from None
-
-            try:
-                amount = int(str_amount)
-                if amount < -1:
-                    raise ValueError
-            except ValueError:
-                raise utils.BadArgument("Quantity must be a positive number.") from None
-
-            if amount > 999:
-                raise utils.BadArgument(
-                    "This amount is too high. Please set an amount at or lower than"
-                    " 999, or leave the value empty to have an unlimited amount."
-                )
-
-            if image and not utils.HTTP_URL_REGEX.fullmatch(image):
-                raise utils.BadArgument("The image given must be a valid URL.")
+        try:
+            rarity = models.Rarity[str_rarity.upper()]
+        except (KeyError, ValueError):
+            raise utils.BadArgument(
+                "Invalid rarity. Rarity must be one of: common, uncommon, rare,"
+                " epic, legendary."
+            ) from None
 
-            # some configs needs to exist, lets make sure they do
-            await models.GuildConfig.fetch_create(inter.guild_id, {"gacha": True})
+        try:
+            amount = int(str_amount)
+            if amount < -1:
+                raise ValueError
+        except ValueError:
+            raise utils.BadArgument("Quantity must be a positive number.") from None
 
-            created_item = await models.GachaItem.create(
-                guild_id=inter.guild_id,
-                name=name,
-                description=description,
-                rarity=rarity,
-                amount=amount,
-                image=image,
+        if amount > 999:
+            raise utils.BadArgument(
+                "This amount is too high. Please set an amount at or lower than"
+                " 999, or leave the value empty to have an unlimited amount."
             )
 
+        if image and not utils.HTTP_URL_REGEX.fullmatch(image):
+            raise utils.BadArgument("The image given must be a valid URL.")
+
+        # some configs needs to exist, lets make sure they do
+        await models.GuildConfig.fetch_create(inter.guild_id, {"gacha": True})
+
+        # the unique index on the name decides if it already exists
+        created_ids = await models.GachaItem.insert_unique(
+            inter.guild_id,
+            [
+                models.GachaItem(
+                    name=name,
+                    description=description,
+                    rarity=rarity,
+                    amount=amount,
+                    image=image,
+                )
+            ],
+        )
+        if not created_ids:
+            raise utils.BadArgument("An item with that name already exists.")
+
         container = discord.ui.Container(
             discord.ui.Section(
                 discord.ui.TextDisplay(f"Added item `{name}` to the gacha."),
                 accessory=discord.ui.Button(
                     style=discord.ButtonStyle.secondary,
                     label="View Item",
-                    custom_id=f"gacha-item-{created_item.id}-admin",
+                    custom_id=f"gacha-item-{created_ids[0]}-admin",
                 ),
             ),
             color=inter.client.color,
@@ -11,8 +11,11 @@ import importlib
 
 import discord
 import ragwort
+from discord.ext import commands
 
+import common.exports as exports
 import common.models as models
+import common.snapshots as snapshots
 import common.utils as utils
 
 
@@ -168,6 +171,96 @@ class ConfigCMDs(utils.Cog):
 
         await ctx.send_modal(ClearAllDataModal())
 
+    @config.command(
+        name="snapshot",
+        description="Exports all bot data for this server into one file.",
+    )
+    @commands.cooldown(1, 60, commands.BucketType.guild)
+    @utils.replica_reads
+    async def snapshot(self, ctx: utils.THIASlashContext) -> None:
+        try:
+            snapshot_io = await snapshots.write_snapshot(ctx.guild_id)
+        except exports.ExportTooLarge:
+            raise utils.CustomCheckFailure(
+                "This server's data is too large to send as a snapshot."
+            ) from None
+
+        snapshot_file = discord.File(
+            snapshot_io,
+            filename=f"snapshot_{ctx.guild_id}_{int(ctx.interaction.created_at.timestamp())}.zip",
+        )
+
+        container = utils.make_container(
+            "Exported all data for this server. Use `/config restore-snapshot` with"
+            " this file to restore it.",
+            title="Server Snapshot",
+        )
+        container.add_separator(divider=False)
+        container.add_file(url=f"attachment://{snapshot_file.filename}")
+
+        try:
+            await ctx.respond(
+                view=utils.quick_view(container),
+                file=snapshot_file,
+                ephemeral=True,
+            )
+        finally:
+            snapshot_io.close()
+
+    @config.command(
+        name="restore-snapshot",
+        description=(
+            "Replaces all bot data for this server with a snapshot. Use with caution!"
+        ),
+    )
+    @commands.cooldown(1, 60, commands.BucketType.guild)
+    async def restore_snapshot(
+        self,
+        ctx: utils.THIASlashContext,
+        snapshot_file: discord.Attachment = ragwort.Option(
+            "The snapshot file to restore.", name="snapshot"
+        ),
+        confirm: bool = ragwort.Option(
+            "Actually restore? Set this to true if you're sure.", default=False
+        ),
+    ) -> None:
+        if not confirm:
+            raise utils.BadArgument(
+                "Confirm option not set to true. Please set the option `confirm` to"
+                " true to continue."
+            )
+
+        data = await utils.read_attachment(self.bot, snapshot_file)
+
+        # data for channels outside of this server is left out
+        channel_ids = [channel.id for channel in ctx.guild.channels]
+        channel_ids.extend(thread.id for thread in ctx.guild.threads)
+
+        try:
+            restored = await snapshots.restore_snapshot(
+                ctx.guild_id, data, channel_ids=channel_ids
+            )
+        except snapshots.SnapshotError as e:
+            raise utils.BadArgument(str(e)) from None
+
+        bullet_config = await models.BulletConfig.get_or_none(guild_id=ctx.guild_id)
+        if (
+            bullet_config
+            and bullet_config.bullets_enabled
+            and bullet_config.investigation_type
+            != models.InvestigationType.COMMAND_ONLY
+        ):
+            self.bot.msg_enabled_bullets_guilds.add(int(ctx.guild_id))
+        else:
+            self.bot.msg_enabled_bullets_guilds.discard(int(ctx.guild_id))
+
+        await ctx.respond(
+            view=utils.make_view(
+                f"Restored {sum(restored.values())} rows of data for this server.",
+                title="Snapshot Restored",
+            )
+        )
+
     @config.command(
         name="help",
         description="Tells you how to set up this bot.",
@@ -30,8 +30,6 @@ class VoteHandler:
 
 
 class Voting(utils.Cog):
-    session: aiohttp.ClientSession
-
     def __init__(self, bot: utils.THIABase) -> None:
         self.bot = bot
         self.__cog_name__ = "Voting"
@@ -57,17 +55,9 @@ class Voting(utils.Cog):
             raise ValueError("No voting handlers were configured.")
 
         self.autopost_guild_count.start()
-        self.bot.create_task(self.establish_session())
 
     def cog_unload(self) -> None:
         self.autopost_guild_count.cancel()
-        self.bot.create_task(self.close_session())
-
-    async def establish_session(self) -> None:
-        self.session = aiohttp.ClientSession()
-
-    async def close_session(self) -> None:
-        await self.session.close()
 
     @tasks.loop(minutes=30)
     async def autopost_guild_count(self) -> None:
@@ -75,7 +65,7 @@ class Voting(utils.Cog):
         shard_count = len(self.bot.shards)
 
         for handler in self.handlers:
-            async with self.session.post(
+            async with self.bot.http_client.session.post(
                 f"{handler.base_url}{handler.data_url.format(bot_id=self.bot.user.id)}",
                 json=handler.data_callback(server_count, shard_count),
                 headers=handler.headers,
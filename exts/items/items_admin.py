@@ -7,14 +7,11 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
-import asyncio
 import collections
 import importlib
-import io
 
-import aiohttp
+import asyncpg
 import discord
-import orjson
 import pydantic
 import ragwort
 import typing_extensions as typing
@@ -27,10 +24,6 @@ import common.fuzzy as fuzzy
 import common.models as models
 import common.utils as utils
 
-_item_creation_locks: collections.defaultdict[str, asyncio.Lock] = (
-    collections.defaultdict(asyncio.Lock)
-)
-
 
 class CreateItemModal(discord.ui.DesignerModal):
     def __init__(self) -> None:
@@ -84,40 +77,41 @@ class CreateItemModal(discord.ui.DesignerModal):
         responses = utils.parse_modal_responses(self)
         name = utils.replace_smart_punc(responses["item_name"])
 
-        async with _item_creation_locks[f"{inter.guild_id}-{name.lower()}"]:
-            if await models.ItemsSystemItem.exists(
-                guild_id=int(inter.guild_id), name__iexact=name
-            ):
-                raise utils.BadArgument(
-                    f"An item named `{discord.utils.escape_markdown(name)}` already"
-                    " exists in this server."
-                )
+        try:
+            if isinstance(responses["item_takeable"], list):
+                takeable = utils.convert_to_bool(responses["item_takeable"][0])
+            else:
+                takeable = utils.convert_to_bool(responses["item_takeable"])
+        except utils.BadArgument:
+            raise utils.BadArgument(
+                "Invalid value for if the item is takeable. Giving a simple"
+                " 'yes' or 'no' will work."
+            ) from None
 
-            try:
-                if isinstance(responses["item_takeable"], list):
-                    takeable = utils.convert_to_bool(responses["item_takeable"][0])
-                else:
-                    takeable = utils.convert_to_bool(responses["item_takeable"])
-            except utils.BadArgument:
-                raise utils.BadArgument(
-                    "Invalid value for if the item is takeable. Giving a simple"
-                    " 'yes' or 'no' will work."
-                ) from None
-
-            image: str | None = (
-                responses["item_image"].strip() if responses.get("item_image") else None
-            )
-            if image and not utils.HTTP_URL_REGEX.fullmatch(image):
-                raise utils.BadArgument("The image given must be a valid URL.")
+        image: str | None = (
+            responses["item_image"].strip() if responses.get("item_image") else None
+        )
+        if image and not utils.HTTP_URL_REGEX.fullmatch(image):
+            raise utils.BadArgument("The image given must be a valid URL.")
 
-            await models.GuildConfig.fetch_create(inter.guild_id, {"items": True})
+        await models.GuildConfig.fetch_create(inter.guild_id, {"items": True})
 
-            await models.ItemsSystemItem.create(
-                name=name,
-                description=responses["item_description"],
-                image=image,
-                takeable=takeable,
-                guild_id=inter.guild_id,
+        # the unique index on the name decides if it already exists
+        created_ids = await models.ItemsSystemItem.insert_unique(
+            inter.guild_id,
+            [
+                models.ItemsSystemItem(
+                    name=name,
+                    description=responses["item_description"],
+                    image=image,
+                    takeable=takeable,
+                )
+            ],
+        )
+        if not created_ids:
+            raise utils.BadArgument(
+                f"An item named `{discord.utils.escape_markdown(name)}` already"
+                " exists in this server."
             )
 
         await inter.respond(
@@ -256,11 +250,6 @@ class ItemsManagement(utils.Cog):
 
         self.bot.add_view(create_item_button)
 
-        # i sure do love weird edge cases with race conditions!
-        self.item_creation_locks: collections.defaultdict[str, asyncio.Lock] = (
-            collections.defaultdict(asyncio.Lock)
-        )
-
     config = ragwort.SlashCommandGroup(
         name="items-config",
         description="Handles configuration of items.",
@@ -432,6 +421,7 @@ class ItemsManagement(utils.Cog):
         name="list-items",
         description="Lists all items in the server.",
     )
+    @utils.replica_reads
     async def list_items(
         self,
         ctx: utils.THIASlashContext,
@@ -475,6 +465,7 @@ class ItemsManagement(utils.Cog):
         name="list-placed-items",
         description="Lists all items currently placed in channels.",
     )
+    @utils.replica_reads
     async def list_placed_items(self, ctx: utils.THIASlashContext) -> None:
         placed_items = await models.ItemRelation.filter(
             guild_id=ctx.guild_id,
@@ -515,6 +506,7 @@ class ItemsManagement(utils.Cog):
         name="list-items-in-channel",
         description="Lists all items in a channel.",
     )
+    @utils.replica_reads
     async def list_items_in_channel(
         self,
         ctx: utils.THIASlashContext,
@@ -841,33 +833,26 @@ class ItemsManagement(utils.Cog):
         description="Exports all items in this server as a JSON file.",
     )
     @commands.cooldown(1, 60, commands.BucketType.guild)
+    @utils.replica_reads
     async def export_items(
         self,
         ctx: utils.THIASlashContext,
     ) -> None:
-        items = await models.ItemsSystemItem.filter(guild_id=ctx.guild_id)
-        if not items:
+        items = models.ItemsSystemItem.filter(guild_id=ctx.guild_id)
+        if not await items.exists():
             raise utils.CustomCheckFailure("This server has no items to export.")
 
-        items_dict: list[exports.ItemsSystemItemDict] = [
-            {
-                "name": item.name,
-                "description": item.description,
-                "takeable": item.takeable,
-                "image": item.image,
-            }
-            for item in items
-        ]
-        items_json = orjson.dumps(
-            {"version": 1, "items": items_dict}, option=orjson.OPT_INDENT_2
-        )
-
-        if len(items_json) > 10000000:
+        try:
+            items_io = await exports.write_json_export(
+                1,
+                "items",
+                exports.paged_values(items, "name", "description", "takeable", "image"),
+            )
+        except exports.ExportTooLarge:
             raise utils.CustomCheckFailure(
                 "The file is too large to send. Please try again with fewer items."
-            )
+            ) from None
 
-        items_io = io.BytesIO(items_json)
         items_file = discord.File(
             items_io,
             filename=f"items_{ctx.guild_id}_{int(ctx.interaction.created_at.timestamp())}.json",
@@ -906,26 +891,12 @@ class ItemsManagement(utils.Cog):
     ) -> None:
         override = _override == "yes"
 
-        if not json_file.content_type or not json_file.content_type.startswith(
-            "application/json"
-        ):
-            raise utils.BadArgument("The file must be a JSON file.")
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(json_file.url) as response:
-                if response.status != 200:
-                    raise utils.BadArgument("Failed to fetch the file.")
-
-                try:
-                    await response.content.readexactly(10485760 + 1)
-                    raise utils.CustomCheckFailure(
-                        "This file is over 10 MiB, which is not supported by this bot."
-                    )
-                except asyncio.IncompleteReadError as e:
-                    items_json = e.partial
+        items_json = await utils.read_json_attachment(self.bot, json_file)
 
         try:
-            items = exports.handle_items_system_item_data(items_json)
+            items = await exports.validate_import(
+                exports.handle_items_system_item_data, items_json
+            )
         except pydantic.ValidationError as e:
             # let's remove the first line that tells what class the error is for
             error_str = "\n".join(str(e).splitlines()[1:])
@@ -935,34 +906,38 @@ class ItemsManagement(utils.Cog):
 
         await ctx.fetch_config({"items": True})
 
-        async with in_transaction():
-            # TODO: this is flawed - how do we do case insensitive unique checks without doing multiple queries?
-            if await models.ItemsSystemItem.exists(
-                guild_id=ctx.guild_id,
-                name__in=[item.name for item in items],
-            ):
-                if override:
-                    await models.ItemsSystemItem.filter(
-                        guild_id=ctx.guild_id,
-                        name__in=[item.name for item in items],
-                    ).delete()
-                else:
-                    raise utils.BadArgument(
-                        "One or more items in the file has a name with an item already"
-                        " in this server."
-                    )
+        if len({item.name.upper() for item in items}) != len(items):
+            raise utils.BadArgument(
+                "One or more items in the file share the same name."
+            )
 
-            to_create: list[models.ItemsSystemItem] = [
-                models.ItemsSystemItem(
-                    guild_id=ctx.guild_id,
-                    name=item.name,
-                    description=item.description,
-                    takeable=item.takeable,
-                    image=item.image,
+        to_create: list[models.ItemsSystemItem] = [
+            models.ItemsSystemItem(
+                name=item.name,
+                description=item.description,
+                takeable=item.takeable,
+                image=item.image,
+            )
+            for item in items
+        ]
+
+        try:
+            async with in_transaction():
+                # overriding updates the existing items in place, so anything
+                # that refers to them is kept
+                created_ids = await models.ItemsSystemItem.insert_unique(
+                    ctx.guild_id, to_create, overwrite=override
                 )
-                for item in items
-            ]
-            await models.ItemsSystemItem.bulk_create(to_create)
+                if len(created_ids) != len(to_create):
+                    raise utils.BadArgument(
+                        "One or more items in the file has a name with an item"
+                        " already in this server."
+                    )
+        except asyncpg.CardinalityViolationError:
+            # postgres and python don't always agree on what upper case is
+            raise utils.BadArgument(
+                "One or more items in the file share the same name."
+            ) from None
 
         await ctx.respond(
             view=utils.make_view(
@@ -970,6 +945,54 @@ class ItemsManagement(utils.Cog):
             ),
         )
 
+    @manage.command(
+        name="clone-items",
+        description="Copies all items from another server into this one.",
+    )
+    @commands.cooldown(1, 60, commands.BucketType.guild)
+    async def clone_items(
+        self,
+        ctx: utils.THIASlashContext,
+        server_id: str = ragwort.Option(
+            "The ID of the server to copy items from. You must be able to manage it."
+        ),
+        _override: str = ragwort.Option(
+            "Should pre-existing items with the same name be overridden? If not,"
+            " they are skipped.",
+            name="override",
+            choices=[
+                discord.OptionChoice("yes", "yes"),
+                discord.OptionChoice("no", "no"),
+            ],
+            default="no",
+        ),
+    ) -> None:
+        override = _override == "yes"
+        source_guild = await utils.source_guild_check(ctx, server_id)
+
+        await ctx.fetch_config({"items": True})
+
+        # copied entirely within the database, so nothing is loaded here
+        total, cloned = await models.ItemsSystemItem.clone_guild(
+            source_guild.id, ctx.guild_id, overwrite=override
+        )
+        if not total:
+            raise utils.CustomCheckFailure(
+                f"There are no items in {source_guild.name} to copy."
+            )
+
+        skipped = (
+            f"\nSkipped {total - cloned} items with names already in use."
+            if total != cloned
+            else ""
+        )
+        await ctx.respond(
+            view=utils.make_view(
+                f"Copied {cloned} items from {source_guild.name}.{skipped}",
+                title="Items Clone",
+            ),
+        )
+
     @edit_item.autocomplete("name")
     @place_item_in_channel.autocomplete("name")
     @view_item.autocomplete("name")
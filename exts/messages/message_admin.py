@@ -369,6 +369,7 @@ class MessageManagement(utils.Cog):
     @manage.command(
         name="list-links", description="Lists all messaging links for this server."
     )
+    @utils.replica_reads
     async def message_view_links(self, ctx: utils.THIASlashContext) -> None:
         config = await ctx.fetch_config({"messages": True})
         if typing.TYPE_CHECKING:
@@ -13,13 +13,21 @@ import importlib
 import io
 import platform
 import textwrap
+import time
 import traceback
+import tracemalloc
 
 import discord
 import typing_extensions as typing
 from discord.ext import commands
 
+import common.caches as caches
 import common.classes as classes
+import common.errors as errors
+import common.loop_monitor as loop_monitor
+import common.profiler as profiler
+import common.statements as statements
+import common.tracing as tracing
 import common.utils as utils
 
 
@@ -78,6 +86,7 @@ class OwnerCMDs(utils.Cog):
         super().__init__(bot)
 
         self.__cog_name__ = "Owner"
+        self.profile_stop: asyncio.Event | None = None
 
     @commands.group(aliases=["jsk"], invoke_without_command=True)
     async def debug(self, ctx: utils.THIABridgeExtContext) -> None:
@@ -240,6 +249,288 @@ class OwnerCMDs(utils.Cog):
         )
         return await ctx.message.reply(view=paginator)
 
+    @debug.command(aliases=["channel-cache", "channel_cache"])
+    async def getch(self, ctx: utils.THIABridgeExtContext) -> None:
+        """Shows statistics for the channel fetching cache."""
+        stats = caches.channel_cache.stats
+
+        e = debug_embed("Channel Cache")
+        e.add_field(name="Lookups", value=str(stats.lookups))
+        e.add_field(name="Hit Ratio", value=f"{stats.hit_ratio:.2%}")
+        e.add_field(name="Gateway Hits", value=str(stats.gateway_hits))
+        e.add_field(name="Fetched Hits", value=str(stats.fetched_hits))
+        e.add_field(name="Negative Hits", value=str(stats.negative_hits))
+        e.add_field(name="Coalesced", value=str(stats.coalesced))
+        e.add_field(name="HTTP Fetches", value=str(stats.http_fetches))
+        e.add_field(name="HTTP Failures", value=str(stats.http_failures))
+        e.add_field(name="Warmups", value=str(stats.warmups))
+        e.add_field(name="Warmup Requests", value=str(stats.warmup_requests))
+
+        await ctx.reply(embeds=[e])
+
+    @debug.command(aliases=["latencies"])
+    async def latency(self, ctx: utils.THIABridgeExtContext) -> None:
+        """Shows how long application commands take to respond."""
+        summary = self.bot.command_latencies.summary()
+        if not summary:
+            await ctx.reply("No commands have been run yet.")
+            return
+
+        str_builder = [
+            f"{name}: n={data['count']} deferred={data['deferred']}"
+            f" p50={data['p50'] * 1000:.0f}ms p90={data['p90'] * 1000:.0f}ms"
+            f" p99={data['p99'] * 1000:.0f}ms"
+            for name, data in sorted(
+                summary.items(), key=lambda x: x[1]["count"], reverse=True
+            )
+        ]
+
+        paginator = classes.ContainerPaginator.create_from_list(
+            str_builder,
+            title="Command Latencies",
+            author_id=ctx.author.id,
+        )
+        await ctx.message.reply(view=paginator)
+
+    @debug.command(aliases=["statements"])
+    async def sql(self, ctx: utils.THIABridgeExtContext) -> None:
+        """Shows timing statistics for the registered SQL statements."""
+        str_builder = [
+            f"{name}: calls={stats.calls} rows={stats.rows}"
+            f" avg={stats.avg_time * 1000:.2f}ms max={stats.max_time * 1000:.2f}ms"
+            for name, stats in sorted(
+                statements.registry.stats().items(),
+                key=lambda x: x[1].total_time,
+                reverse=True,
+            )
+        ]
+
+        paginator = classes.ContainerPaginator.create_from_list(
+            str_builder,
+            title="SQL Statements",
+            author_id=ctx.author.id,
+        )
+        await ctx.message.reply(view=paginator)
+
+    @debug.command(aliases=["query-trace", "query_trace"])
+    async def queries(
+        self, ctx: utils.THIABridgeExtContext, flagged: bool = False
+    ) -> None:
+        """
+        Shows how many queries each command makes, or the most recent
+        invocations that went over budget if flagged is true.
+        """
+        if flagged:
+            str_builder = [
+                f"{entry['label']}: {', '.join(entry['reasons'])}"
+                f" queries={entry['queries']} time={entry['query_time_ms']}ms"
+                + "".join(
+                    f"\n- {dup['count']}x `{dup['query'][:100]}`"
+                    for dup in entry["duplicates"]
+                )
+                for entry in reversed(tracing.tracer.flagged)
+            ]
+            title = "Flagged Invocations"
+        else:
+            str_builder = [
+                f"{label}: n={stats.invocations} avg={stats.avg_queries:.1f}"
+                f" max={stats.max_queries} avg_time={stats.avg_time * 1000:.2f}ms"
+                f" flagged={stats.flagged}"
+                for label, stats in sorted(
+                    tracing.tracer.labels.items(),
+                    key=lambda x: x[1].avg_queries,
+                    reverse=True,
+                )
+            ]
+            title = "Queries Per Invocation"
+
+        if not str_builder:
+            await ctx.reply("Nothing has been traced yet.")
+            return
+
+        paginator = classes.ContainerPaginator.create_from_list(
+            str_builder,
+            title=title,
+            author_id=ctx.author.id,
+        )
+        await ctx.message.reply(view=paginator)
+
+    @debug.command(name="errors", aliases=["error-digest", "error_digest"])
+    async def error_summary(self, ctx: utils.THIABridgeExtContext) -> None:
+        """Shows the errors that have happened since the last error digest."""
+        reporter = errors.reporter
+
+        str_builder = [
+            f"`{summary.count}x` ({summary.reported} reported)"
+            f" {discord.utils.escape_markdown(utils.short_string(summary.description, 200))}\nat"
+            f" `{summary.location}`, last"
+            f" {discord.utils.format_dt(summary.last_seen, 'R')}"
+            for summary in sorted(
+                reporter.summaries.values(), key=lambda s: s.count, reverse=True
+            )
+        ]
+        if not str_builder:
+            await ctx.reply("No errors have happened since the last digest.")
+            return
+
+        paginator = classes.ContainerPaginator.create_from_list(
+            str_builder,
+            title=(
+                f"Errors ({reporter.total} total, {reporter.suppressed} suppressed,"
+                f" {reporter.dropped} dropped)"
+            ),
+            author_id=ctx.author.id,
+        )
+        await ctx.message.reply(view=paginator)
+
+    @debug.command(aliases=["loop-lag", "loop_lag", "lag"])
+    async def loop(self, ctx: utils.THIABridgeExtContext, stalls: bool = False) -> None:
+        """
+        Shows how late the event loop has been to run tasks, or the most
+        recent times a callback blocked it if stalls is true.
+        """
+        monitor = loop_monitor.monitor
+
+        if stalls:
+            str_builder = [
+                f"{discord.utils.format_dt(stall.started, 'T')}"
+                f" {stall.duration * 1000:.0f}ms at `{stall.location}`"
+                + (
+                    f"\n```py\n{''.join(traceback.format_list(stall.stack[-6:]))}```"
+                    if stall.stack
+                    else ""
+                )
+                for stall in reversed(monitor.stalls)
+            ]
+            if not str_builder:
+                await ctx.reply("No stalls have been caught yet.")
+                return
+
+            paginator = classes.ContainerPaginator.create_from_list(
+                str_builder,
+                title="Event Loop Stalls",
+                author_id=ctx.author.id,
+            )
+            await ctx.message.reply(view=paginator)
+            return
+
+        summary = monitor.percentiles()
+        if not summary:
+            await ctx.reply(
+                "The loop monitor is running, but has no samples yet."
+                if monitor.running
+                else "The loop monitor is not running."
+            )
+            return
+
+        e = debug_embed("Event Loop")
+        e.add_field(name="Samples", value=str(summary["count"]))
+        e.add_field(name="p50 Lag", value=f"{summary['p50'] * 1000:.2f}ms")
+        e.add_field(name="p90 Lag", value=f"{summary['p90'] * 1000:.2f}ms")
+        e.add_field(name="p99 Lag", value=f"{summary['p99'] * 1000:.2f}ms")
+        e.add_field(name="Max Lag", value=f"{summary['max'] * 1000:.2f}ms")
+        e.add_field(name="Stalls", value=str(monitor.total_stalls))
+        e.add_field(name="Threshold", value=f"{monitor.threshold * 1000:.0f}ms")
+
+        await ctx.reply(embeds=[e])
+
+    @debug.group(aliases=["profiler"], invoke_without_command=True)
+    async def profile(
+        self, ctx: utils.THIABridgeExtContext, seconds: float = 30
+    ) -> None:
+        """
+        Samples where the event loop spends its time for the given amount
+        of seconds, then sends the results as a collapsed stack file.
+        """
+        sampler = profiler.profiler
+        if sampler.running:
+            await ctx.reply("The profiler is already running.")
+            return
+
+        self.profile_stop = asyncio.Event()
+        sampler.start()
+        await ctx.reply(f"Profiling for {seconds:g} seconds...")
+
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self.profile_stop.wait(), seconds)
+
+        # joining the sampling thread can take a moment
+        await asyncio.to_thread(sampler.stop)
+        collapsed = await asyncio.to_thread(sampler.collapsed)
+
+        if not sampler.samples:
+            await ctx.reply("No samples were collected.")
+            return
+
+        top = "\n".join(
+            f"{count / sampler.samples:>6.1%} {utils.short_string(label, 90)}"
+            for label, count in sampler.top_functions()
+        )
+        await ctx.reply(
+            f"Collected {sampler.samples} samples over {sampler.duration:.1f}"
+            f" seconds.\n```\n{top}\n```",
+            file=discord.File(
+                io.BytesIO(collapsed.encode()), filename="profile.collapsed.txt"
+            ),
+        )
+
+    @profile.command(name="stop")
+    async def profile_stop_cmd(self, ctx: utils.THIABridgeExtContext) -> None:
+        """Stops the profiler early."""
+        if not profiler.profiler.running or self.profile_stop is None:
+            await ctx.reply("The profiler is not running.")
+            return
+
+        self.profile_stop.set()
+        await ctx.message.add_reaction("✅")
+
+    @debug.group(aliases=["tracemalloc", "mem"], invoke_without_command=True)
+    async def memory(self, ctx: utils.THIABridgeExtContext) -> None:
+        """
+        Shows the biggest changes in memory allocations since this was last run,
+        starting tracemalloc if it isn't running.
+        """
+        tracker = profiler.memory_tracker
+        if not tracker.running:
+            await asyncio.to_thread(tracker.start)
+            await ctx.reply(
+                "Started tracking memory allocations. Run this again later to see"
+                " what changed."
+            )
+            return
+
+        since = time.monotonic() - tracker.baseline_time
+        stats = await asyncio.to_thread(tracker.diff)
+        current, peak = tracemalloc.get_traced_memory()
+
+        str_builder = [
+            f"Traced: {current / 1024**2:.1f} MiB (peak {peak / 1024**2:.1f} MiB)",
+            f"Changes over the last {since:.0f} seconds:",
+        ]
+        str_builder.extend(
+            f"{stat.size_diff / 1024:+.1f} KiB ({stat.count_diff:+} blocks)"
+            f" `{profiler.short_filename(stat.traceback[0].filename)}:"
+            f"{stat.traceback[0].lineno}`"
+            for stat in stats
+        )
+
+        paginator = classes.ContainerPaginator.create_from_list(
+            str_builder,
+            title="Memory Allocations",
+            author_id=ctx.author.id,
+        )
+        await ctx.message.reply(view=paginator)
+
+    @memory.command(name="stop")
+    async def memory_stop(self, ctx: utils.THIABridgeExtContext) -> None:
+        """Stops tracking memory allocations."""
+        if not profiler.memory_tracker.running:
+            await ctx.reply("Memory allocations are not being tracked.")
+            return
+
+        profiler.memory_tracker.stop()
+        await ctx.reply("Stopped tracking memory allocations.")
+
     @debug.command()
     async def shell(
         self, ctx: utils.THIABridgeExtContext, *, cmd: str
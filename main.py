@@ -8,17 +8,18 @@ file, You can obtain one at https://mozilla.org/MPL/2.0/.
 """
 
 import asyncio
+import atexit
 import contextlib
 import datetime
 import logging
 import os
+import signal
 import subprocess
 import sys
 from collections import defaultdict
 
 import discord
 import humanize
-import ragwort
 import sentry_sdk
 import typing_extensions as typing
 from discord.ext import commands, tasks
@@ -28,20 +29,32 @@ from load_env import load_env
 
 load_env()
 
+import common.caches as caches
+import common.defer as defer
+import common.dice_pool as dice_pool
+import common.errors as errors
+import common.fuzzy  # noqa: F401 - registers statements for new connections to prepare
+import common.http_client as http_client
+import common.logs as logs
+import common.loop_monitor as loop_monitor
+import common.metrics as metrics
 import common.models as models
+import common.tracing as tracing
 import common.utils as utils
 import db_settings
 
 logger = logging.getLogger("discord")
 logger.setLevel(logging.INFO)
-handler = logging.FileHandler(
-    filename=os.environ["LOG_FILE_PATH"], encoding="utf-8", mode="a"
+# file writes happen in a background thread, not on the event loop
+log_listener = logs.setup_logging(
+    logger,
+    path=os.environ["LOG_FILE_PATH"],
+    json_format=utils.LOG_JSON,
+    max_bytes=utils.LOG_MAX_BYTES,
+    backup_count=utils.LOG_BACKUP_COUNT,
+    rotate_when=utils.LOG_ROTATE_WHEN,
 )
-handler.setFormatter(
-    logging.Formatter("%(asctime)s:%(levelname)s:%(name)s: %(message)s")
-)
-logger.addHandler(handler)
-logger.addHandler(logging.StreamHandler(sys.stdout))
+atexit.register(log_listener.stop)
 
 
 def default_sentry_filter(
@@ -69,10 +82,19 @@ class HookedTask(tasks.Loop):
 
 tasks.Loop._error = HookedTask._error
 if utils.SENTRY_ENABLED:
-    sentry_sdk.init(dsn=os.environ["SENTRY_DSN"], before_send=default_sentry_filter)
+    # the loop monitor always sends its own performance events,
+    # this only controls how many others are sampled
+    sentry_sdk.init(
+        dsn=os.environ["SENTRY_DSN"],
+        before_send=default_sentry_filter,
+        traces_sample_rate=utils.SENTRY_TRACES_SAMPLE_RATE,
+    )
+    errors.reporter.report_to_sentry = True
 
 
 class PYTHIA(utils.THIABase):
+    shutdown_task: asyncio.Task | None = None
+
     async def on_ready(self) -> None:
         if not self.owner:
             app_info = await self.application_info()
@@ -98,12 +120,86 @@ class PYTHIA(utils.THIABase):
         )
         await self.change_presence(activity=activity)
 
+    async def on_shard_ready(self, shard_id: int) -> None:
+        # commands for this shard's guilds can run now, see global_check
+        self.ready_shards.add(shard_id)
+
+        if utils.CHANNEL_WARMUP_ENABLED:
+            self.create_task(self.warm_up_channels(shard_id))
+
+    async def warm_up_channels(self, shard_id: int) -> None:
+        # only guilds actively scanning messages are worth the extra requests
+        for guild_id in tuple(self.msg_enabled_bullets_guilds):
+            if self.draining:
+                return
+
+            if self.get_shard_id(guild_id) == shard_id and (
+                guild := self.get_guild(guild_id)
+            ):
+                await caches.channel_cache.warm_up(guild)
+                await asyncio.sleep(1)  # we don't want to trigger ratelimits
+
     async def on_resumed(self) -> None:
         activity = discord.CustomActivity(
             name="Assisting servers | pythia.astrea.cc",
         )
         await self.change_presence(activity=activity)
 
+    async def on_application_command_auto_complete(
+        self, interaction: discord.Interaction, command: discord.ApplicationCommand
+    ) -> None:
+        # autocomplete only reads, and a slightly stale suggestion is harmless
+        with db_settings.use_replica():
+            async with tracing.tracer.trace(f"autocomplete:{command.qualified_name}"):
+                await super().on_application_command_auto_complete(interaction, command)
+
+    async def get_autocomplete_context(
+        self,
+        interaction: discord.Interaction,
+        cls: typing.Any = discord.AutocompleteContext,
+    ) -> discord.AutocompleteContext:
+        # py-cord runs the callback in its own task, then waits a few seconds to
+        # see if the autocomplete gets replaced - only the task should be timed
+        if (invocation := tracing.current()) is not None and (
+            task := asyncio.current_task()
+        ):
+            task.add_done_callback(lambda _: invocation.end())
+        return await super().get_autocomplete_context(interaction, cls)
+
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        caches.channel_cache.invalidate(channel.id)
+
+    async def on_raw_thread_delete(self, payload: discord.RawThreadDeleteEvent) -> None:
+        caches.channel_cache.invalidate(payload.thread_id)
+
+    def _schedule_event(
+        self,
+        coro: typing.Callable[
+            ..., typing.Coroutine[typing.Any, typing.Any, typing.Any]
+        ],
+        event_name: str,
+        *args: typing.Any,
+        **kwargs: typing.Any,
+    ) -> asyncio.Task | None:
+        # nothing new gets started while shutting down
+        # dispatch doesn't use the task, so not returning one is fine
+        if self.draining:
+            return None
+
+        # the task copies the context when it's made, so everything it logs
+        # is tied to the interaction or message that caused it
+        token = logs.correlation_id.set(
+            logs.event_correlation_id(args) or logs.correlation_id.get()
+        )
+        try:
+            task = super()._schedule_event(coro, event_name, *args, **kwargs)
+        finally:
+            logs.correlation_id.reset(token)
+
+        self.event_tasks.add(task)
+        task.add_done_callback(self.event_tasks.discard)
+        return task
+
     async def on_error(self, _: str, *__: typing.Any, **___: typing.Any) -> None:
         error: Exception = sys.exc_info()[1]
         await utils.error_handle(error)
@@ -187,8 +283,62 @@ class PYTHIA(utils.THIABase):
 
         await self._pythia_error(context, exception)
 
+    def _pending_tasks(self) -> set[asyncio.Task]:
+        return {
+            task
+            for task in self.event_tasks | self.background_tasks
+            if not task.done() and task not in self.closing_tasks
+        }
+
+    async def drain(self, timeout: float) -> None:
+        """
+        Waits for running event handlers and background tasks to finish,
+        cancelling whatever is still running once the timeout is up.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        # handlers can start background tasks of their own, so check again after
+        while pending := self._pending_tasks():
+            if (remaining := deadline - loop.time()) <= 0:
+                logger.warning(
+                    "%s tasks didn't finish in time, cancelling them.", len(pending)
+                )
+                for task in pending:
+                    task.cancel()
+                await asyncio.wait(pending, timeout=1)
+                return
+
+            logger.info("Waiting for %s tasks to finish.", len(pending))
+            await asyncio.wait(pending, timeout=remaining)
+
+    def request_close(self) -> asyncio.Task:
+        """Starts shutting down, if that hasn't happened already."""
+        if self.shutdown_task is None:
+            self.shutdown_task = asyncio.create_task(self._shutdown(), name="shutdown")
+        return self.shutdown_task
+
     async def close(self) -> None:
+        # the shutdown waits for running tasks, which can't include the ones
+        # waiting on it, like the shutdown command
+        if task := asyncio.current_task():
+            self.closing_tasks.add(task)
+        await asyncio.shield(self.request_close())
+
+    async def _shutdown(self) -> None:
+        # the gateway and http session stay open while draining, so that
+        # whatever is running can still respond
+        self.draining = True
+        await self.drain(utils.SHUTDOWN_TIMEOUT)
+
+        loop_monitor.monitor.stop()
+        if self.metrics_server:
+            await self.metrics_server.close()
+        if self.dice_pool:
+            await self.dice_pool.close()
         await super().close()
+        await self.http_client.close()
+        await errors.reporter.stop()
         await Tortoise.close_connections()
 
 
@@ -221,27 +371,76 @@ bot = PYTHIA(
     chunk_guilds_at_startup=False,
     cache_default_sounds=False,
 )
-ragwort.setup_auto_defer(bot, default=True)
+bot.command_latencies = defer.setup_adaptive_auto_defer(
+    bot, default=True, budget=utils.AUTO_DEFER_BUDGET
+)
+tracing.setup_query_tracing(
+    bot,
+    db_settings.tortoise_config(),
+    enabled=utils.QUERY_TRACING_ENABLED,
+    max_queries=utils.QUERY_BUDGET,
+    max_time=utils.QUERY_TIME_BUDGET,
+    duplicate_threshold=utils.QUERY_DUPLICATE_THRESHOLD,
+)
 bot.init_load = True
 bot.start_time = None
 bot.owner = None
 bot.background_tasks = set()
 bot.msg_enabled_bullets_guilds = set()
 bot.gacha_locks = defaultdict(asyncio.Lock)
+bot.metrics_server = None
+bot.dice_pool = None
+bot.http_client = http_client.HTTPClient()
+bot.draining = False
+bot.event_tasks = set()
+bot.ready_shards = set()
+bot.closing_tasks = set()
 bot.color = discord.Color(int(os.environ["BOT_COLOR"]))  # #723fb0 or 7487408
 
 
 @bot.check
-async def global_check(_: utils.THIABridgeContext) -> bool:
-    if not bot.is_ready():
+async def global_check(ctx: utils.THIABridgeContext) -> bool:
+    # a guild's commands can run as soon as its shard is ready,
+    # rather than waiting on every shard
+    if not bot.is_ready() and (
+        not ctx.guild or ctx.guild.shard_id not in bot.ready_shards
+    ):
         raise utils.CustomCheckFailure(
             "The bot is still starting up. Please wait a moment and try again."
         )
     return True
 
 
-async def start() -> None:
-    await Tortoise.init(db_settings.TORTOISE_ORM)
+@bot.before_invoke
+async def route_reads(ctx: utils.THIABridgeContext) -> None:
+    # hooks run in the same task as the command, so this lasts for the whole command
+    if ctx.command and getattr(ctx.command.callback, "__replica_reads__", False):
+        db_settings.route_to_replica()
+
+
+async def prepare() -> None:
+    """
+    Does everything needed before connecting to Discord.
+    Needs to be called inside of the bot's context manager.
+    """
+    if utils.DICE_POOL_ENABLED:
+        bot.dice_pool = dice_pool.DicePool(
+            workers=utils.DICE_POOL_WORKERS,
+            timeout=utils.DICE_ROLL_TIMEOUT,
+            memory_limit=utils.DICE_WORKER_MEMORY,
+        )
+        await bot.dice_pool.start()
+
+    if utils.LOOP_MONITOR_ENABLED:
+        loop_monitor.monitor.threshold = utils.SLOW_CALLBACK_THRESHOLD
+        loop_monitor.monitor.report_to_sentry = utils.SENTRY_ENABLED
+        loop_monitor.monitor.start()
+
+    errors.reporter.burst = utils.ERROR_BURST_LIMIT
+    errors.reporter.digest_interval = utils.ERROR_DIGEST_INTERVAL
+    errors.reporter.start(bot)
+
+    await Tortoise.init(db_settings.tortoise_config())
 
     async for model in models.BulletConfig.filter(
         bullets_enabled=True,
@@ -249,21 +448,37 @@ async def start() -> None:
     ):
         bot.msg_enabled_bullets_guilds.add(model.guild_id)  # type: ignore
 
-    async with bot:
-        ext_list = utils.get_all_extensions(os.environ["DIRECTORY_OF_FILE"])
-        for ext in ext_list:
-            if "voting" in ext and not utils.VOTING_ENABLED:
-                continue
-            if ext.split(".")[-1].endswith("common"):
-                continue
-
-            try:
-                bot.load_extension(ext)
-            except discord.ExtensionError:
-                raise
+    ext_list = utils.get_all_extensions(os.environ["DIRECTORY_OF_FILE"])
+    for ext in ext_list:
+        if "voting" in ext and not utils.VOTING_ENABLED:
+            continue
+        if ext.split(".")[-1].endswith("common"):
+            continue
+
+        try:
+            bot.load_extension(ext)
+        except discord.ExtensionError:
+            raise
+
+    if utils.METRICS_ENABLED:
+        bot.metrics_server = metrics.MetricsServer(bot)
+        await bot.metrics_server.start(host=utils.METRICS_HOST, port=utils.METRICS_PORT)
+
 
+async def start() -> None:
+    async with bot:
+        await prepare()
         bot.sync_command_info_task()
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            # not supported on windows
+            with contextlib.suppress(NotImplementedError):
+                loop.add_signal_handler(sig, bot.request_close)
+
         await bot.start(os.environ["MAIN_TOKEN"])
+        # start returns partway through a shutdown, so wait for the rest of it
+        await bot.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+from tortoise import migrations
+from tortoise.migrations.operations import RunSQL
+
+
+class Migration(migrations.Migration):
+    dependencies = [("models", "0010_message_threads")]
+
+    initial = False
+
+    # tortoise compares UPPER() of both sides for __iexact,
+    # so these indexes also cover every case insensitive lookup by name
+    # names that only differ by case have to be made unique first - later ones
+    # are renamed rather than deleted, since other rows may refer to them
+    operations = [
+        RunSQL(
+            sql="""
+            UPDATE "thiagachaitems" t SET "name" = t."name" || ' (' || t."id" || ')'
+                FROM "thiagachaitems" o
+                WHERE o."guild_id" = t."guild_id"
+                AND UPPER(o."name") = UPPER(t."name")
+                AND o."id" < t."id";
+            UPDATE "thiaitemssystemitems" t SET "name" = t."name" || ' (' || t."id" || ')'
+                FROM "thiaitemssystemitems" o
+                WHERE o."guild_id" = t."guild_id"
+                AND UPPER(o."name") = UPPER(t."name")
+                AND o."id" < t."id";
+            UPDATE "thiadicenetry" t SET "name" = t."name" || ' (' || t."id" || ')'
+                FROM "thiadicenetry" o
+                WHERE o."guild_id" = t."guild_id"
+                AND o."user_id" = t."user_id"
+                AND UPPER(o."name") = UPPER(t."name")
+                AND o."id" < t."id";
+            UPDATE "thiatruthbullets" t SET "trigger" = t."trigger" || ' (' || t."id" || ')'
+                FROM "thiatruthbullets" o
+                WHERE o."channel_id" = t."channel_id"
+                AND UPPER(o."trigger") = UPPER(t."trigger")
+                AND o."id" < t."id";
+            DELETE FROM "thiatruthbulletalias" t
+                USING "thiatruthbulletalias" o
+                WHERE o."bullet_id" = t."bullet_id"
+                AND UPPER(o."alias") = UPPER(t."alias")
+                AND o."id" < t."id";
+
+            CREATE UNIQUE INDEX "thiagachaitems_guild_id_upper_name_idx" ON "thiagachaitems" ("guild_id", UPPER("name"));
+            CREATE UNIQUE INDEX "thiaitemssystemitems_guild_id_upper_name_idx" ON "thiaitemssystemitems" ("guild_id", UPPER("name"));
+            CREATE UNIQUE INDEX "thiadicenetry_guild_id_user_id_upper_name_idx" ON "thiadicenetry" ("guild_id", "user_id", UPPER("name"));
+            CREATE UNIQUE INDEX "thiatruthbullets_channel_id_upper_trigger_idx" ON "thiatruthbullets" ("channel_id", UPPER("trigger"));
+            DROP INDEX IF EXISTS "thiatruthbulletalias_bullet_id_alias_idx";
+            CREATE UNIQUE INDEX "thiatruthbulletalias_bullet_id_upper_alias_idx" ON "thiatruthbulletalias" ("bullet_id", UPPER("alias"));
+            """.strip(),
+            reverse_sql="""
+            DROP INDEX IF EXISTS "thiagachaitems_guild_id_upper_name_idx";
+            DROP INDEX IF EXISTS "thiaitemssystemitems_guild_id_upper_name_idx";
+            DROP INDEX IF EXISTS "thiadicenetry_guild_id_user_id_upper_name_idx";
+            DROP INDEX IF EXISTS "thiatruthbullets_channel_id_upper_trigger_idx";
+            DROP INDEX IF EXISTS "thiatruthbulletalias_bullet_id_upper_alias_idx";
+            CREATE UNIQUE INDEX "thiatruthbulletalias_bullet_id_alias_idx" ON "thiatruthbulletalias" (bullet_id, alias);
+            """.strip(),
+        )
+    ]
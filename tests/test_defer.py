@@ -0,0 +1,49 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import os
+import types
+
+import pytest
+import ragwort
+
+os.environ.setdefault("BOT_COLOR", "7487408")
+
+import common.defer as defer
+import exts.dice.dice_cmds as dice_cmds
+
+
+def _context(group: ragwort.SlashCommandGroup, name: str) -> types.SimpleNamespace:
+    return types.SimpleNamespace(
+        command=group,
+        interaction=types.SimpleNamespace(data={"options": [{"name": name}]}),
+        cog=None,
+        bot=types.SimpleNamespace(__default_auto_defer__=ragwort.AutoDefer()),
+    )
+
+
+# these used to defer themselves, and can take longer than discord allows
+@pytest.mark.parametrize(
+    "name", ["roll", "roll-registered", "stats", "stats-registered"]
+)
+def test_dice_commands_auto_defer(name: str) -> None:
+    resolved, auto_defer = defer.resolve_auto_defer(
+        _context(dice_cmds.DiceCMDs.dice, name)
+    )
+    assert resolved == f"dice {name}"
+    assert auto_defer is not None
+    assert auto_defer.enabled
+
+
+def test_command_without_auto_defer_is_not_deferred() -> None:
+    # like ragwort, the cog and bot defaults don't apply to a resolved command
+    _, auto_defer = defer.resolve_auto_defer(
+        _context(dice_cmds.DiceCMDs.dice, "register")
+    )
+    assert auto_defer is None
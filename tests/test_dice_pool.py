@@ -0,0 +1,61 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import asyncio
+
+import pytest
+
+import common.dice_pool as dice_pool
+import common.rolls as rolls
+
+
+def test_roll() -> None:
+    async def run() -> None:
+        pool = dice_pool.DicePool(workers=1)
+        await pool.start()
+        try:
+            results = await pool.roll("4", 2)
+            assert [total for _, total in results] == [4, 4]
+        finally:
+            await pool.close()
+
+    asyncio.run(run())
+
+
+def test_worker_is_restarted_after_failing_to_start(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(dice_pool, "WAIT_TIMEOUT", 0.2)
+    monkeypatch.setattr(dice_pool, "RESTART_DELAY", 0.1)
+    start = dice_pool._Worker.start
+
+    async def broken_start(*_: object) -> dice_pool._Worker:
+        raise RuntimeError("Dice worker failed to start.")
+
+    async def run() -> None:
+        pool = dice_pool.DicePool(workers=1)
+        await pool.start()
+        try:
+            monkeypatch.setattr(dice_pool._Worker, "start", broken_start)
+            (worker,) = pool._all
+            worker.kill()
+
+            with pytest.raises(rolls.RollLimitExceeded):
+                await pool.roll("1d20")
+            # waiting rolls give up instead of hanging while there's no worker
+            with pytest.raises(dice_pool.PoolUnavailable):
+                await pool.roll("1d20")
+
+            monkeypatch.setattr(dice_pool._Worker, "start", start)
+            await asyncio.sleep(1)
+            assert len(await pool.roll("1d20")) == 1
+        finally:
+            await pool.close()
+
+    asyncio.run(run())
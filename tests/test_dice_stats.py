@@ -0,0 +1,38 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import pytest
+
+import common.dice_stats as dice_stats
+import common.rolls as rolls
+
+
+@pytest.mark.parametrize(
+    ("expr", "low", "high"),
+    [
+        ("1d20", 1, 20),
+        ("16d6", 16, 96),
+        ("20d6", 20, 120),
+        ("100d1000", 100, 100_000),
+        ("2*10d6+3", 23, 123),
+        ("-4d8", -32, -4),
+    ],
+)
+def test_exact_range(expr: str, low: int, high: int) -> None:
+    distribution = dice_stats.distribution(rolls.validate(expr))
+    assert distribution.exact
+    assert distribution.min == low
+    assert distribution.max == high
+    assert distribution.probs.sum() == pytest.approx(1)
+
+
+def test_scaled_gaps() -> None:
+    # only even totals are possible
+    distribution = dice_stats.distribution(rolls.validate("2*3d6"))
+    assert distribution.values.tolist() == list(range(6, 37, 2))
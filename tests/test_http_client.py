@@ -0,0 +1,143 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+import asyncio
+import contextlib
+
+import aiohttp
+import pytest
+import typing_extensions as typing
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import common.http_client as http_client
+
+MAX_SIZE: typing.Final[int] = 1024
+
+
+class StandIn:
+    """A local server for the client to talk to, which records who connected."""
+
+    def __init__(self) -> None:
+        self.peers: list[tuple[str, int]] = []
+        # handlers that never finish wait on this, so the server can close
+        self.done = asyncio.Event()
+
+        self.app = web.Application()
+        self.app.add_routes(
+            [
+                web.get("/small", self.small),
+                web.get("/endless", self.endless),
+                web.get("/too-large", self.too_large),
+            ]
+        )
+
+    async def small(self, request: web.Request) -> web.Response:
+        self.peers.append(request.transport.get_extra_info("peername"))
+        return web.Response(body=b"pythia")
+
+    async def endless(self, request: web.Request) -> web.StreamResponse:
+        # chunked, so there's no Content-Length to go off of
+        response = web.StreamResponse()
+        await response.prepare(request)
+        with contextlib.suppress(ConnectionError):
+            while not self.done.is_set():
+                await response.write(b"x" * 256)
+                await asyncio.sleep(0)
+        return response
+
+    async def too_large(self, request: web.Request) -> web.StreamResponse:
+        # only the headers are sent, so reading the body would never finish
+        response = web.StreamResponse()
+        response.content_length = MAX_SIZE + 1
+        await response.prepare(request)
+        await self.done.wait()
+        return response
+
+
+@contextlib.asynccontextmanager
+async def stand_in() -> typing.AsyncIterator[tuple[StandIn, TestServer]]:
+    app = StandIn()
+    server = TestServer(app.app)
+    await server.start_server()
+    try:
+        yield app, server
+    finally:
+        app.done.set()
+        await server.close()
+
+
+def run(coro: typing.Coroutine[typing.Any, typing.Any, None]) -> None:
+    asyncio.run(asyncio.wait_for(coro, 10))
+
+
+def test_connections_are_reused() -> None:
+    async def test() -> None:
+        client = http_client.HTTPClient()
+        try:
+            async with stand_in() as (app, server):
+                for _ in range(3):
+                    body = await client.read_limited(
+                        str(server.make_url("/small")), max_size=MAX_SIZE
+                    )
+                    assert body == b"pythia"
+        finally:
+            await client.close()
+
+        assert len(app.peers) == 3
+        assert len(set(app.peers)) == 1
+
+    run(test())
+
+
+def test_streamed_body_stops_at_max_size() -> None:
+    async def test() -> None:
+        client = http_client.HTTPClient()
+        try:
+            async with stand_in() as (_, server):
+                with pytest.raises(http_client.ResponseTooLarge) as exc_info:
+                    await client.read_limited(
+                        str(server.make_url("/endless")), max_size=MAX_SIZE
+                    )
+                assert exc_info.value.max_size == MAX_SIZE
+        finally:
+            await client.close()
+
+    run(test())
+
+
+def test_content_length_over_max_size_is_rejected_early() -> None:
+    async def test() -> None:
+        client = http_client.HTTPClient()
+        try:
+            async with stand_in() as (_, server):
+                with pytest.raises(http_client.ResponseTooLarge):
+                    await client.read_limited(
+                        str(server.make_url("/too-large")), max_size=MAX_SIZE
+                    )
+        finally:
+            await client.close()
+
+    run(test())
+
+
+def test_error_status_raises() -> None:
+    async def test() -> None:
+        client = http_client.HTTPClient()
+        try:
+            async with stand_in() as (_, server):
+                with pytest.raises(aiohttp.ClientResponseError) as exc_info:
+                    await client.read_limited(
+                        str(server.make_url("/missing")), max_size=MAX_SIZE
+                    )
+                assert exc_info.value.status == 404
+        finally:
+            await client.close()
+
+    run(test())
@@ -0,0 +1,907 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+# drives the real bot with made up gateway events, without connecting to discord
+# messages go into bullet channels, and interactions press gacha roll buttons,
+# type into autocompletes and send whispers
+# every api call is answered by a stub that records it
+# run with: python -m tools.load_generator --rate 50 --duration 30
+# uses a throwaway postgres (see tools/scratch_db.py), or LOAD_DB_URL if set
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import contextvars
+import dataclasses
+import hashlib
+import itertools
+import logging
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+import discord
+import orjson
+import typing_extensions as typing
+from discord.http import Route
+from discord.webhook.async_ import AsyncWebhookAdapter, async_context
+
+import load_env
+import tools.scratch_db as scratch_db
+
+if typing.TYPE_CHECKING:
+    import common.utils as utils
+
+GUILD_ID: typing.Final[int] = 800000000000000001
+PLAYER_ROLE_ID: typing.Final[int] = 800000000000000002
+BOT_ROLE_ID: typing.Final[int] = 800000000000000003
+BOT_ID: typing.Final[int] = 800000000000000004
+OWNER_ID: typing.Final[int] = 800000000000000005
+BULLET_CHANNEL_ID: typing.Final[int] = 810000000000000000
+INVESTIGATION_CHANNEL_BASE: typing.Final[int] = 820000000000000000
+PERSONAL_CHANNEL_BASE: typing.Final[int] = 830000000000000000
+PLAYER_BASE: typing.Final[int] = 840000000000000000
+
+KINDS: typing.Final[tuple[str, ...]] = (
+    "message",
+    "autocomplete",
+    "gacha_button",
+    "whisper",
+)
+CHATTER: typing.Final[tuple[str, ...]] = (
+    "did anyone check the library yet?",
+    "i think the culprit was in the kitchen",
+    "wait, where was everyone at midnight",
+    "let's split up and look around",
+    "this room feels off somehow",
+)
+
+_in_flight: contextvars.ContextVar["InFlight | None"] = contextvars.ContextVar(
+    "load_in_flight", default=None
+)
+
+
+def md5_prefix(i: int) -> str:
+    # matches substr(md5(i::text), 1, 10) in the seeding queries
+    return hashlib.md5(str(i).encode(), usedforsecurity=False).hexdigest()[:10]
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+@dataclasses.dataclass(slots=True)
+class Scenario:
+    players: int
+    channels: int
+    bullets: int
+
+    @property
+    def player_ids(self) -> list[int]:
+        return [PLAYER_BASE + i for i in range(self.players)]
+
+    @property
+    def investigation_channels(self) -> list[int]:
+        return [INVESTIGATION_CHANNEL_BASE + i for i in range(self.channels)]
+
+    def personal_channel(self, player_id: int) -> int:
+        return PERSONAL_CHANNEL_BASE + (player_id - PLAYER_BASE)
+
+    def bullet_channel(self, i: int) -> int:
+        # matches the seeding query
+        return INVESTIGATION_CHANNEL_BASE + (i % self.channels)
+
+
+@dataclasses.dataclass(slots=True, eq=False)
+class InFlight:
+    kind: str
+    started: float
+    pending: int = 0
+    injected: bool = False
+    responded: float | None = None
+
+
+class FakeDiscord:
+    """
+    Makes up the payloads Discord would send, and answers the API calls
+    the bot makes in return.
+    """
+
+    def __init__(self, scenario: Scenario, *, api_latency: float) -> None:
+        self.scenario = scenario
+        self.api_latency = api_latency
+        self.calls: collections.Counter[str] = collections.Counter()
+        self.unhandled: collections.Counter[str] = collections.Counter()
+        self.interaction_channels: dict[str, int] = {}
+        self._ids = itertools.count()
+
+    def snowflake(self) -> int:
+        return discord.utils.time_snowflake(discord.utils.utcnow()) + (
+            next(self._ids) % 4096
+        )
+
+    @staticmethod
+    def user(user_id: int, *, bot: bool = False) -> dict[str, typing.Any]:
+        return {
+            "id": str(user_id),
+            "username": f"user{user_id % 10000}",
+            "discriminator": "0",
+            "global_name": None,
+            "avatar": None,
+            "bot": bot,
+        }
+
+    def member(self, user_id: int, *, with_user: bool = True) -> dict[str, typing.Any]:
+        member: dict[str, typing.Any] = {
+            "roles": [str(BOT_ROLE_ID if user_id == BOT_ID else PLAYER_ROLE_ID)],
+            "joined_at": "2024-01-01T00:00:00+00:00",
+            "deaf": False,
+            "mute": False,
+            "flags": 0,
+            "permissions": "8" if user_id == BOT_ID else "2248473465835073",
+        }
+        if with_user:
+            member["user"] = self.user(user_id, bot=user_id == BOT_ID)
+        return member
+
+    @staticmethod
+    def channel(channel_id: int, name: str, position: int) -> dict[str, typing.Any]:
+        return {
+            "id": str(channel_id),
+            "type": discord.ChannelType.text.value,
+            "guild_id": str(GUILD_ID),
+            "name": name,
+            "position": position,
+            "permission_overwrites": [],
+            "nsfw": False,
+            "parent_id": None,
+            "topic": None,
+            "rate_limit_per_user": 0,
+            "last_message_id": None,
+        }
+
+    def channels(self) -> list[dict[str, typing.Any]]:
+        channels = [self.channel(BULLET_CHANNEL_ID, "bullets", 0)]
+        channels.extend(
+            self.channel(channel_id, f"investigation-{i}", i + 1)
+            for i, channel_id in enumerate(self.scenario.investigation_channels)
+        )
+        channels.extend(
+            self.channel(
+                self.scenario.personal_channel(player_id),
+                f"personal-{i}",
+                self.scenario.channels + i + 1,
+            )
+            for i, player_id in enumerate(self.scenario.player_ids)
+        )
+        return channels
+
+    def guild(self) -> dict[str, typing.Any]:
+        def role(role_id: int, name: str, permissions: str) -> dict[str, typing.Any]:
+            return {
+                "id": str(role_id),
+                "name": name,
+                "permissions": permissions,
+                "position": 0,
+                "color": 0,
+                "colors": {"primary_color": 0},
+                "hoist": False,
+                "managed": False,
+                "mentionable": False,
+                "flags": 0,
+            }
+
+        return {
+            "id": str(GUILD_ID),
+            "name": "Load Test",
+            "icon": None,
+            "owner_id": str(OWNER_ID),
+            "roles": [
+                role(GUILD_ID, "@everyone", "0"),
+                role(PLAYER_ROLE_ID, "Player", "0"),
+                role(BOT_ROLE_ID, "PYTHIA", "8"),
+            ],
+            "channels": self.channels(),
+            "threads": [],
+            "members": (
+                [self.member(BOT_ID)]
+                + [self.member(player_id) for player_id in self.scenario.player_ids]
+            ),
+            "member_count": self.scenario.players + 1,
+            "features": [],
+            "emojis": [],
+            "stickers": [],
+            "premium_tier": 0,
+            "verification_level": 0,
+            "default_message_notifications": 0,
+            "explicit_content_filter": 0,
+            "mfa_level": 0,
+            "system_channel_flags": 0,
+            "preferred_locale": "en-US",
+            "afk_timeout": 300,
+            "nsfw_level": 0,
+            "unavailable": False,
+        }
+
+    def message(
+        self,
+        channel_id: int,
+        author_id: int,
+        content: str,
+        **extra: typing.Any,
+    ) -> dict[str, typing.Any]:
+        return {
+            "id": str(self.snowflake()),
+            "channel_id": str(channel_id),
+            "guild_id": str(GUILD_ID),
+            "author": self.user(author_id, bot=author_id == BOT_ID),
+            "member": self.member(author_id, with_user=False),
+            "content": content,
+            "timestamp": discord.utils.utcnow().isoformat(),
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": [],
+            "components": [],
+            "pinned": False,
+            "type": discord.MessageType.default.value,
+            "flags": 0,
+        } | extra
+
+    def interaction(
+        self,
+        interaction_type: discord.InteractionType,
+        user_id: int,
+        channel_id: int,
+        data: dict[str, typing.Any],
+        **extra: typing.Any,
+    ) -> dict[str, typing.Any]:
+        token = f"token-{self.snowflake()}"
+        self.interaction_channels[token] = channel_id
+        return {
+            "id": str(self.snowflake()),
+            "application_id": str(BOT_ID),
+            "type": interaction_type.value,
+            "token": token,
+            "version": 1,
+            "guild_id": str(GUILD_ID),
+            "channel_id": str(channel_id),
+            "channel": self.channel(channel_id, "channel", 0),
+            "member": self.member(user_id),
+            "data": data,
+            "locale": "en-US",
+            "guild_locale": "en-US",
+            "app_permissions": "8",
+            "entitlements": [],
+            "authorizing_integration_owners": {"0": str(GUILD_ID)},
+            "context": discord.InteractionContextType.guild.value,
+            "attachment_size_limit": 10485760,
+        } | extra
+
+    # answering api calls
+
+    async def answer(
+        self, route: Route, payload: dict[str, typing.Any] | None
+    ) -> typing.Any:
+        self.calls[f"{route.method} {route.path}"] += 1
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+
+        path = route.path
+        payload = payload or {}
+
+        if path == "/applications/{application_id}/commands":
+            return self.application_commands()
+        if path == "/users/@me/channels":
+            return {
+                "id": str(self.snowflake()),
+                "type": discord.ChannelType.private.value,
+                "recipients": [self.user(int(payload["recipient_id"]))],
+                "last_message_id": None,
+            }
+        if path.endswith("/callback"):
+            # py-cord keeps autocompletes around for a few seconds after they respond
+            # in case another one replaces them, so they're done once they respond
+            if (event := _in_flight.get()) is not None and event.kind == "autocomplete":
+                event.responded = time.perf_counter()
+            return {
+                "interaction": {
+                    "id": str(route.webhook_id),
+                    "type": 2,
+                    "response_message_loading": payload.get("type") == 5,
+                    "response_message_ephemeral": False,
+                },
+                "resource": {"type": payload.get("type", 4)},
+            }
+        if path.startswith("/webhooks/"):
+            channel_id = self.interaction_channels.get(
+                str(route.webhook_token), BULLET_CHANNEL_ID
+            )
+            return self.message(channel_id, BOT_ID, payload.get("content") or "")
+        if path == "/channels/{channel_id}/messages" and route.method == "POST":
+            return self.message(
+                int(route.channel_id or 0), BOT_ID, payload.get("content") or ""
+            )
+        if path == "/channels/{channel_id}" and route.method == "GET":
+            for channel in self.channels():
+                if channel["id"] == str(route.channel_id):
+                    return channel
+
+        self.unhandled[f"{route.method} {route.path}"] += 1
+        return None
+
+    def application_commands(self) -> list[dict[str, typing.Any]]:
+        import main
+
+        return [
+            {
+                "id": str(self.snowflake()),
+                "name": command.name,
+                "type": command.type,
+            }
+            for command in main.bot.pending_application_commands
+            if command.guild_ids is None
+        ]
+
+
+class StubWebhookAdapter(AsyncWebhookAdapter):
+    def __init__(self, fake: FakeDiscord) -> None:
+        super().__init__()
+        self.fake = fake
+
+    async def request(
+        self,
+        route: Route,
+        *_: typing.Any,
+        payload: dict[str, typing.Any] | None = None,
+        multipart: list[dict[str, typing.Any]] | None = None,
+        **__: typing.Any,
+    ) -> typing.Any:
+        if payload is None and multipart:
+            # the json part of a multipart request
+            payload = orjson.loads(multipart[0]["value"])
+        return await self.fake.answer(route, payload)
+
+
+class ErrorCounter(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, _: logging.LogRecord) -> None:
+        self.count += 1
+
+
+class LoadGenerator:
+    def __init__(
+        self,
+        bot: "utils.THIABase",
+        fake: FakeDiscord,
+        scenario: Scenario,
+        *,
+        hit_rate: float,
+    ) -> None:
+        self.bot = bot
+        self.fake = fake
+        self.scenario = scenario
+        self.hit_rate = hit_rate
+        self.state = bot._connection
+        self.command_ids: dict[str, str] = {}
+
+        self.latencies: collections.defaultdict[str, list[float]] = (
+            collections.defaultdict(list)
+        )
+        self.injected: collections.Counter[str] = collections.Counter()
+        self.in_flight: set[InFlight] = set()
+        self.idle = asyncio.Event()
+
+        # every listener and command runs in a task made by _schedule_event,
+        # and any that are made while handling an event belong to that event
+        original_schedule_event = bot._schedule_event
+
+        def schedule_event(
+            *args: typing.Any, **kwargs: typing.Any
+        ) -> asyncio.Task | None:
+            task = original_schedule_event(*args, **kwargs)
+            # nothing gets scheduled while the bot is shutting down
+            if task is not None and (event := _in_flight.get()) is not None:
+                event.pending += 1
+                task.add_done_callback(lambda _: self._task_done(event))
+            return task
+
+        bot._schedule_event = schedule_event
+
+    def _task_done(self, event: InFlight) -> None:
+        event.pending -= 1
+        if event.pending == 0 and event.injected:
+            self._finish(event)
+
+    def _finish(self, event: InFlight) -> None:
+        self.in_flight.discard(event)
+        if not self.in_flight:
+            self.idle.set()
+        finished = event.responded or time.perf_counter()
+        self.latencies[event.kind].append(finished - event.started)
+
+    async def connect(self) -> None:
+        state = self.state
+        state.user = discord.ClientUser(
+            state=state, data=self.fake.user(BOT_ID, bot=True)
+        )
+        state.application_id = BOT_ID
+        state._add_guild_from_data(self.fake.guild())
+
+        self.bot.owner = state.store_user(self.fake.user(OWNER_ID))
+        self.bot._ready.set()
+
+        # the same thing the bot does on startup, just answered by the stub
+        await self.bot._sync_command_info()
+        self.command_ids = {
+            command.name: str(command.id)
+            for command in self.bot.pending_application_commands
+            if command.id
+        }
+
+    def inject(self, kind: str) -> None:
+        if kind == "message":
+            event_type, payload = "MESSAGE_CREATE", self.make_message()
+        elif kind == "autocomplete":
+            event_type, payload = "INTERACTION_CREATE", self.make_autocomplete()
+        elif kind == "gacha_button":
+            event_type, payload = "INTERACTION_CREATE", self.make_gacha_button()
+        else:
+            event_type, payload = "INTERACTION_CREATE", self.make_whisper()
+
+        event = InFlight(kind, time.perf_counter())
+        self.in_flight.add(event)
+        self.idle.clear()
+        self.injected[kind] += 1
+
+        token = _in_flight.set(event)
+        try:
+            self.state.parsers[event_type](payload)
+        finally:
+            _in_flight.reset(token)
+
+        event.injected = True
+        if event.pending == 0:
+            self._finish(event)
+
+    def random_player(self, *, exclude: int | None = None) -> int:
+        while (player_id := random.choice(self.scenario.player_ids)) == exclude:
+            pass
+        return player_id
+
+    def make_message(self) -> dict[str, typing.Any]:
+        i = random.randrange(self.scenario.bullets) + 1
+        channel_id = self.scenario.bullet_channel(i)
+
+        if random.random() < self.hit_rate:
+            content = f"hey, i think i found the clue {md5_prefix(i)}!"
+        else:
+            content = random.choice(CHATTER)
+
+        return self.fake.message(channel_id, self.random_player(), content)
+
+    def make_autocomplete(self) -> dict[str, typing.Any]:
+        typed = f"item {md5_prefix(random.randrange(1000) + 1)}"
+        typed = typed[: random.randint(1, len(typed))]
+        return self.fake.interaction(
+            discord.InteractionType.auto_complete,
+            self.random_player(),
+            random.choice(self.scenario.investigation_channels),
+            {
+                "id": self.command_ids["items"],
+                "name": "items",
+                "type": 1,
+                "options": [
+                    {
+                        "type": 1,
+                        "name": "here",
+                        "options": [
+                            {
+                                "type": 3,
+                                "name": "name",
+                                "value": typed,
+                                "focused": True,
+                            }
+                        ],
+                    }
+                ],
+            },
+        )
+
+    def make_gacha_button(self) -> dict[str, typing.Any]:
+        player_id = self.random_player()
+        channel_id = random.choice(self.scenario.investigation_channels)
+        return self.fake.interaction(
+            discord.InteractionType.component,
+            player_id,
+            channel_id,
+            {"custom_id": "gacha-roll-roll", "component_type": 2},
+            message=self.fake.message(
+                channel_id,
+                BOT_ID,
+                "",
+                interaction_metadata={
+                    "id": str(self.fake.snowflake()),
+                    "type": 2,
+                    "user": self.fake.user(player_id),
+                    "authorizing_integration_owners": {"0": str(GUILD_ID)},
+                },
+            ),
+        )
+
+    def make_whisper(self) -> dict[str, typing.Any]:
+        player_id = self.random_player()
+        other_id = self.random_player(exclude=player_id)
+        return self.fake.interaction(
+            discord.InteractionType.application_command,
+            player_id,
+            self.scenario.personal_channel(player_id),
+            {
+                "id": self.command_ids["message"],
+                "name": "message",
+                "type": 1,
+                "options": [
+                    {
+                        "type": 1,
+                        "name": "send",
+                        "options": [
+                            {"type": 6, "name": "user", "value": str(other_id)},
+                            {"type": 3, "name": "message", "value": "meet me later"},
+                        ],
+                    }
+                ],
+                "resolved": {
+                    "users": {str(other_id): self.fake.user(other_id)},
+                    "members": {
+                        str(other_id): self.fake.member(other_id, with_user=False)
+                    },
+                },
+            },
+        )
+
+    async def drive(
+        self, *, rate: float, duration: float, weights: dict[str, float]
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        kinds = [k for k in KINDS if weights.get(k)]
+        kind_weights = [weights[k] for k in kinds]
+
+        end = loop.time() + duration
+        next_at = loop.time()
+        while next_at < end:
+            self.inject(random.choices(kinds, kind_weights)[0])
+
+            # poisson arrivals, and we don't slow down if the bot falls behind
+            next_at += random.expovariate(rate)
+            if (delay := next_at - loop.time()) > 0:
+                await asyncio.sleep(delay)
+
+
+async def seed(scenario: Scenario) -> None:
+    from tortoise.connection import get_connection
+
+    import common.models as models
+
+    if await models.GuildConfig.exists(guild_id=GUILD_ID):
+        return
+
+    await models.GuildConfig.create(guild_id=GUILD_ID, player_role=PLAYER_ROLE_ID)
+    await models.Names.create(guild_id=GUILD_ID)
+    await models.BulletConfig.create(
+        guild_id=GUILD_ID, bullets_enabled=True, bullet_chan_id=BULLET_CHANNEL_ID
+    )
+    await models.ItemsConfig.create(guild_id=GUILD_ID, enabled=True)
+    await models.GachaConfig.create(guild_id=GUILD_ID, enabled=True)
+    await models.GachaRarities.create(guild_id=GUILD_ID)
+    await models.DiceConfig.create(guild_id=GUILD_ID)
+    await models.MessageConfig.create(
+        guild_id=GUILD_ID, enabled=True, mode=models.MessageMode.CLASSIC
+    )
+
+    await models.GachaPlayer.bulk_create(
+        [
+            models.GachaPlayer(
+                guild_id=GUILD_ID, user_id=player_id, currency_amount=10**9
+            )
+            for player_id in scenario.player_ids
+        ]
+    )
+    await models.MessageLink.bulk_create(
+        [
+            models.MessageLink(
+                guild_id=GUILD_ID,
+                user_id=player_id,
+                channel_id=scenario.personal_channel(player_id),
+            )
+            for player_id in scenario.player_ids
+        ]
+    )
+
+    conn = get_connection("default")
+    await conn.execute_query(
+        """
+        INSERT INTO thiatruthbullets (trigger, description, channel_id, guild_id, found, hidden)
+        SELECT
+            'clue ' || substr(md5(i::text), 1, 10),
+            'A synthetic clue, found at the scene.',
+            $1::bigint + (i % $3),
+            $2::bigint,
+            FALSE,
+            FALSE
+        FROM generate_series(1, $4) AS i
+        """,
+        [INVESTIGATION_CHANNEL_BASE, GUILD_ID, scenario.channels, scenario.bullets],
+    )
+    await conn.execute_query(
+        """
+        INSERT INTO thiaitemssystemitems (guild_id, name, description, takeable)
+        SELECT $1::bigint, 'item ' || substr(md5(i::text), 1, 10), 'An item.', TRUE
+        FROM generate_series(1, 1000) AS i
+        """,
+        [GUILD_ID],
+    )
+    await conn.execute_query(
+        """
+        INSERT INTO thiaitemrelation (item_id, guild_id, object_id, object_type)
+        SELECT id, guild_id, $2::bigint + (id % $3), 'CHANNEL'
+        FROM thiaitemssystemitems WHERE guild_id = $1
+        """,
+        [GUILD_ID, INVESTIGATION_CHANNEL_BASE, scenario.channels],
+    )
+    await conn.execute_query(
+        """
+        INSERT INTO thiagachaitems (guild_id, name, description, rarity, amount)
+        SELECT
+            $1::bigint, 'prize ' || substr(md5(i::text), 1, 10), 'A prize.', (i % 5) + 1, -1
+        FROM generate_series(1, 500) AS i
+        """,
+        [GUILD_ID],
+    )
+    await conn.execute_script("ANALYZE;")
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    weights: dict[str, float] = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in KINDS:
+            raise argparse.ArgumentTypeError(f"Unknown event kind: {kind}")
+        weights[kind] = float(weight)
+    return weights
+
+
+def report(
+    generator: LoadGenerator, *, wall_time: float, unfinished: int, errors: int
+) -> dict[str, typing.Any]:
+    import common.loop_monitor as loop_monitor
+    import common.tracing as tracing
+
+    events = {}
+    for kind in KINDS:
+        latencies = generator.latencies.get(kind, [])
+        events[kind] = {
+            "injected": generator.injected[kind],
+            "completed": len(latencies),
+            "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round(max(latencies, default=0) * 1000, 2),
+        }
+
+    lag = loop_monitor.monitor.percentiles() or dict.fromkeys(("p50", "p99", "max"), 0)
+    stats = tracing.tracer.labels.values()
+    queries = sum(s.queries for s in stats)
+    query_time = sum(s.total_time for s in stats)
+
+    return {
+        "wall_time_s": round(wall_time, 2),
+        "unfinished": unfinished,
+        "errors": errors,
+        "events": events,
+        "loop_lag": {
+            "p50_ms": round(lag["p50"] * 1000, 2),
+            "p99_ms": round(lag["p99"] * 1000, 2),
+            "max_ms": round(lag["max"] * 1000, 2),
+            "stalls": (
+                collections.Counter(
+                    stall.location for stall in loop_monitor.monitor.stalls
+                ).most_common()
+            ),
+        },
+        "db": {
+            "queries": queries,
+            "queries_per_s": round(queries / wall_time, 1),
+            "query_time_s": round(query_time, 3),
+            "untracked_queries": tracing.tracer.untracked,
+            "flagged_invocations": sum(s.flagged for s in stats),
+            "busiest": sorted(
+                (
+                    {
+                        "label": label,
+                        "queries": s.queries,
+                        "avg": round(s.avg_queries, 1),
+                    }
+                    for label, s in tracing.tracer.labels.items()
+                    if s.queries
+                ),
+                key=lambda x: x["queries"],
+                reverse=True,
+            )[:5],
+        },
+        "api_calls": dict(generator.fake.calls.most_common()),
+        "unhandled_api_calls": dict(generator.fake.unhandled),
+    }
+
+
+def print_report(results: dict[str, typing.Any]) -> None:
+    print(
+        f"\n{'event':<14} {'sent':>7} {'done':>7} {'p50 ms':>9} {'p99 ms':>9}"
+        f" {'max ms':>9}"
+    )
+    for kind, stats in results["events"].items():
+        print(
+            f"{kind:<14} {stats['injected']:>7} {stats['completed']:>7}"
+            f" {stats['p50_ms']:>9} {stats['p99_ms']:>9} {stats['max_ms']:>9}"
+        )
+
+    lag = results["loop_lag"]
+    print(
+        f"\nloop lag: p50 {lag['p50_ms']} ms, p99 {lag['p99_ms']} ms, max"
+        f" {lag['max_ms']} ms"
+    )
+    for location, count in lag["stalls"]:
+        print(f"  blocked {count}x at {location}")
+
+    db = results["db"]
+    print(
+        f"db: {db['queries']} queries ({db['queries_per_s']}/s),"
+        f" {db['query_time_s']} s in queries, {db['flagged_invocations']} flagged"
+    )
+    for entry in db["busiest"]:
+        print(f"  {entry['label']}: {entry['queries']} ({entry['avg']} per invocation)")
+
+    print("api calls:")
+    for route, count in results["api_calls"].items():
+        print(f"  {route}: {count}")
+    if results["unhandled_api_calls"]:
+        print(f"unhandled api calls: {results['unhandled_api_calls']}")
+    if results["errors"]:
+        print(f"{results['errors']} errors were logged, see the log file.")
+    if results["unfinished"]:
+        print(f"{results['unfinished']} events had not finished by the end.")
+
+
+async def run(db_url: str, args: argparse.Namespace) -> dict[str, typing.Any]:
+    os.environ["DB_URL"] = db_url
+    os.environ.pop("DB_READ_URL", None)
+
+    import main
+
+    # the report is what we want on stdout, the logs still go to the log file
+    main.log_listener.handlers = tuple(
+        h for h in main.log_listener.handlers if type(h) is not logging.StreamHandler
+    )
+    discord_logger = logging.getLogger("discord")
+    errors = ErrorCounter()
+    discord_logger.addHandler(errors)
+
+    import common.loop_monitor as loop_monitor
+    import common.tracing as tracing
+
+    scenario = Scenario(
+        players=args.players, channels=args.channels, bullets=args.bullets
+    )
+    fake = FakeDiscord(scenario, api_latency=args.api_latency)
+    async_context.set(StubWebhookAdapter(fake))
+
+    bot = main.bot
+    bot.http.request = lambda route, **kwargs: fake.answer(route, kwargs.get("json"))
+
+    async with bot:
+        await main.prepare()
+        await seed(scenario)
+
+        # prepare fills in the bullet guilds before the seed, for a fresh database
+        bot.msg_enabled_bullets_guilds.add(GUILD_ID)
+
+        generator = LoadGenerator(bot, fake, scenario, hit_rate=args.hit_rate)
+        await generator.connect()
+        tracing.tracer.clear()
+        loop_monitor.monitor.start()
+        loop_monitor.monitor.clear()
+
+        started = time.perf_counter()
+        await generator.drive(rate=args.rate, duration=args.duration, weights=args.mix)
+
+        # give whatever is still running a chance to finish
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(generator.idle.wait(), args.drain)
+
+        wall_time = time.perf_counter() - started
+        await main.errors.reporter.flush()
+
+        return report(
+            generator,
+            wall_time=wall_time,
+            unfinished=len(generator.in_flight),
+            # repeats of the same error aren't logged, only counted
+            errors=errors.count + main.errors.reporter.suppressed,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--rate", type=float, default=20, help="Events per second. Defaults to 20."
+    )
+    parser.add_argument(
+        "--duration", type=float, default=30, help="Seconds to run for. Defaults to 30."
+    )
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default="message=60,autocomplete=25,gacha_button=10,whisper=5",
+        help=(
+            "Relative weights of each event kind. Defaults to"
+            " message=60,autocomplete=25,gacha_button=10,whisper=5."
+        ),
+    )
+    parser.add_argument(
+        "--hit-rate",
+        type=float,
+        default=0.05,
+        help="How often a message mentions a Truth Bullet. Defaults to 0.05.",
+    )
+    parser.add_argument(
+        "--api-latency",
+        type=float,
+        default=0.05,
+        help="Seconds each stubbed API call takes. Defaults to 0.05.",
+    )
+    parser.add_argument("--players", type=int, default=50)
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument("--bullets", type=int, default=10000)
+    parser.add_argument(
+        "--drain",
+        type=float,
+        default=30,
+        help="Seconds to wait for events still running at the end. Defaults to 30.",
+    )
+    parser.add_argument("--output", type=Path, help="Where to write the results.")
+    args = parser.parse_args()
+
+    load_env.load_env()
+    # nothing here should reach the real services
+    for key in ("SENTRY_DSN", "TOP_GG_TOKEN", "DBL_TOKEN"):
+        os.environ.pop(key, None)
+    os.environ.setdefault("BOT_COLOR", "7487408")
+    os.environ.setdefault("MAIN_TOKEN", "not-a-token")
+
+    with scratch_db.throwaway_postgres(os.environ.get("LOAD_DB_URL")) as db_url:
+        scratch_db.migrate(db_url)
+        results = asyncio.run(run(db_url, args))
+
+    print_report(results)
+    if args.output:
+        args.output.write_bytes(orjson.dumps(results, option=orjson.OPT_INDENT_2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
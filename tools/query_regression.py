@@ -0,0 +1,459 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+# pins how many queries the hot paths make and which indexes their statements use
+# spins up a throwaway postgres (see tools/scratch_db.py), applies the migrations,
+# seeds it and drives the handlers with fake contexts
+# run with: python -m tools.query_regression
+# QUERY_REGRESSION_DB_URL can point to an existing, disposable database instead
+# ci runs this against a postgres service, see .github/workflows/query_regression.yml
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import types
+
+import typing_extensions as typing
+
+import tools.scratch_db as scratch_db
+
+os.environ.setdefault("BOT_COLOR", "7487408")
+
+GUILD_ID: typing.Final[int] = 100000000000000001
+CHANNEL_ID: typing.Final[int] = 200000000000000001
+PLAYER_ROLE_ID: typing.Final[int] = 300000000000000001
+USER_ID: typing.Final[int] = 400000000000000001
+
+# how many queries each case is expected to make
+# if a change lowers one of these, update the number here
+EXPECTED_QUERIES: typing.Final[dict[str, int]] = {
+    "message: no match": 4,
+    "message: hidden bullet": 6,
+    "TruthBullet.find": 1,
+    "GachaItem.roll": 1,
+    "GachaItem.roll_no_duplicates": 1,
+    "items here": 5,
+    "gacha view-item": 5,
+    "autocomplete: bullets": 1,
+    "autocomplete: bullets (empty)": 1,
+    "autocomplete: gacha item": 1,
+    "autocomplete: gacha user item": 1,
+    "autocomplete: item": 1,
+    "autocomplete: item channel": 1,
+    "autocomplete: item channel (investigate)": 2,
+    "autocomplete: item user": 1,
+    "autocomplete: dice entries": 1,
+}
+
+_BULLET_INDEXES = ("idx_thiatruthbu_channel_f961d5", "thiatruthbullets_trigger_idx")
+_RELATION_INDEXES = ("idx_thiaitemrel_object__45289d", "idx_thiaitemrel_item_id_d2fb82")
+
+# statement name -> indexes, one of which must show up in the plan
+# the gacha rolls aren't here, thiagachaitems has no usable index for them yet
+EXPECTED_INDEXES: typing.Final[dict[str, tuple[str, ...]]] = {
+    "find_truth_bullet": _BULLET_INDEXES,
+    "autocomplete_bullets": _BULLET_INDEXES,
+    "autocomplete_bullets_not_found": _BULLET_INDEXES,
+    "autocomplete_gacha_item": (
+        "thiagachaitems_name_idx",
+        "thiagachaitems_guild_id_upper_name_idx",
+    ),
+    "autocomplete_gacha_user_item": (
+        "thiagachaitemtoplayer_item_id_idx",
+        "thiagachaitemtoplayer_player_id_idx",
+        "idx_thiagachapl_guild_i_677538",
+    ),
+    "autocomplete_item": (
+        "thiaitemssystemitems_name_idx",
+        "thiaitemssystemitems_guild_id_upper_name_idx",
+    ),
+    "autocomplete_item_channel": _RELATION_INDEXES,
+    "autocomplete_item_channel_empty": _RELATION_INDEXES,
+    "autocomplete_item_user": _RELATION_INDEXES,
+    "autocomplete_item_user_empty": _RELATION_INDEXES,
+    "autocomplete_dice_entries": (
+        "thiadicenetry_name_idx",
+        "idx_thiadicenet_guild_i_e65e30",
+        "thiadicenetry_guild_id_user_id_upper_name_idx",
+    ),
+}
+
+
+class FakeMember:
+    def __init__(self, user_id: int, role_ids: set[int]) -> None:
+        self.id = user_id
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+        self.system = False
+        self.role_ids = role_ids
+        self.sent: list[dict[str, typing.Any]] = []
+
+    def get_role(self, role_id: int) -> types.SimpleNamespace | None:
+        return types.SimpleNamespace(id=role_id) if role_id in self.role_ids else None
+
+    async def send(self, *_: typing.Any, **kwargs: typing.Any) -> None:
+        self.sent.append(kwargs)
+
+
+class FakeContext:
+    """Just enough of an application context or interaction for the handlers."""
+
+    def __init__(self, *, guild_id: int, channel_id: int, author: FakeMember) -> None:
+        import common.core as core
+
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.author = self.user = author
+        self.guild = types.SimpleNamespace(id=guild_id)
+        self.interaction = self
+        self.guild_config = None
+        self.responses: list[dict[str, typing.Any]] = []
+
+        # the real thing, so config fetching is measured as it actually is
+        self.fetch_config = types.MethodType(core.THIAContextMixin.fetch_config, self)
+
+    async def defer(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+        pass
+
+    async def respond(self, *_: typing.Any, **kwargs: typing.Any) -> None:
+        self.responses.append(kwargs)
+
+
+def fake_message(content: str, author: FakeMember) -> types.SimpleNamespace:
+    import discord
+
+    async def send(*_: typing.Any, **__: typing.Any) -> types.SimpleNamespace:
+        return types.SimpleNamespace(jump_url="https://discord.com/channels/1/2/3")
+
+    return types.SimpleNamespace(
+        author=author,
+        guild=types.SimpleNamespace(id=GUILD_ID),
+        channel=types.SimpleNamespace(id=CHANNEL_ID, send=send),
+        type=discord.MessageType.default,
+        content=content,
+        jump_url="https://discord.com/channels/1/2/3",
+        to_reference=lambda **_: None,
+    )
+
+
+def fake_autocomplete() -> types.SimpleNamespace:
+    return types.SimpleNamespace(
+        interaction=types.SimpleNamespace(
+            guild_id=GUILD_ID,
+            channel_id=CHANNEL_ID,
+            user=types.SimpleNamespace(id=USER_ID),
+            authorizing_integration_owners=types.SimpleNamespace(guild_id=GUILD_ID),
+        )
+    )
+
+
+async def seed(scale: int) -> dict[str, typing.Any]:
+    import common.models as models
+
+    # a few other guilds so that every lookup has something to filter out
+    for offset in range(4):
+        guild_id = GUILD_ID + offset
+        await models.GuildConfig.create(guild_id=guild_id, player_role=PLAYER_ROLE_ID)
+        await models.Names.create(guild_id=guild_id)
+        await models.BulletConfig.create(
+            guild_id=guild_id, bullets_enabled=True, bullet_chan_id=CHANNEL_ID - 1
+        )
+        await models.ItemsConfig.create(guild_id=guild_id, enabled=True)
+        await models.GachaConfig.create(guild_id=guild_id, enabled=True)
+        await models.DiceConfig.create(guild_id=guild_id)
+        await models.GachaRarities.create(guild_id=guild_id)
+
+        channels = [CHANNEL_ID + offset * 100 + i for i in range(10)]
+
+        await models.TruthBullet.bulk_create(
+            [
+                models.TruthBullet(
+                    trigger=f"clue {i} of {channel_id}",
+                    description="A synthetic clue.",
+                    channel_id=channel_id,
+                    guild_id=guild_id,
+                    found=False,
+                    hidden=i == 0,
+                )
+                for channel_id in channels
+                for i in range(scale // len(channels))
+            ],
+            batch_size=1000,
+        )
+
+        await models.ItemsSystemItem.bulk_create(
+            [
+                models.ItemsSystemItem(
+                    guild_id=guild_id, name=f"item {i}", description="An item."
+                )
+                for i in range(scale)
+            ],
+            batch_size=1000,
+        )
+        items = await models.ItemsSystemItem.filter(guild_id=guild_id)
+        await models.ItemRelation.bulk_create(
+            [
+                models.ItemRelation(
+                    item_id=item.id,
+                    guild_id=guild_id,
+                    object_id=channels[i % len(channels)],
+                    object_type=models.ItemsRelationType.CHANNEL,
+                )
+                for i, item in enumerate(items)
+            ]
+            + [
+                models.ItemRelation(
+                    item_id=item.id,
+                    guild_id=guild_id,
+                    object_id=USER_ID,
+                    object_type=models.ItemsRelationType.USER,
+                )
+                for item in items[:25]
+            ],
+            batch_size=1000,
+        )
+
+        await models.GachaItem.bulk_create(
+            [
+                models.GachaItem(
+                    guild_id=guild_id,
+                    name=f"gacha item {i}",
+                    description="A prize.",
+                    rarity=models.Rarity((i % 5) + 1),
+                )
+                for i in range(scale)
+            ],
+            batch_size=1000,
+        )
+        player = await models.GachaPlayer.create(
+            guild_id=guild_id, user_id=USER_ID, currency_amount=100
+        )
+        gacha_items = await models.GachaItem.filter(guild_id=guild_id).limit(25)
+        await models.ItemToPlayer.bulk_create(
+            [
+                models.ItemToPlayer(item_id=item.id, player_id=player.id)
+                for item in gacha_items
+            ]
+        )
+
+        await models.DiceEntry.bulk_create(
+            [
+                models.DiceEntry(
+                    guild_id=guild_id, user_id=USER_ID, name=f"dice {i}", value="1d20"
+                )
+                for i in range(min(scale, 50))
+            ]
+        )
+
+    from tortoise.connection import get_connection
+
+    await get_connection("default").execute_script("ANALYZE;")
+
+    return {
+        "hidden_trigger": f"clue 0 of {CHANNEL_ID}",
+        "item_name": "item 0",
+        "gacha_item": await models.GachaItem.filter(guild_id=GUILD_ID).first(),
+    }
+
+
+async def run_cases(seeded: dict[str, typing.Any]) -> dict[str, int]:
+    import common.fuzzy as fuzzy
+    import common.models as models
+    import common.tracing as tracing
+    from exts.bullets.bullet_finding import BulletFinding
+    from exts.gacha.gacha_cmds import GachaCommands
+    from exts.items.items_cmds import ItemsCommands
+
+    bot = types.SimpleNamespace(msg_enabled_bullets_guilds={GUILD_ID})
+    player = FakeMember(USER_ID, {PLAYER_ROLE_ID})
+
+    def ctx() -> FakeContext:
+        return FakeContext(guild_id=GUILD_ID, channel_id=CHANNEL_ID, author=player)
+
+    bullet_finding = BulletFinding(bot)
+    items_cmds = ItemsCommands(bot)
+    gacha_cmds = GachaCommands(bot)
+
+    cases: dict[str, typing.Callable[[], typing.Awaitable[typing.Any]]] = {
+        "message: no match": lambda: bullet_finding.on_message(
+            fake_message("nothing to see here", player)
+        ),
+        "message: hidden bullet": lambda: bullet_finding.on_message(
+            fake_message(f"i found the {seeded['hidden_trigger']}!", player)
+        ),
+        "TruthBullet.find": lambda: models.TruthBullet.find(CHANNEL_ID, "nothing"),
+        "GachaItem.roll": lambda: models.GachaItem.roll(GUILD_ID, models.Rarity.RARE),
+        "GachaItem.roll_no_duplicates": lambda: models.GachaItem.roll_no_duplicates(
+            GUILD_ID, {1, 2, 3}, models.Rarity.RARE
+        ),
+        "items here": lambda: items_cmds.items_here.callback(
+            items_cmds, ctx(), name=seeded["item_name"], hidden="no"
+        ),
+        "gacha view-item": lambda: gacha_cmds.gacha_view_item_actual(
+            ctx(), seeded["gacha_item"]
+        ),
+        "autocomplete: bullets": lambda: fuzzy.autocomplete_bullets(
+            "clue", channel=str(CHANNEL_ID)
+        ),
+        "autocomplete: bullets (empty)": lambda: fuzzy.autocomplete_bullets(
+            "", channel=str(CHANNEL_ID)
+        ),
+        "autocomplete: gacha item": lambda: fuzzy.autocomplete_gacha_item(
+            fake_autocomplete(), "gacha"
+        ),
+        "autocomplete: gacha user item": lambda: fuzzy.autocomplete_gacha_user_item(
+            fake_autocomplete(), "gacha", user=str(USER_ID)
+        ),
+        "autocomplete: item": lambda: fuzzy.autocomplete_item(
+            fake_autocomplete(), "item"
+        ),
+        "autocomplete: item channel": lambda: fuzzy.autocomplete_item_channel(
+            fake_autocomplete(), "item", channel=str(CHANNEL_ID)
+        ),
+        "autocomplete: item channel (investigate)": lambda: (
+            fuzzy.autocomplete_item_channel(
+                fake_autocomplete(),
+                "",
+                channel=str(CHANNEL_ID),
+                investigate_variant=True,
+            )
+        ),
+        "autocomplete: item user": lambda: fuzzy.autocomplete_item_user(
+            fake_autocomplete(), "item", user=str(USER_ID)
+        ),
+        "autocomplete: dice entries": lambda: fuzzy.autocomplete_dice_entries_user(
+            fake_autocomplete(), "dice"
+        ),
+    }
+
+    counts: dict[str, int] = {}
+    for name, case in cases.items():
+        async with tracing.tracer.trace(name) as invocation:
+            await case()
+        counts[name] = invocation.count
+
+    return counts
+
+
+def plan_indexes(plan: dict[str, typing.Any]) -> set[str]:
+    found: set[str] = set()
+    if index := plan.get("Index Name"):
+        found.add(index)
+    for child in plan.get("Plans", ()):
+        found |= plan_indexes(child)
+    return found
+
+
+async def check_plans() -> dict[str, set[str]]:
+    from tortoise.connection import get_connection
+
+    import common.statements as statements
+
+    sample_args: dict[str, tuple[typing.Any, ...]] = {
+        "find_truth_bullet": (CHANNEL_ID, "nothing to see here"),
+        "autocomplete_bullets": (CHANNEL_ID, "clue"),
+        "autocomplete_bullets_not_found": (CHANNEL_ID, "clue"),
+        "autocomplete_gacha_item": (GUILD_ID, "gacha"),
+        "autocomplete_item": (GUILD_ID, "item"),
+        "autocomplete_item_channel": (CHANNEL_ID, "item"),
+        "autocomplete_item_channel_empty": (CHANNEL_ID,),
+        "autocomplete_item_user": (GUILD_ID, USER_ID, "item"),
+        "autocomplete_item_user_empty": (GUILD_ID, USER_ID),
+        "autocomplete_dice_entries": (GUILD_ID, USER_ID, "dice"),
+        "autocomplete_gacha_user_item": (GUILD_ID, USER_ID, "gacha"),
+        "gacha_roll": (GUILD_ID, 3),
+        "gacha_roll_no_dups": (GUILD_ID, [1, 2, 3], 3),
+    }
+
+    results: dict[str, set[str]] = {}
+    async with get_connection("default").acquire_connection() as conn:
+        # with so little data, the planner would often rather seq scan
+        # we want to know if the index *can* serve the query
+        await conn.execute("SET enable_seqscan = off")
+        try:
+            for name, args in sample_args.items():
+                statement = statements.registry.statements[name]
+                raw = await conn.fetchval(
+                    f"EXPLAIN (FORMAT JSON) {statement.query}", *args
+                )
+                plan = json.loads(raw)[0]["Plan"]
+                results[name] = plan_indexes(plan)
+        finally:
+            await conn.execute("RESET enable_seqscan")
+
+    return results
+
+
+async def run(db_url: str, scale: int) -> bool:
+    os.environ["DB_URL"] = db_url
+    os.environ.pop("DB_READ_URL", None)
+    # one connection, so every case uses the one statements were prepared on
+    os.environ["DB_POOL_MIN_SIZE"] = os.environ["DB_POOL_MAX_SIZE"] = "1"
+
+    from tortoise import Tortoise
+
+    import common.fuzzy  # noqa: F401 - registers statements for new connections to prepare
+    import common.tracing as tracing
+    import db_settings
+
+    tracing.install(db_settings.tortoise_config())
+    await Tortoise.init(db_settings.tortoise_config())
+
+    try:
+        seeded = await seed(scale)
+        counts = await run_cases(seeded)
+        plans = await check_plans()
+    finally:
+        await Tortoise.close_connections()
+
+    passed = True
+
+    print("queries:")
+    for name, count in counts.items():
+        expected = EXPECTED_QUERIES.get(name)
+        ok = expected is None or count == expected
+        passed = passed and ok
+        print(f"  {'ok' if ok else 'FAIL':<5} {name}: {count} (expected {expected})")
+
+    print("plans:")
+    for name, indexes in plans.items():
+        expected = EXPECTED_INDEXES.get(name)
+        ok = expected is None or bool(indexes & set(expected))
+        passed = passed and ok
+        print(
+            f"  {'ok' if ok else 'FAIL':<5} {name}: {', '.join(sorted(indexes)) or '-'}"
+            f" (expected one of {', '.join(expected) if expected else '-'})"
+        )
+
+    return passed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--scale",
+        type=int,
+        default=2000,
+        help="How many bullets, items and gacha items to seed per guild.",
+    )
+    args = parser.parse_args()
+
+    with scratch_db.throwaway_postgres(
+        os.environ.get("QUERY_REGRESSION_DB_URL")
+    ) as db_url:
+        scratch_db.migrate(db_url)
+        passed = asyncio.run(run(db_url, args.scale))
+
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+# checks that reads are routed to the read replica where they should be
+# point DB_URL and DB_READ_URL at two different postgres instances, then run:
+# python -m tools.replica_routing
+
+import asyncio
+import os
+import sys
+
+os.environ.setdefault("BOT_COLOR", "7487408")
+
+from tortoise import Tortoise
+from tortoise.connection import get_connection
+
+import common.models as models
+import common.statements as statements
+import db_settings
+
+IDENTIFY = "SELECT inet_server_port() AS port, current_database() AS db"
+
+
+async def identify(connection_name: str) -> tuple[int, str]:
+    rows = await get_connection(connection_name).execute_query_dict(IDENTIFY)
+    return rows[0]["port"], rows[0]["db"]
+
+
+async def run() -> bool:
+    if not db_settings.REPLICA_ENABLED:
+        print("DB_READ_URL is not set, so there is no replica to route to.")
+        return False
+
+    await Tortoise.init(db_settings.tortoise_config())
+
+    primary = await identify(db_settings.PRIMARY)
+    replica = await identify(db_settings.REPLICA)
+    if primary == replica:
+        print("DB_URL and DB_READ_URL point to the same database.")
+        return False
+
+    identify_statement = statements.Statement(
+        "identify", IDENTIFY, lambda r: (r["port"], r["db"])
+    )
+
+    def chosen(for_write: bool = False) -> str:
+        return models.TruthBullet._choose_db(for_write).connection_name
+
+    checks: list[tuple[str, object, object]] = [
+        ("orm read", chosen(), db_settings.PRIMARY),
+        ("statement", await identify_statement.fetchrow(), primary),
+    ]
+
+    with db_settings.use_replica():
+        checks.extend(
+            (
+                ("orm read in use_replica", chosen(), db_settings.REPLICA),
+                ("orm write in use_replica", chosen(True), db_settings.PRIMARY),
+                (
+                    "statement in use_replica",
+                    await identify_statement.fetchrow(),
+                    replica,
+                ),
+            )
+        )
+
+        with db_settings.use_primary():
+            checks.extend(
+                (
+                    ("orm read in use_primary", chosen(), db_settings.PRIMARY),
+                    (
+                        "statement in use_primary",
+                        await identify_statement.fetchrow(),
+                        primary,
+                    ),
+                )
+            )
+
+    checks.append(("orm read after use_replica", chosen(), db_settings.PRIMARY))
+
+    await Tortoise.close_connections()
+
+    passed = True
+    for name, got, expected in checks:
+        ok = got == expected
+        passed = passed and ok
+        print(f"{'ok' if ok else 'FAIL':<5} {name}: {got!r} (expected {expected!r})")
+
+    return passed
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(run()) else 1)
@@ -0,0 +1,87 @@
+"""
+Copyright 2021-2026 AstreaTSS.
+This file is part of PYTHIA.
+
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""
+
+# throwaway postgres instances for the tools and benchmarks
+# initdb and pg_ctl need to be on PATH, or in PG_BIN
+# initdb refuses to run as root
+
+import contextlib
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import typing_extensions as typing
+
+
+@contextlib.contextmanager
+def throwaway_postgres(db_url: str | None = None) -> typing.Generator[str, None, None]:
+    """
+    Starts a Postgres instance in a temporary directory, and yields its URL.
+    The instance and its data are removed afterwards.
+
+    Args:
+        db_url: If given, this database is used instead of starting a new one.
+    """
+    if db_url:
+        yield db_url
+        return
+
+    bin_dir = os.environ.get("PG_BIN")
+    initdb = str(Path(bin_dir, "initdb")) if bin_dir else shutil.which("initdb")
+    pg_ctl = str(Path(bin_dir, "pg_ctl")) if bin_dir else shutil.which("pg_ctl")
+    if not initdb or not pg_ctl:
+        raise RuntimeError("Could not find initdb and pg_ctl, set PG_BIN.")
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    with tempfile.TemporaryDirectory(prefix="pythia-pg-") as tmp:
+        data_dir = Path(tmp, "data")
+        subprocess.run(
+            [initdb, "-D", str(data_dir), "-U", "postgres", "--auth=trust"],
+            check=True,
+            capture_output=True,
+        )
+        subprocess.run(
+            [
+                pg_ctl,
+                "-D",
+                str(data_dir),
+                "-o",
+                f"-p {port} -k {tmp} -c listen_addresses=127.0.0.1 -c fsync=off",
+                "-l",
+                str(Path(tmp, "postgres.log")),
+                "-w",
+                "start",
+            ],
+            check=True,
+            capture_output=True,
+        )
+        try:
+            yield f"postgres://postgres@127.0.0.1:{port}/postgres"
+        finally:
+            subprocess.run(
+                [pg_ctl, "-D", str(data_dir), "-m", "immediate", "stop"],
+                check=False,
+                capture_output=True,
+            )
+
+
+def migrate(db_url: str) -> None:
+    subprocess.run(
+        [sys.executable, "-m", "tortoise", "migrate"],
+        check=True,
+        capture_output=True,
+        env=os.environ | {"DB_URL": db_url},
+    )